@@ -1,27 +1,70 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+import asyncio
 import datetime
+import functools
 import ee
+import json
+import os
+import numpy as np
+from predictor import prob_to_risk
+from startup import STARTUP_PRELOAD, get_predictor, startup_report
+import startup
+from imagery_provider import IMAGERY_PROVIDER, get_provider
+from preprocessing import MODEL_BANDS, MODEL_SIZE, preprocess_stack, stack_patches
+from patch_cache import patch_cache, polygon_hash
+from tile_grid import shared_tiles
+from field_scheduler import FIELD_SCHEDULER_ENABLED, FieldRefreshScheduler, field_registry
+from weather_client import weather_client
+from inference_scheduler import INFERENCE_MAX_BATCH, InferenceScheduler
+import metrics
+import time
+import field_map
+from field_map import MAP_STRIDE_PX
+from cascade import CASCADE_ENABLED, CASCADE_MODEL_PATH, cascade, raw_means
+from history_store import HISTORY_ENABLED, HISTORY_MAX_ROWS, history_store, summarize as summarize_history
 
+# --- CONFIGURATION ---
+# Per-stage timeouts (seconds)
+WEATHER_TIMEOUT = float(os.getenv("WEATHER_TIMEOUT", 5))
+SATELLITE_TIMEOUT = float(os.getenv("SATELLITE_TIMEOUT", 120))
+INFERENCE_TIMEOUT = float(os.getenv("INFERENCE_TIMEOUT", 30))
 
+# Bounded pools so blocking GEE/weather calls and CPU-bound inference never
+# occupy uvicorn's shared threadpool.
+IO_EXECUTOR = ThreadPoolExecutor(max_workers=int(os.getenv("IO_WORKERS", 16)), thread_name_prefix="io")
+INFERENCE_EXECUTOR = ThreadPoolExecutor(max_workers=int(os.getenv("INFERENCE_WORKERS", 1)), thread_name_prefix="inference")
+# Forward passes from all concurrent requests are micro-batched on one thread
+inference_scheduler = InferenceScheduler(lambda x: get_predictor().predict_stress_probs(x))
 
+# /predict/batch limits
+BATCH_MAX_FEATURES = int(os.getenv("BATCH_MAX_FEATURES", 1000))
+BATCH_FETCH_CONCURRENCY = int(os.getenv("BATCH_FETCH_CONCURRENCY", 8))
+BATCH_DEDUP_CELL_DEG = 1e-4  # ~10 m, one Sentinel-2 pixel
 
-import requests
-import json
-import os
-from predictor import predictor, prob_to_risk
+imagery = get_provider()
 
-# --- CONFIGURATION ---
-PROJECT_ID = "just-student-485912-k1"
-OPENWEATHERMAP_API_KEY = os.getenv("OPENWEATHERMAP_API_KEY")
+# Components /readyz waits for; offline providers need no Earth Engine session
+READY_COMPONENTS = ["model", "gee"] if IMAGERY_PROVIDER == "gee" else ["model"]
+if CASCADE_ENABLED:
+    READY_COMPONENTS.append("cascade")
 
-try:
-    ee.Initialize(project=PROJECT_ID)
-except Exception:
-    ee.Authenticate()
-    ee.Initialize(project=PROJECT_ID)
+@asynccontextmanager
+async def lifespan(app):
+    # Load in the background so /healthz answers immediately and /readyz flips once done
+    if STARTUP_PRELOAD:
+        for name in READY_COMPONENTS:
+            startup.COMPONENTS[name].start()
+    if FIELD_SCHEDULER_ENABLED:
+        field_refresher.start()
+    yield
+    await field_refresher.stop()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -30,6 +73,22 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    t0 = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Label by route template (not raw path) to keep cardinality bounded
+        route = request.scope.get("route")
+        path = route.path if route is not None else "unmatched"
+        if path != "/metrics":
+            metrics.requests_total.inc(route=path, status=status)
+            metrics.request_seconds.observe(time.perf_counter() - t0, route=path)
+
 def geojson_to_ee_polygon(boundary_geojson: dict) -> ee.Geometry:
     geom = boundary_geojson["geometry"] if "geometry" in boundary_geojson else boundary_geojson
     if geom.get("type") != "Polygon":
@@ -45,27 +104,11 @@ def get_centroid(boundary_geojson: dict):
     return lat, lon
 
 def fetch_weather(lat, lon):
-    """Fetch current weather from OpenWeatherMap."""
-    if OPENWEATHERMAP_API_KEY == "YOUR_OWM_API_KEY_HERE":
-        return None
-    
-    url = f"https://api.openweathermap.org/data/2.5/weather?lat={lat}&lon={lon}&appid={OPENWEATHERMAP_API_KEY}&units=metric"
-    try:
-        r = requests.get(url, timeout=5)
-        if r.status_code == 200:
-            data = r.json()
-            return {
-                "temp": data["main"]["temp"],
-                "humidity": data["main"]["humidity"],
-                "description": data["weather"][0]["description"],
-                "wind_speed": data["wind"]["speed"],
-                "icon": data["weather"][0]["icon"]
-            }
-    except Exception as e:
-        print(f"Weather fetch failed: {e}")
-    return None
+    """Fetch current weather from OpenWeatherMap (pooled, grid-cell cached)."""
+    return weather_client.get(lat, lon)
 
 def fetch_satellite_features(boundary_geojson: dict, days: int = 30):
+    startup.ensure_ee()
     poly = geojson_to_ee_polygon(boundary_geojson)
     end = datetime.date.today()
     start = end - datetime.timedelta(days=days)
@@ -130,96 +173,636 @@ def fetch_satellite_features(boundary_geojson: dict, days: int = 30):
         "time_window_days": days
     }
 
+def timeseries_to_stack(batch_res: dict, days: int = 7):
+    """
+    Split a fetch_daily_timeseries result into the day offsets that have
+    imagery, their (N, 6, H, W) raw stack, the band-presence mask and today's patch.
+    """
+    if "array" in batch_res:
+        # Binary transport: already (days + 1, 6, H, W), index = day offset
+        arr = batch_res["array"]
+        valid = arr[:, 2].any(axis=(1, 2))
+        valid_days = [i for i in range(days + 1) if valid[i]]
+        stack = arr if len(valid_days) == len(arr) else arr[valid_days]
+        last_patch = arr[0] if valid[0] else None
+        return valid_days, stack, None, last_patch
+
+    data = batch_res["data"]
+    day_patches = {}
+    for i in range(days, -1, -1):
+        # Reconstruct the patch dictionary for this day
+        day_patch = {
+            "B2": data.get(f"d{i}_B"),
+            "B3": data.get(f"d{i}_G"),
+            "B4": data.get(f"d{i}_R"),
+            "NDVI": data.get(f"d{i}_NDVI"),
+            "VV": data.get(f"d{i}_VV"),
+            "VH": data.get(f"d{i}_VH")
+        }
+        if day_patch["B2"] is not None:
+            day_patches[i] = day_patch
+
+    valid_days = list(day_patches)
+    stack, present = stack_patches([day_patches[i] for i in valid_days])
+    return valid_days, stack, present, day_patches.get(0)
+
+def prepare_timeseries(batch_res: dict, days: int = 7):
+    """
+    Preprocess every available day of a fetch_daily_timeseries result into
+    model input. Returns (valid day offsets, (N, 6, 128, 128) array, today's patch).
+    """
+    with metrics.stage("decode"):
+        valid_days, stack, present, last_patch = timeseries_to_stack(batch_res, days=days)
+    with metrics.stage("preprocess"):
+        return valid_days, preprocess_stack(stack, present=present), last_patch
+
+async def score_timeseries(batch_res: dict, days: int = 7):
+    """
+    Score every available day of a fetch_daily_timeseries result through the
+    shared micro-batching scheduler. Returns {day_offset: stress_prob} and today's patch.
+    """
+    valid_days, x, last_patch = await run_stage(INFERENCE_EXECUTOR, INFERENCE_TIMEOUT, prepare_timeseries, batch_res, days)
+    with metrics.stage("inference"):
+        probs = await inference_scheduler.score(x)
+    return dict(zip(valid_days, probs)), last_patch
+
+def build_prediction(day_probs: dict, last_patch, crop_type: str, days: int = 7) -> dict:
+    """Turn per-day stress probabilities into the /predict response body."""
+    trend_data = []
+
+    # d0=Today, d1=Yesterday...
+    for i in range(days, -1, -1):
+        target_date = (datetime.date.today() - datetime.timedelta(days=i))
+        if i in day_probs:
+            health_score = round(1 - day_probs[i], 2)
+        else:
+            health_score = 0.5
+
+        trend_data.append({
+            "day": target_date.strftime("%b %d"),
+            "score": health_score
+        })
+
+    if last_patch is None:
+        raise Exception("No valid satellite data found for Today.")
+
+    # Today's specific data
+    stress_prob = 1 - trend_data[-1]["score"]
+
+    # Risk Determination
+    risk = prob_to_risk(stress_prob)
+
+    # Trend Analysis
+    avg_health = round(sum([d["score"] for d in trend_data]) / len(trend_data), 2)
+    diff = trend_data[-1]["score"] - trend_data[0]["score"]
+    if diff > 0.05: trend_status = "Improving"
+    elif diff < -0.05: trend_status = "Increasing"
+    else: trend_status = "Stable"
+
+    # AI Recommendation Engine
+    predictor = get_predictor()
+    anomalies = predictor.get_anomalies(last_patch)
+    actions = predictor.get_ai_recommendations(risk, anomalies, crop_type=crop_type)
+
+    # Add trend specific recommendation
+    if trend_status == "Increasing":
+        actions.append("AI Analysis: Stress is trending UPward compared to last week. Immediate inspection required.")
+    elif trend_status == "Improving":
+        actions.append("AI Analysis: Health is IMPROVING. Previous interventions seem effective.")
+
+    return {
+        "risk_level": risk,
+        "confidence": round(stress_prob if stress_prob > 0.5 else 1 - stress_prob, 2),
+        "recommended_actions": actions,
+        "trend_data": trend_data,
+        "trend_status": trend_status,
+        "health_average": avg_health,
+        "ai_metadata": {
+            "anomalies_detected": anomalies,
+            "crop_type": crop_type
+        }
+    }
+
+def build_scalar_prediction(stress_prob: float, stats: dict, crop_type: str) -> dict:
+    """/predict response body from the cascade's scalar stage (no patch, so no weekly trend)."""
+    risk = prob_to_risk(stress_prob)
+    predictor = get_predictor()
+    anomalies = predictor.get_anomalies(raw_means(stats))
+    health_score = round(1 - stress_prob, 2)
+    return {
+        "risk_level": risk,
+        "confidence": round(stress_prob if stress_prob > 0.5 else 1 - stress_prob, 2),
+        "recommended_actions": predictor.get_ai_recommendations(risk, anomalies, crop_type=crop_type),
+        "trend_data": [{"day": datetime.date.today().strftime("%b %d"), "score": health_score}],
+        "trend_status": "Stable",
+        "health_average": health_score,
+        "ai_metadata": {
+            "anomalies_detected": anomalies,
+            "crop_type": crop_type
+        }
+    }
+
+async def scalar_stage(boundary: dict, crop_type: str):
+    """
+    First cascade stage: score the field from region statistics with the
+    scalar model. Returns (response body, or None to escalate to the CNN, cascade info).
+    """
+    try:
+        with metrics.stage("region_stats"):
+            stats_res = await run_stage(IO_EXECUTOR, SATELLITE_TIMEOUT, imagery.fetch_region_stats, boundary)
+    except asyncio.TimeoutError:
+        stats_res = {"status": "error", "message": f"Region statistics timed out after {SATELLITE_TIMEOUT}s"}
+    try:
+        model = startup.scalar_model.get()
+    except Exception:
+        model = None  # reported by /readyz; every request escalates
+
+    prob, escalate, reason = cascade.decide(model, stats_res)
+    info = {
+        "stage": "cnn" if escalate else "scalar",
+        "scalar_prob": round(prob, 4) if prob is not None else None,
+        "escalation_reason": reason,
+    }
+    if escalate:
+        return None, info
+    return build_scalar_prediction(prob, stats_res["stats"], crop_type), info
+
+def field_key(boundary_geojson: dict, field_id=None) -> str:
+    """History key: the caller's field id, else the canonical polygon hash."""
+    return str(field_id) if field_id is not None else polygon_hash(boundary_geojson)
+
+def record_history(field_id: str, day_probs: dict, anomalies: list, source: str = "cnn"):
+    """Append a prediction to the field history on the I/O pool without delaying the response."""
+    if not HISTORY_ENABLED:
+        return
+    if source == "scalar":
+        version = os.path.basename(CASCADE_MODEL_PATH)
+    else:
+        from predictor import MODEL_PATH
+        version = f"{MODEL_PATH}:{get_predictor().backend}"
+
+    def write():
+        try:
+            history_store.append(field_id, day_probs, prob_to_risk, anomalies, version, source)
+        except Exception as e:
+            print(f"History write failed for {field_id}: {e}")
+
+    IO_EXECUTOR.submit(write)
+
+async def run_stage(executor, timeout: float, fn, *args):
+    """Run a blocking stage on `executor`, cancelling the wait after `timeout` seconds."""
+    loop = asyncio.get_running_loop()
+    return await asyncio.wait_for(loop.run_in_executor(executor, functools.partial(fn, *args)), timeout)
+
+async def fetch_weather_async(lat, lon):
+    """Weather is optional: a slow or failing API yields None instead of an error."""
+    try:
+        with metrics.stage("weather"):
+            return await run_stage(IO_EXECUTOR, WEATHER_TIMEOUT, fetch_weather, lat, lon)
+    except asyncio.TimeoutError:
+        print(f"Weather fetch timed out after {WEATHER_TIMEOUT}s")
+        return None
+
+async def compute_prediction(boundary: dict, crop_type: str, field_id: str, use_cascade: bool = CASCADE_ENABLED) -> dict:
+    """
+    The /predict pipeline without weather: optional cascade scalar stage, then
+    the 7-day fetch and CNN scoring. Records the result in the field history.
+    Raises HTTPException on timeouts.
+    """
+    # 0. Cascade: cheap scalar model first, CNN only for uncertain fields
+    cascade_info = None
+    if use_cascade:
+        result, cascade_info = await scalar_stage(boundary, crop_type)
+        if result is not None:
+            record_history(field_id, {0: cascade_info["scalar_prob"]},
+                           result["ai_metadata"]["anomalies_detected"], source="scalar")
+            return {**result, "cascade": cascade_info}
+
+    # 1. Fetch Daily Data for the last 7 days (Batched)
+    try:
+        with metrics.stage("satellite_fetch"):
+            batch_res = await run_stage(IO_EXECUTOR, SATELLITE_TIMEOUT, imagery.fetch_daily_timeseries, boundary, 7)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail=f"Satellite fetch timed out after {SATELLITE_TIMEOUT}s")
+
+    if batch_res.get("status") == "error":
+        metrics.errors_total.inc(stage="satellite_fetch")
+        raise Exception(f"Satellite batch fetch failed: {batch_res.get('message')}")
+
+    # 2. Score the whole week on the dedicated inference pool
+    try:
+        day_probs, last_patch = await asyncio.wait_for(score_timeseries(batch_res, 7), INFERENCE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail=f"Inference timed out after {INFERENCE_TIMEOUT}s")
+
+    with metrics.stage("postprocess"):
+        result = build_prediction(day_probs, last_patch, crop_type)
+    record_history(field_id, day_probs, result["ai_metadata"]["anomalies_detected"])
+    if cascade_info is not None:
+        result["cascade"] = cascade_info
+    return result
+
 @app.post("/predict")
-def predict(payload: dict):
+async def predict(payload: dict):
     boundary = payload.get("boundary")
     crop_type = payload.get("crop_type", "general")
     if not boundary:
         raise HTTPException(status_code=400, detail="Missing 'boundary'")
 
     lat, lon = get_centroid(boundary)
-    weather = fetch_weather(lat, lon)
+    field_id = field_key(boundary, payload.get("field_id"))
 
-    try:
-        # 1. Fetch Daily Data for the last 7 days (Batched)
-        from satellite_gee import fetch_daily_timeseries
-        batch_res = fetch_daily_timeseries(boundary, days=7)
-        
-        if batch_res.get("status") == "error":
-            raise Exception(f"Satellite batch fetch failed: {batch_res.get('message')}")
-            
-        data = batch_res["data"]
-        trend_data = []
-        last_patch = None
-        
-        # d0=Today, d1=Yesterday...
-        for i in range(7, -1, -1):
-            target_date = (datetime.date.today() - datetime.timedelta(days=i))
-            
-            # Reconstruct the patch dictionary for this day
-            day_patch = {
-                "B2": data.get(f"d{i}_B"),
-                "B3": data.get(f"d{i}_G"),
-                "B4": data.get(f"d{i}_R"),
-                "NDVI": data.get(f"d{i}_NDVI"),
-                "VV": data.get(f"d{i}_VV"),
-                "VH": data.get(f"d{i}_VH")
-            }
-            
-            # Run inference
-            if day_patch["B2"] is not None:
-                x_day = predictor.preprocess(day_patch)
-                prob = predictor.predict_stress_prob(x_day)
-                health_score = round(1 - prob, 2)
-                if i == 0:
-                    last_patch = day_patch
-            else:
-                health_score = 0.5
-            
-            trend_data.append({
-                "day": target_date.strftime("%b %d"),
-                "score": health_score
-            })
-
-        if last_patch is None:
-            raise Exception("No valid satellite data found for Today.")
-
-        # Today's specific data
-        stress_prob = 1 - trend_data[-1]["score"]
-        
-        # Risk Determination
-        risk = prob_to_risk(stress_prob)
-        
-        # Trend Analysis
-        avg_health = round(sum([d["score"] for d in trend_data]) / len(trend_data), 2)
-        diff = trend_data[-1]["score"] - trend_data[0]["score"]
-        if diff > 0.05: trend_status = "Improving"
-        elif diff < -0.05: trend_status = "Increasing"
-        else: trend_status = "Stable"
-
-        # AI Recommendation Engine
-        anomalies = predictor.get_anomalies(last_patch)
-        actions = predictor.get_ai_recommendations(risk, anomalies, crop_type=crop_type)
-
-        # Add trend specific recommendation
-        if trend_status == "Increasing":
-            actions.append("AI Analysis: Stress is trending UPward compared to last week. Immediate inspection required.")
-        elif trend_status == "Improving":
-            actions.append("AI Analysis: Health is IMPROVING. Previous interventions seem effective.")
+    use_cascade = payload.get("cascade", CASCADE_ENABLED)
 
-        return {
-            "risk_level": risk,
-            "confidence": round(stress_prob if stress_prob > 0.5 else 1 - stress_prob, 2),
-            "recommended_actions": actions,
-            "location": {"lat": lat, "lon": lon},
-            "weather": weather,
-            "trend_data": trend_data,
-            "trend_status": trend_status,
-            "health_average": avg_health,
-            "ai_metadata": {
-                "anomalies_detected": anomalies,
-                "crop_type": crop_type
+    # Registered fields are precomputed in the background (for their registered
+    # boundary and crop, with the default cascade setting); serve that unless
+    # asked to refresh. The registry is SQLite, so look it up off the event loop.
+    if not payload.get("refresh"):
+        stored = await asyncio.get_running_loop().run_in_executor(IO_EXECUTOR, field_registry.latest, field_id)
+        if (stored is not None and polygon_hash(stored["boundary"]) == polygon_hash(boundary)
+                and stored["crop_type"] == crop_type and bool(use_cascade) == CASCADE_ENABLED):
+            return {
+                **stored["result"],
+                "field_id": field_id,
+                "precomputed": {"computed_at": stored["computed_at"]},
+                "location": {"lat": lat, "lon": lon},
+                "weather": await fetch_weather_async(lat, lon),
             }
-        }
+
+    # Weather and satellite I/O run concurrently on the bounded I/O pool
+    weather_task = asyncio.create_task(fetch_weather_async(lat, lon))
+    try:
+        result = await compute_prediction(boundary, crop_type, field_id, use_cascade)
+    except HTTPException:
+        weather_task.cancel()
+        raise
     except Exception as e:
+        weather_task.cancel()
         raise HTTPException(status_code=500, detail=f"Inference failed: {e}")
+    except asyncio.CancelledError:
+        # Client went away: stop waiting on the weather call too
+        weather_task.cancel()
+        raise
+
+    return {
+        **result,
+        "field_id": field_id,
+        "location": {"lat": lat, "lon": lon},
+        "weather": await weather_task,
+    }
+
+def prepare_many(batch_results: list, days: int = 7):
+    """
+    Preprocess every field-day of several time-series results into one shared
+    input array. Returns the array and one (valid day offsets, today's patch) per result.
+    """
+    with metrics.stage("decode"):
+        parts = [timeseries_to_stack(res, days=days) for res in batch_results]
+    total = sum(len(valid_days) for valid_days, _, _, _ in parts)
+    x = np.empty((total, len(MODEL_BANDS), MODEL_SIZE, MODEL_SIZE), dtype=np.float32)
+    offset = 0
+    with metrics.stage("preprocess"):
+        for valid_days, stack, present, _ in parts:
+            preprocess_stack(stack, out=x[offset:offset + len(valid_days)], present=present)
+            offset += len(valid_days)
+    return x, [(valid_days, last_patch) for valid_days, _, _, last_patch in parts]
+
+async def score_many(batch_results: list, days: int = 7):
+    """
+    Score several time-series results together through the micro-batching
+    scheduler (which splits them into INFERENCE_MAX_BATCH forward passes).
+    Returns one (day_probs, last_patch) per result.
+    """
+    x, parts = await run_stage(INFERENCE_EXECUTOR, INFERENCE_TIMEOUT, prepare_many, batch_results, days)
+    with metrics.stage("inference"):
+        probs = await inference_scheduler.score(x)
+
+    scored, offset = [], 0
+    for valid_days, last_patch in parts:
+        scored.append((dict(zip(valid_days, probs[offset:offset + len(valid_days)])), last_patch))
+        offset += len(valid_days)
+    return scored
+
+def fetch_group_key(boundary_geojson: dict) -> tuple:
+    """
+    Fetches are centred on the polygon centroid, so fields whose centroids
+    fall in the same ~10 m cell get the same patch and share one fetch.
+    """
+    lat, lon = get_centroid(boundary_geojson)
+    return (round(lat / BATCH_DEDUP_CELL_DEG), round(lon / BATCH_DEDUP_CELL_DEG))
+
+@app.post("/predict/batch")
+async def predict_batch(payload: dict):
+    """
+    Score many fields in one call. Accepts a GeoJSON FeatureCollection (or
+    {"boundaries": FeatureCollection, "crop_type": default}); each feature may
+    carry "crop_type" and "id"/"field_id" properties. Results come back in
+    input order using the /predict schema, or {"error": ...} per feature.
+    """
+    collection = payload.get("boundaries", payload)
+    features = collection.get("features")
+    if not features:
+        raise HTTPException(status_code=400, detail="Missing 'features'")
+    if len(features) > BATCH_MAX_FEATURES:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_FEATURES} features per batch")
+    default_crop = payload.get("crop_type", "general")
+
+    # 1. Deduplicate fetches
+    groups = {}
+    feature_groups = []
+    for feature in features:
+        try:
+            geom = feature.get("geometry", feature)
+            if geom.get("type") != "Polygon":
+                raise ValueError("Only Polygon is supported")
+            key = fetch_group_key(feature)
+            groups.setdefault(key, feature)
+            feature_groups.append(key)
+        except Exception as e:
+            feature_groups.append(e)
+
+    # 2. Fetch imagery and weather with bounded concurrency
+    semaphore = asyncio.Semaphore(BATCH_FETCH_CONCURRENCY)
+
+    async def fetch_group(boundary):
+        async with semaphore:
+            try:
+                with metrics.stage("satellite_fetch"):
+                    return await run_stage(IO_EXECUTOR, SATELLITE_TIMEOUT, imagery.fetch_daily_timeseries, boundary, 7)
+            except asyncio.TimeoutError:
+                return {"status": "error", "message": f"Satellite fetch timed out after {SATELLITE_TIMEOUT}s"}
+
+    keys = list(groups)
+    weather_tasks = [asyncio.create_task(fetch_weather_async(*get_centroid(groups[k]))) for k in keys]
+    fetched = await asyncio.gather(*(fetch_group(groups[k]) for k in keys), return_exceptions=True)
+
+    # 3. Score every field-day of every fetched group in large batches
+    ok_keys = [k for k, res in zip(keys, fetched) if isinstance(res, dict) and res.get("status") == "success"]
+    ok_results = [res for res in fetched if isinstance(res, dict) and res.get("status") == "success"]
+    # Allow INFERENCE_TIMEOUT per forward-pass chunk (8 field-days per fetch)
+    n_chunks = max(1, -(-len(ok_results) * 8 // INFERENCE_MAX_BATCH))
+    try:
+        scored = await asyncio.wait_for(score_many(ok_results, 7), INFERENCE_TIMEOUT * n_chunks)
+    except Exception as e:
+        for task in weather_tasks:
+            task.cancel()
+        if isinstance(e, asyncio.TimeoutError):
+            raise HTTPException(status_code=504, detail="Batch inference timed out")
+        raise HTTPException(status_code=500, detail=f"Batch inference failed: {e}")
+    scored = dict(zip(ok_keys, scored))
+    fetch_errors = {k: res for k, res in zip(keys, fetched) if k not in scored}
+    weather = dict(zip(keys, await asyncio.gather(*weather_tasks)))
+
+    # 4. Per-feature responses, in input order
+    results = []
+    for feature, key in zip(features, feature_groups):
+        props = feature.get("properties") or {}
+        item = {"id": props.get("field_id", props.get("id", feature.get("id")))}
+        try:
+            if isinstance(key, Exception):
+                raise key
+            if key in fetch_errors:
+                err = fetch_errors[key]
+                message = err.get("message") if isinstance(err, dict) else str(err)
+                raise Exception(f"Satellite batch fetch failed: {message}")
+            lat, lon = get_centroid(feature)
+            day_probs, last_patch = scored[key]
+            item.update(build_prediction(day_probs, last_patch, props.get("crop_type", default_crop)))
+            record_history(field_key(feature, item["id"]), day_probs, item["ai_metadata"]["anomalies_detected"])
+            item.update({"location": {"lat": lat, "lon": lon}, "weather": weather[key]})
+        except Exception as e:
+            item["error"] = f"Inference failed: {e}"
+        results.append(item)
+
+    return {
+        "results": results,
+        "stats": {
+            "features": len(features),
+            "unique_fetches": len(keys),
+            "failed_fetches": len(fetch_errors),
+            "field_days_scored": sum(len(p) for p, _ in scored.values())
+        }
+    }
+
+async def score_map(layout: dict, raster: np.ndarray) -> np.ndarray:
+    """
+    Score every field cell of a map layout. The raster is normalized and
+    resized once; window batches are gathered on the inference pool while the
+    previous batch runs through the scheduler. Returns an (ny, nx) grid of
+    stress probabilities, NaN outside the field.
+    """
+    cells = field_map.map_cells(layout)
+    with metrics.stage("preprocess"):
+        resized = await run_stage(INFERENCE_EXECUTOR, INFERENCE_TIMEOUT, field_map.prepare_windows, raster)
+
+    chunk = INFERENCE_MAX_BATCH * 4
+    starts = list(range(0, len(cells), chunk))
+    gather = lambda i: run_stage(INFERENCE_EXECUTOR, INFERENCE_TIMEOUT, field_map.gather_windows,
+                                 resized, layout, cells[i:i + chunk])
+    probs = []
+    pending = asyncio.ensure_future(gather(starts[0])) if starts else None
+    for k in range(len(starts)):
+        x = await pending
+        pending = asyncio.ensure_future(gather(starts[k + 1])) if k + 1 < len(starts) else None
+        with metrics.stage("inference"):
+            probs += await inference_scheduler.score(x)
+
+    grid = np.full((layout["ny"], layout["nx"]), np.nan, dtype=np.float32)
+    if len(cells):
+        grid[cells[:, 0], cells[:, 1]] = probs
+    return grid
+
+@app.post("/predict/map")
+async def predict_map(payload: dict):
+    """
+    Whole-field stress map. Tiles the polygon into cells of `stride_px` 10 m
+    pixels (default MAP_STRIDE_PX), fetches one raster covering every cell's
+    224-px model window and scores all windows in large batches. "format" picks
+    "geojson" (one square per cell), "raster" (base64 uint8 grid) or "both".
+    """
+    boundary = payload.get("boundary")
+    if not boundary:
+        raise HTTPException(status_code=400, detail="Missing 'boundary'")
+    fmt = payload.get("format", "both")
+    if fmt not in ("geojson", "raster", "both"):
+        raise HTTPException(status_code=400, detail="'format' must be 'geojson', 'raster' or 'both'")
+    t0 = time.perf_counter()
+
+    try:
+        layout = field_map.plan_map(boundary, int(payload.get("stride_px", MAP_STRIDE_PX)))
+    except (ValueError, TypeError, KeyError, IndexError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid map request: {e}")
+
+    try:
+        with metrics.stage("satellite_fetch"):
+            raster_res = await run_stage(IO_EXECUTOR, SATELLITE_TIMEOUT, imagery.fetch_raster,
+                                         boundary, layout["grid"], payload.get("end_date"))
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail=f"Satellite fetch timed out after {SATELLITE_TIMEOUT}s")
+    if raster_res.get("status") == "error":
+        metrics.errors_total.inc(stage="satellite_fetch")
+        raise HTTPException(status_code=500, detail=f"Satellite raster fetch failed: {raster_res.get('message')}")
+
+    n_chunks = max(1, -(-int((layout["coverage"] > 0).sum()) // INFERENCE_MAX_BATCH))
+    try:
+        probs = await asyncio.wait_for(score_map(layout, raster_res["array"]), INFERENCE_TIMEOUT * n_chunks)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Map inference timed out")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Map inference failed: {e}")
+
+    result = {
+        "summary": field_map.summarize(layout, probs, prob_to_risk),
+        "stride_px": layout["stride_px"],
+    }
+    if fmt in ("geojson", "both"):
+        result["geojson"] = field_map.to_geojson(layout, probs, prob_to_risk)
+    if fmt in ("raster", "both"):
+        result["raster"] = field_map.to_raster(layout, probs)
+    result["processing_time"] = round(time.perf_counter() - t0, 3)
+    return result
+
+@app.get("/inference/stats")
+def inference_stats():
+    """Micro-batching scheduler queue depth, batch-size histogram and timings."""
+    backend = get_predictor().backend if startup.model.ready else None
+    return {"backend": backend, **inference_scheduler.stats()}
+
+# Caches, scheduler and startup state are read at scrape time
+metrics.REGISTRY.collect(
+    "crop_patch_cache_events_total", "Satellite patch cache events (memory_hits, disk_hits, misses, ...).",
+    "counter", ("event",),
+    lambda: {(k,): v for k, v in patch_cache.stats().items() if k in patch_cache.counters})
+metrics.REGISTRY.collect(
+    "crop_weather_cache_events_total", "Weather client cache and HTTP events (hits, stale_hits, misses, ...).",
+    "counter", ("event",),
+    lambda: {(k,): v for k, v in weather_client.stats().items() if k in weather_client.counters})
+metrics.REGISTRY.collect(
+    "crop_inference_queue_depth", "Patches waiting in the micro-batching queue.",
+    "gauge", (), lambda: {(): inference_scheduler.stats()["queue_depth"]})
+metrics.REGISTRY.collect(
+    "crop_inference_batches_total", "Forward passes by batch size bucket (patches per pass, upper bound).",
+    "counter", ("size_bucket",), lambda: {(k,): v for k, v in inference_scheduler.stats()["batch_size_histogram"].items()})
+
+metrics.REGISTRY.collect(
+    "crop_cascade_decisions_total", "Cascade outcomes: answered by the scalar model or escalated to the CNN (by reason).",
+    "counter", ("outcome",), lambda: {(k,): v for k, v in cascade.stats().items() if k == "scalar" or k.startswith("escalated_")})
+
+def _startup_seconds():
+    report = startup_report(READY_COMPONENTS)
+    return {(): report["startup_seconds"]} if report["ready"] else {}
+
+metrics.REGISTRY.collect(
+    "crop_startup_seconds", "Seconds from process start until the backend was ready.", "gauge", (), _startup_seconds)
+metrics.REGISTRY.collect(
+    "crop_process_memory_bytes", "Resident memory of this worker process (rss, pss, shared, private).",
+    "gauge", ("pid", "kind"), lambda: {(str(os.getpid()), k): v for k, v in startup.memory_report().items()})
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """Prometheus scrape endpoint."""
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/healthz")
+def healthz():
+    """Liveness: the process is up and serving HTTP."""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+def readyz():
+    """Readiness: 200 once the model (and GEE, when used) are initialized, else 503."""
+    report = startup_report(READY_COMPONENTS)
+    if not report["ready"]:
+        # Without preloading, the first probe starts initialization
+        for name in READY_COMPONENTS:
+            startup.COMPONENTS[name].start()
+        return JSONResponse(status_code=503, content=report)
+    return report
+
+@app.get("/memory")
+def memory():
+    """Per-worker resident memory (this worker and, under gunicorn, its siblings) and how model weights are held."""
+    workers = {pid: startup.memory_report(pid) for pid in startup.worker_pids()}
+    return {
+        "pid": os.getpid(),
+        "weights": get_predictor().weights if startup.model.ready else None,
+        "workers": workers,
+        "total_rss": sum(w.get("rss", 0) for w in workers.values()),
+        "total_pss": sum(w.get("pss", 0) for w in workers.values()),
+    }
+
+async def refresh_field(field_id: str, boundary: dict, crop_type: str) -> dict:
+    """Background refresh of a registered field (see field_scheduler.py)."""
+    with metrics.stage("field_refresh"):
+        return await compute_prediction(boundary, crop_type, field_id)
+
+field_refresher = FieldRefreshScheduler(refresh_field, field_registry)
+
+@app.post("/fields")
+def register_field(payload: dict):
+    """
+    Register a field for background refreshes: {"boundary", "crop_type"?,
+    "field_id"?}. It is scored at the next scheduler tick and then daily;
+    /predict for the same field_id (or polygon) serves the stored result.
+    """
+    boundary = payload.get("boundary")
+    if not boundary:
+        raise HTTPException(status_code=400, detail="Missing 'boundary'")
+    geom = boundary.get("geometry", boundary)
+    if geom.get("type") != "Polygon":
+        raise HTTPException(status_code=400, detail="Only Polygon is supported")
+    field_id = field_key(boundary, payload.get("field_id"))
+    field_registry.register(field_id, boundary, payload.get("crop_type", "general"))
+    field_refresher.enqueue(field_id)
+    return {"field_id": field_id}
+
+@app.get("/fields")
+def list_fields():
+    return {"fields": field_registry.fields()}
+
+@app.delete("/fields/{field_id}")
+def unregister_field(field_id: str):
+    if not field_registry.remove(field_id):
+        raise HTTPException(status_code=404, detail=f"Unknown field '{field_id}'")
+    return {"field_id": field_id, "removed": True}
+
+@app.post("/fields/{field_id}/refresh")
+def refresh_field_now(field_id: str):
+    """Queue an immediate refresh of a registered field."""
+    if not field_registry.mark_due(field_id):
+        raise HTTPException(status_code=404, detail=f"Unknown field '{field_id}'")
+    field_refresher.enqueue(field_id)
+    return {"field_id": field_id, "queued": True}
+
+@app.get("/fields/status")
+def fields_status():
+    """Background refresh progress: queue, running jobs, failures and lag since each field's last refresh."""
+    return field_refresher.status()
+
+@app.get("/history/{field_id}")
+def field_history(field_id: str, start: str = None, end: str = None,
+                  limit: int = Query(HISTORY_MAX_ROWS, ge=1, le=HISTORY_MAX_ROWS)):
+    """
+    Stored per-day stress history of a field (the "field_id" returned by
+    /predict), optionally limited to [start, end] ISO dates. No imagery is fetched.
+    """
+    try:
+        for d in (start, end):
+            if d is not None:
+                datetime.date.fromisoformat(d)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="'start' and 'end' must be YYYY-MM-DD dates")
+    records = history_store.query(field_id, start, end, limit)
+    if not records and start is None and end is None:
+        raise HTTPException(status_code=404, detail=f"No history for field '{field_id}'")
+    return {"field_id": field_id, "summary": summarize_history(records), "records": records}
+
+@app.get("/cascade/stats")
+def cascade_stats():
+    """How often the scalar stage answered vs escalated to the CNN (and why)."""
+    return {"model_loaded": startup.scalar_model.ready, **cascade.stats()}
+
+@app.get("/cache/stats")
+def cache_stats():
+    """Hit/miss counters for the satellite patch cache, the shared grid tiles and the weather cache."""
+    return {**patch_cache.stats(), "tiles": shared_tiles.stats(), "weather": weather_client.stats()}
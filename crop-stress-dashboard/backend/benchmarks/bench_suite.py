@@ -0,0 +1,249 @@
+"""
+Component benchmarks for the /predict hot path: payload decoding,
+preprocessing, model inference at several batch sizes, anomaly detection and
+recommendations, and end-to-end app.predict against recorded fixtures.
+
+Runs fully offline (IMAGERY_PROVIDER=fixtures). Reports p50/p95/p99 latency,
+throughput and peak RSS as JSON; with --baseline, compares against an earlier
+report and exits non-zero when any case regresses beyond --tolerance.
+
+Usage:
+    python benchmarks/bench_suite.py [--repeat 50] [--output report.json]
+    python benchmarks/bench_suite.py --baseline report.json [--tolerance 0.15]
+    python benchmarks/bench_suite.py --only predict,e2e --fixtures fixtures/
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+# Add the backend directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_preprocess import make_stack
+
+COMPONENTS = ["decode", "preprocess", "predict", "anomalies", "e2e"]
+DAYS = 7
+BOUNDARY = {"type": "Polygon", "coordinates": [[[80.0, 7.0], [80.001, 7.0], [80.001, 7.001], [80.0, 7.001], [80.0, 7.0]]]}
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def measure(fn, repeat: int, items: int = 1, warmup: int = 2) -> dict:
+    """Time `fn` `repeat` times; `items` is how many inputs one call handles."""
+    for _ in range(warmup):
+        fn()
+    samples = np.empty(repeat)
+    for i in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples[i] = time.perf_counter() - t0
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99]) * 1e3
+    return {
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "mean_ms": round(float(samples.mean() * 1e3), 3),
+        "throughput_per_s": round(items * repeat / float(samples.sum()), 1),
+        "items_per_call": items,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+# --- components ---
+
+def bench_decode(repeat: int) -> dict:
+    from satellite_gee import NPY_BANDS, decode_npy, json_days_to_array
+
+    stack = make_stack(DAYS + 1)
+    # JSON transport: the getInfo() body for the d{i}_* mega-image
+    suffixes = ["R", "G", "B", "NDVI", "VH", "VV"]
+    body = json.dumps({f"d{i}_{s}": stack[i, c].tolist() for i in range(DAYS + 1) for c, s in enumerate(suffixes)})
+    # NPY transport: computePixels returns one structured (H, W) array
+    dtype = np.dtype([(f"d{i}_{b}", "<f4") for i in range(DAYS + 1) for b in NPY_BANDS])
+    structured = np.empty(stack.shape[2:], dtype=dtype)
+    for i in range(DAYS + 1):
+        for c, b in enumerate(NPY_BANDS):
+            structured[f"d{i}_{b}"] = stack[i, c]
+    with tempfile.TemporaryFile() as f:
+        np.save(f, structured)
+        f.seek(0)
+        npy_bytes = f.read()
+
+    def decode_json():
+        return json_days_to_array(json.loads(body), DAYS + 1)
+
+    def decode_binary():
+        arr = decode_npy(npy_bytes)
+        return arr.reshape((DAYS + 1, len(NPY_BANDS)) + arr.shape[1:])
+
+    assert np.array_equal(decode_json(), decode_binary())
+    return {
+        "decode.json": measure(decode_json, repeat),
+        "decode.npy": measure(decode_binary, repeat),
+    }
+
+
+def bench_preprocess(repeat: int) -> dict:
+    from predictor import predictor
+    from preprocessing import preprocess_stack
+
+    stack = make_stack(DAYS + 1)
+    return {
+        "preprocess.single": measure(lambda: predictor.preprocess(stack[0]), repeat),
+        f"preprocess.batch[{DAYS + 1}]": measure(lambda: preprocess_stack(stack), repeat, items=DAYS + 1),
+    }
+
+
+def bench_predict(repeat: int, batch_sizes: list) -> dict:
+    import torch
+    from predictor import predictor
+
+    results = {}
+    for n in batch_sizes:
+        x = torch.rand(n, 6, 128, 128)
+        results[f"predict[b={n}]"] = measure(lambda: predictor.predict_stress_probs(x), repeat, items=n)
+    return results
+
+
+def bench_anomalies(repeat: int) -> dict:
+    from predictor import predictor
+
+    patch = make_stack(1)[0]
+
+    def run():
+        anomalies = predictor.get_anomalies(patch)
+        return predictor.get_ai_recommendations("High", anomalies, crop_type="rice")
+
+    return {"anomalies+recommendations": measure(run, repeat)}
+
+
+def bench_e2e(repeat: int) -> dict:
+    import app
+
+    loop = asyncio.new_event_loop()
+    payload = {"boundary": BOUNDARY, "crop_type": "rice"}
+    try:
+        return {"e2e.predict": measure(lambda: loop.run_until_complete(app.predict(payload)), repeat)}
+    finally:
+        loop.close()
+
+
+# --- reporting ---
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list:
+    """Print a p50/p95 comparison table and return the names of regressed cases."""
+    regressions = []
+    print(f"{'Case':<28} | {'base p95':>9} | {'p95':>9} | {'ratio':>6} | {'base p50':>9} | {'p50':>9}")
+    print("-" * 84)
+    for name, cur in report["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            print(f"{name:<28} | {'-':>9} | {cur['p95_ms']:>9.3f} | {'new':>6} |")
+            continue
+        ratio = cur["p95_ms"] / base["p95_ms"] if base["p95_ms"] else float("inf")
+        flag = ""
+        if ratio > 1 + tolerance:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<28} | {base['p95_ms']:>9.3f} | {cur['p95_ms']:>9.3f} | {ratio:>5.2f}x | "
+              f"{base['p50_ms']:>9.3f} | {cur['p50_ms']:>9.3f}{flag}")
+    return regressions
+
+
+def prepare_fixtures(fixture_dir: str):
+    """Point the fixture provider at `fixture_dir`, recording a synthetic field if none is given."""
+    if fixture_dir is None:
+        fixture_dir = tempfile.mkdtemp(prefix="bench-fixtures-")
+    os.environ["IMAGERY_PROVIDER"] = "fixtures"
+    # Timings do not depend on the weights, so a missing checkpoint is fine here
+    os.environ.setdefault("STARTUP_ALLOW_RANDOM_WEIGHTS", "1")
+    os.environ["IMAGERY_FIXTURE_DIR"] = fixture_dir
+    from imagery_provider import record_fixture
+
+    if not any(f.endswith(".npz") for f in os.listdir(fixture_dir)):
+        record_fixture(BOUNDARY, {"status": "success", "array": make_stack(DAYS + 1)}, fixture_dir)
+    return fixture_dir
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--batch-sizes", default="1,8,32,128")
+    parser.add_argument("--only", default=",".join(COMPONENTS), help=f"Comma-separated subset of {COMPONENTS}")
+    parser.add_argument("--fixtures", default=None, help="NPZ fixture directory (default: synthetic fixture)")
+    parser.add_argument("--output", default=None, help="Write the JSON report here (default: stdout)")
+    parser.add_argument("--baseline", default=None, help="Earlier JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed p95 slowdown before failing")
+    args = parser.parse_args()
+
+    only = [c.strip() for c in args.only.split(",") if c.strip()]
+    unknown = set(only) - set(COMPONENTS)
+    if unknown:
+        parser.error(f"Unknown components: {', '.join(sorted(unknown))}")
+    batch_sizes = [int(b) for b in args.batch_sizes.split(",")]
+
+    # Offline providers must be configured before app/predictor are imported
+    fixture_dir = prepare_fixtures(args.fixtures)
+
+    import torch
+    results = {}
+    for component in COMPONENTS:
+        if component not in only:
+            continue
+        print(f"Running {component}...", file=sys.stderr)
+        if component == "decode":
+            results.update(bench_decode(args.repeat))
+        elif component == "preprocess":
+            results.update(bench_preprocess(args.repeat))
+        elif component == "predict":
+            results.update(bench_predict(args.repeat, batch_sizes))
+        elif component == "anomalies":
+            results.update(bench_anomalies(args.repeat))
+        elif component == "e2e":
+            results.update(bench_e2e(args.repeat))
+
+    report = {
+        "meta": {
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": np.__version__,
+            "torch": torch.__version__,
+            "torch_threads": torch.get_num_threads(),
+            "repeat": args.repeat,
+            "fixtures": fixture_dir,
+        },
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}", file=sys.stderr)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} case(s) regressed by more than {args.tolerance:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+        print("No regressions.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import os
+import threading
+import warnings
+
+import numpy as np
+
+# --- CONFIGURATION ---
+# Score fields with the scalar gradient-boosting model first and only run the
+# patch fetch + CNN for uncertain ones (per request: {"cascade": true/false})
+CASCADE_ENABLED = os.getenv("CASCADE", "0") == "1"
+CASCADE_MODEL_PATH = os.getenv("CASCADE_MODEL_PATH", "gb_crop_stress_model.pkl")
+# Escalate when the scalar probability is within this distance of a risk threshold
+CASCADE_MARGIN = float(os.getenv("CASCADE_MARGIN", 0.1))
+
+# predictor.prob_to_risk boundaries (Moderate, High)
+RISK_THRESHOLDS = (0.55, 0.85)
+
+# supervisedimprove.ipynb feature order
+FEATURES = ["ndvi_mean", "vh_mean", "vv_mean", "exg_mean"]
+
+
+def load_scalar_model(path: str = CASCADE_MODEL_PATH):
+    """
+    The notebook's GradientBoostingClassifier (joblib pickle, needs the
+    scikit-learn and joblib pinned in requirements.txt). Loading under a
+    different scikit-learn version is reported, as predictions may change.
+    """
+    import joblib
+    import sklearn
+
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        model = joblib.load(os.path.join(os.path.dirname(os.path.abspath(__file__)), path))
+    saved = {w.message.original_sklearn_version for w in caught
+             if type(w.message).__name__ == "InconsistentVersionWarning"}
+    if saved:
+        print(f"Warning: {path} was saved with scikit-learn {', '.join(sorted(saved))} but "
+              f"{sklearn.__version__} is installed; install the pinned version or re-export the model")
+    return model
+
+
+def scalar_features(stats: dict) -> np.ndarray:
+    """
+    The four training features from region statistics. The model was trained
+    on per-image min-max normalized NDVI/VH/VV, approximated here as
+    (mean - min) / (max - min) over the native-resolution field: the notebook
+    resizes to 128 px before normalizing, so its min/max (and hence the
+    feature) differ slightly. ExG is computed from 8-bit RGB / 255, which maps
+    to S2 reflectance / 10000 (as in imagery_provider.LocalRasterProvider).
+    """
+    def norm_mean(band):
+        s = stats[band]
+        return (s["mean"] - s["min"]) / (s["max"] - s["min"] + 1e-6)
+
+    exg = (2 * stats["B3"]["mean"] - stats["B4"]["mean"] - stats["B2"]["mean"]) / 10000.0
+    return np.array([[norm_mean("NDVI"), norm_mean("VH"), norm_mean("VV"), exg]], dtype=np.float64)
+
+
+def raw_means(stats: dict) -> dict:
+    """Band means in raw units, shaped like a patch dict for Predictor.get_anomalies."""
+    return {band: [s["mean"]] for band, s in stats.items()}
+
+
+class Cascade:
+    """Escalation decisions and how often each outcome happens."""
+
+    def __init__(self, margin: float = CASCADE_MARGIN, thresholds: tuple = RISK_THRESHOLDS):
+        self.margin = margin
+        self.thresholds = thresholds
+        self.counters = {"requests": 0, "scalar": 0, "escalated_uncertain": 0, "escalated_no_stats": 0,
+                         "escalated_no_model": 0}
+        self._lock = threading.Lock()
+
+    def uncertain(self, prob: float) -> bool:
+        return any(abs(prob - t) < self.margin for t in self.thresholds)
+
+    def decide(self, model, stats_res: dict):
+        """
+        Score a fetch_region_stats result. Returns (stress_prob or None,
+        escalate, reason); escalation also covers missing stats or model.
+        """
+        prob = None
+        if model is None:
+            reason = "no_model"
+        elif stats_res.get("status") != "success" or not all(b in stats_res["stats"] for b in ("B4", "B3", "B2", "NDVI", "VH", "VV")):
+            reason = "no_stats"
+        else:
+            prob = float(model.predict_proba(scalar_features(stats_res["stats"]))[0, 1])
+            reason = "uncertain" if self.uncertain(prob) else None
+        with self._lock:
+            self.counters["requests"] += 1
+            self.counters[f"escalated_{reason}" if reason else "scalar"] += 1
+        return prob, reason is not None, reason
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self.counters)
+        escalated = counters["requests"] - counters["scalar"]
+        return {
+            "enabled": CASCADE_ENABLED,
+            "margin": self.margin,
+            "escalation_band": [[round(t - self.margin, 4), round(t + self.margin, 4)] for t in self.thresholds],
+            **counters,
+            "escalation_rate": round(escalated / counters["requests"], 4) if counters["requests"] else 0.0,
+        }
+
+
+cascade = Cascade()
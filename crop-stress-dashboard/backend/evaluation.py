@@ -0,0 +1,255 @@
+"""
+Regional evaluation engine.
+
+Reads a site manifest (CSV: name, lon, lat, expected, region), fetches each
+site's patch on a bounded thread pool (preprocessing in the same worker),
+scores finished patches in batches and writes:
+
+    sites.csv     - per-site risk, stress probability, errors and timings
+    confusion.csv - expected vs predicted risk, overall and per region
+    summary.json  - counts, accuracy, confusion matrices, timing breakdown
+
+`expected` is a risk level (Healthy / Moderate / High) or empty for
+unlabelled sites. With --record, fetched patches are saved as fixtures;
+--replay DIR scores against such recordings without touching Earth Engine
+(sites without a recording are reported as errors).
+
+Usage:
+    python evaluation.py eval_sites/sri_lanka.csv --out eval_results/sri_lanka
+    python evaluation.py sites.csv --record fixtures/eval      # live, keep the patches
+    python evaluation.py sites.csv --replay fixtures/eval      # offline rerun
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+
+# Add the current directory to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from imagery_provider import FixtureProvider, get_provider, record_fixture
+from patch_cache import polygon_hash
+from predictor import prob_to_risk
+from preprocessing import preprocess_stack, stack_patches
+
+# --- CONFIGURATION ---
+EVAL_SITES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "eval_sites")
+EVAL_FETCH_WORKERS = int(os.getenv("EVAL_FETCH_WORKERS", 8))
+EVAL_BATCH_SIZE = int(os.getenv("EVAL_BATCH_SIZE", 32))
+SITE_SIZE_DEG = 0.001  # side of the square field polygon around each site
+
+RISK_LEVELS = ["Healthy", "Moderate", "High"]
+SITE_COLUMNS = ["name", "region", "lon", "lat", "expected", "status", "risk", "stress_prob", "match",
+                "error", "fetch_s", "preprocess_s", "inference_s"]
+
+
+def load_manifest(path: str) -> list:
+    """Sites from a manifest CSV; `region` and `expected` are optional."""
+    with open(path, newline="") as f:
+        rows = list(csv.DictReader(f))
+    return [{
+        "name": row["name"],
+        "lon": float(row["lon"]),
+        "lat": float(row["lat"]),
+        "expected": (row.get("expected") or "").strip() or None,
+        "region": (row.get("region") or "").strip() or "all",
+    } for row in rows]
+
+
+def site_boundary(lon: float, lat: float, size: float = SITE_SIZE_DEG) -> dict:
+    return {
+        "type": "Polygon",
+        "coordinates": [[
+            [lon, lat], [lon + size, lat], [lon + size, lat + size], [lon, lat + size], [lon, lat]
+        ]]
+    }
+
+
+def _to_model_input(res: dict) -> np.ndarray:
+    """(1, 6, 128, 128) model input from a fetch_patch_as_array result (array or band dict)."""
+    if "array" in res:
+        return preprocess_stack(np.asarray(res["array"], dtype=np.float32)[:1])
+    stack, present = stack_patches([res["patch_data"]])
+    return preprocess_stack(stack, present=present)
+
+
+class Evaluation:
+    """One run over a manifest: fetch on a thread pool, score in batches, collect results."""
+
+    def __init__(self, provider=None, workers: int = EVAL_FETCH_WORKERS, batch_size: int = EVAL_BATCH_SIZE,
+                 record_dir: str = None, replay_dir: str = None):
+        self.replay_dir = replay_dir
+        self.provider = FixtureProvider(replay_dir) if replay_dir else (provider or get_provider())
+        self.workers = workers
+        self.batch_size = batch_size
+        self.record_dir = record_dir
+        self.timings = {"fetch_s": 0.0, "preprocess_s": 0.0, "inference_s": 0.0, "batches": 0}
+
+    def _fetch(self, site: dict):
+        boundary = site_boundary(site["lon"], site["lat"])
+        t0 = time.perf_counter()
+        if self.replay_dir and not os.path.exists(os.path.join(self.replay_dir, f"{polygon_hash(boundary)}.npz")):
+            return None, {"fetch_s": 0.0}, "no recorded patch"
+        try:
+            res = self.provider.fetch_patch_as_array(boundary)
+        except Exception as e:
+            res = {"status": "error", "message": str(e)}
+        t1 = time.perf_counter()
+        if res.get("status") != "success":
+            return None, {"fetch_s": t1 - t0}, res.get("message", "fetch failed")
+        if self.record_dir:
+            record_fixture(boundary, res, self.record_dir)
+        try:
+            x = _to_model_input(res)
+        except Exception as e:
+            return None, {"fetch_s": t1 - t0}, f"preprocess failed: {e}"
+        return x, {"fetch_s": t1 - t0, "preprocess_s": time.perf_counter() - t1}, None
+
+    def _score(self, pending: list):
+        from predictor import predictor
+        t0 = time.perf_counter()
+        probs = predictor.predict_stress_probs(np.concatenate([x for _, x in pending]))
+        elapsed = time.perf_counter() - t0
+        self.timings["inference_s"] += elapsed
+        self.timings["batches"] += 1
+        for (row, _), prob in zip(pending, probs):
+            row.update(status="success", stress_prob=round(float(prob), 6), risk=prob_to_risk(prob),
+                       inference_s=elapsed / len(pending))
+            if row["expected"]:
+                row["match"] = row["risk"] == row["expected"]
+
+    def run(self, sites: list) -> list:
+        """Per-site result rows, in manifest order."""
+        rows = [dict(site, status="error", risk=None, stress_prob=None, match=None, error=None,
+                     fetch_s=0.0, preprocess_s=0.0, inference_s=0.0) for site in sites]
+        pending = []
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = {pool.submit(self._fetch, site): row for site, row in zip(sites, rows)}
+            for future in as_completed(futures):
+                row = futures[future]
+                x, timing, error = future.result()
+                row.update(timing)
+                self.timings["fetch_s"] += timing.get("fetch_s", 0.0)
+                self.timings["preprocess_s"] += timing.get("preprocess_s", 0.0)
+                if error:
+                    row["error"] = error
+                    continue
+                pending.append((row, x))
+                if len(pending) >= self.batch_size:
+                    self._score(pending)
+                    pending = []
+        if pending:
+            self._score(pending)
+        return rows
+
+
+def confusion(rows: list) -> dict:
+    """{expected: {predicted: count}} over labelled sites; failed sites count as "Error"."""
+    matrix = {e: {p: 0 for p in RISK_LEVELS + ["Error"]} for e in RISK_LEVELS}
+    for row in rows:
+        if row["expected"] in matrix:
+            matrix[row["expected"]][row["risk"] or "Error"] += 1
+    return matrix
+
+
+def summarize(rows: list, timings: dict, wall_s: float) -> dict:
+    labelled = [r for r in rows if r["expected"]]
+    ok = [r for r in rows if r["status"] == "success"]
+    regions = sorted({r["region"] for r in rows})
+    fetch = np.array([r["fetch_s"] for r in rows]) if rows else np.zeros(1)
+    return {
+        "sites": len(rows),
+        "scored": len(ok),
+        "errors": len(rows) - len(ok),
+        "labelled": len(labelled),
+        "accuracy": round(sum(1 for r in labelled if r["match"]) / len(labelled), 4) if labelled else None,
+        "risk_counts": {level: sum(1 for r in ok if r["risk"] == level) for level in RISK_LEVELS},
+        "confusion": confusion(rows),
+        "by_region": {region: {
+            "sites": sum(1 for r in rows if r["region"] == region),
+            "mean_stress_prob": round(float(np.mean([r["stress_prob"] for r in ok if r["region"] == region])), 4)
+            if any(r["region"] == region for r in ok) else None,
+            "confusion": confusion([r for r in rows if r["region"] == region]),
+        } for region in regions},
+        "timing": {
+            "wall_s": round(wall_s, 3),
+            "sites_per_s": round(len(rows) / wall_s, 2) if wall_s else None,
+            "fetch_total_s": round(timings["fetch_s"], 3),
+            "fetch_p50_s": round(float(np.percentile(fetch, 50)), 3),
+            "fetch_p95_s": round(float(np.percentile(fetch, 95)), 3),
+            "preprocess_total_s": round(timings["preprocess_s"], 3),
+            "inference_total_s": round(timings["inference_s"], 3),
+            "inference_batches": timings["batches"],
+        },
+    }
+
+
+def write_results(rows: list, summary: dict, out_dir: str):
+    os.makedirs(out_dir, exist_ok=True)
+    with open(os.path.join(out_dir, "sites.csv"), "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=SITE_COLUMNS, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+    with open(os.path.join(out_dir, "confusion.csv"), "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["region", "expected"] + RISK_LEVELS + ["Error"])
+        tables = [("all", summary["confusion"])] + [(k, v["confusion"]) for k, v in summary["by_region"].items()]
+        for region, matrix in tables:
+            for expected, counts in matrix.items():
+                writer.writerow([region, expected] + [counts[p] for p in RISK_LEVELS + ["Error"]])
+    with open(os.path.join(out_dir, "summary.json"), "w") as f:
+        json.dump(summary, f, indent=2)
+    print(f"Saved results to {out_dir}")
+
+
+def print_table(rows: list, width: int = 45):
+    print(f"{'Location':<{width}} | {'Risk':<10} | {'Prob':<8}")
+    print("-" * (width + 25))
+    for row in rows:
+        if row["status"] != "success":
+            print(f"{row['name']:<{width}} | ERROR      | 0.0000")
+            continue
+        suffix = "" if row["match"] is None else " (Match)" if row["match"] else " (MISMATCH)"
+        print(f"{row['name']:<{width}} | {row['risk']:<10} | {row['stress_prob']:.4f}{suffix}")
+
+
+def evaluate(manifest: str, out_dir: str = None, **kwargs):
+    """Run the manifest; write results to `out_dir` if given. Returns (rows, summary)."""
+    sites = load_manifest(manifest)
+    evaluation = Evaluation(**kwargs)
+    t0 = time.perf_counter()
+    rows = evaluation.run(sites)
+    summary = summarize(rows, evaluation.timings, time.perf_counter() - t0)
+    if out_dir:
+        write_results(rows, summary, out_dir)
+    return rows, summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate the stress model over a site manifest.")
+    parser.add_argument("manifest", help="CSV with name, lon, lat[, expected, region]")
+    parser.add_argument("--out", help="output directory (default: eval_results/<manifest name>)")
+    parser.add_argument("--provider", help="imagery provider (default: IMAGERY_PROVIDER)")
+    parser.add_argument("--workers", type=int, default=EVAL_FETCH_WORKERS)
+    parser.add_argument("--batch-size", type=int, default=EVAL_BATCH_SIZE)
+    parser.add_argument("--record", help="save fetched patches as fixtures in this directory")
+    parser.add_argument("--replay", help="score recorded fixtures from this directory instead of fetching")
+    args = parser.parse_args()
+
+    out_dir = args.out or os.path.join("eval_results", os.path.splitext(os.path.basename(args.manifest))[0])
+    rows, summary = evaluate(args.manifest, out_dir, provider=get_provider(args.provider) if args.provider else None,
+                             workers=args.workers, batch_size=args.batch_size,
+                             record_dir=args.record, replay_dir=args.replay)
+    print_table(rows)
+    timing = summary["timing"]
+    print(f"{summary['scored']}/{summary['sites']} sites scored in {timing['wall_s']}s "
+          f"({timing['sites_per_s']} sites/s)" + (f", accuracy {summary['accuracy']:.2%}" if summary["accuracy"] is not None else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+import base64
+import math
+import os
+
+import cv2
+import numpy as np
+
+from preprocessing import CROP_SIZE, MODEL_SIZE, RASTER_STEP, preprocess_raster
+
+# --- CONFIGURATION ---
+# Distance between window centres (= output cell size) in 10 m pixels. Rounded
+# to a multiple of 7 so every window can be cut from one shared resize.
+MAP_STRIDE_PX = int(os.getenv("MAP_STRIDE_PX", 28))
+MAP_MAX_CELLS = int(os.getenv("MAP_MAX_CELLS", 20000))
+MAP_SCALE = 10  # metres per pixel, as for single patches
+
+_R = 6378137.0
+_COVERAGE_SAMPLES = 8  # polygon coverage is estimated on an 8x8 sub-grid per cell
+
+
+def _to_mercator(lon, lat):
+    lon, lat = np.asarray(lon, dtype=np.float64), np.asarray(lat, dtype=np.float64)
+    return _R * np.radians(lon), _R * np.log(np.tan(np.pi / 4 + np.radians(lat) / 2))
+
+
+def _from_mercator(x, y):
+    return np.degrees(np.asarray(x) / _R), np.degrees(2 * np.arctan(np.exp(np.asarray(y) / _R)) - np.pi / 2)
+
+
+def plan_map(boundary_geojson: dict, stride_px: int = MAP_STRIDE_PX, scale: float = MAP_SCALE) -> dict:
+    """
+    Lay a grid of `stride_px` cells over the polygon's bounding box. Each cell
+    is scored by the 224-px model window centred on it; the returned "grid"
+    is the computePixels grid (EPSG:3857, latitude-corrected pixel size) that
+    covers every window, and "coverage" the fraction of each cell inside the polygon.
+    """
+    geom = boundary_geojson.get("geometry", boundary_geojson)
+    if geom.get("type") != "Polygon":
+        raise ValueError("Only Polygon is supported")
+    ring = np.asarray(geom["coordinates"][0], dtype=np.float64)
+    stride_px = max(RASTER_STEP, int(round(stride_px / RASTER_STEP)) * RASTER_STEP)
+
+    step = scale / math.cos(math.radians(ring[:, 1].mean()))
+    mx, my = _to_mercator(ring[:, 0], ring[:, 1])
+    cell = stride_px * step
+    nx = max(1, math.ceil((mx.max() - mx.min()) / cell))
+    ny = max(1, math.ceil((my.max() - my.min()) / cell))
+    if nx * ny > MAP_MAX_CELLS:
+        raise ValueError(f"Field needs {nx * ny} cells at stride {stride_px}px (max {MAP_MAX_CELLS}); use a larger stride")
+
+    # Window for cell (r, c) starts at pixel (r * stride, c * stride) and is
+    # centred on the cell, so the raster extends past the bbox by `pad`.
+    pad = (CROP_SIZE - stride_px) / 2
+    origin_x, origin_y = mx.min(), my.max()
+
+    # Rasterize the polygon on a sub-cell grid to get per-cell coverage
+    k = _COVERAGE_SAMPLES
+    pts = np.stack([(mx - origin_x) / cell * k, (origin_y - my) / cell * k], axis=1)
+    mask = np.zeros((ny * k, nx * k), dtype=np.uint8)
+    cv2.fillPoly(mask, [np.round(pts * 16).astype(np.int32)], 1, shift=4)
+    coverage = mask.reshape(ny, k, nx, k).mean(axis=(1, 3))
+
+    return {
+        "stride_px": stride_px,
+        "cell_m": stride_px * scale,
+        "nx": nx,
+        "ny": ny,
+        "origin": (origin_x, origin_y),
+        "cell": cell,
+        "coverage": coverage,
+        "grid": {
+            "dimensions": {"width": (nx - 1) * stride_px + CROP_SIZE, "height": (ny - 1) * stride_px + CROP_SIZE},
+            "affineTransform": {
+                "scaleX": step, "shearX": 0, "translateX": origin_x - pad * step,
+                "shearY": 0, "scaleY": -step, "translateY": origin_y + pad * step,
+            },
+            "crsCode": "EPSG:3857",
+        },
+    }
+
+
+def map_cells(layout: dict) -> np.ndarray:
+    """(K, 2) row/col indices of the cells that overlap the polygon."""
+    return np.argwhere(layout["coverage"] > 0)
+
+
+def prepare_windows(raster: np.ndarray):
+    """Normalize and shrink the whole field raster once; windows are then views into it."""
+    present = raster.reshape(raster.shape[0], -1).any(axis=1)
+    return preprocess_raster(raster, present=present)
+
+
+def gather_windows(resized: np.ndarray, layout: dict, cells: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+    """Copy the model windows for `cells` into an (K, 6, 128, 128) batch."""
+    s = layout["stride_px"] * MODEL_SIZE // CROP_SIZE  # exact: stride is a multiple of 7
+    if out is None:
+        out = np.empty((len(cells), resized.shape[0], MODEL_SIZE, MODEL_SIZE), dtype=np.float32)
+    for i, (r, c) in enumerate(cells):
+        out[i] = resized[:, r * s:r * s + MODEL_SIZE, c * s:c * s + MODEL_SIZE]
+    return out
+
+
+def cell_bounds(layout: dict, r: int, c: int) -> list:
+    """[west, south, east, north] of a cell in degrees."""
+    x0 = layout["origin"][0] + c * layout["cell"]
+    y1 = layout["origin"][1] - r * layout["cell"]
+    lon, lat = _from_mercator([x0, x0 + layout["cell"]], [y1 - layout["cell"], y1])
+    return [float(lon[0]), float(lat[0]), float(lon[1]), float(lat[1])]
+
+
+def to_geojson(layout: dict, probs: np.ndarray, risk_fn) -> dict:
+    """FeatureCollection with one square per scored cell."""
+    features = []
+    for r, c in map_cells(layout):
+        w, s, e, n = cell_bounds(layout, r, c)
+        prob = float(probs[r, c])
+        features.append({
+            "type": "Feature",
+            "geometry": {"type": "Polygon", "coordinates": [[[w, s], [e, s], [e, n], [w, n], [w, s]]]},
+            "properties": {
+                "row": int(r), "col": int(c),
+                "stress_prob": round(prob, 4),
+                "risk_level": risk_fn(prob),
+                "coverage": round(float(layout["coverage"][r, c]), 3),
+            },
+        })
+    return {"type": "FeatureCollection", "features": features}
+
+
+def to_raster(layout: dict, probs: np.ndarray) -> dict:
+    """
+    Compact raster: row-major uint8 stress probabilities (value / 254; 255 =
+    outside the field), base64-encoded, with its bounds in degrees.
+    """
+    q = np.full(probs.shape, 255, dtype=np.uint8)
+    inside = ~np.isnan(probs)
+    q[inside] = np.round(probs[inside] * 254).astype(np.uint8)
+    w, _, _, n = cell_bounds(layout, 0, 0)
+    _, s, e, _ = cell_bounds(layout, layout["ny"] - 1, layout["nx"] - 1)
+    return {
+        "width": layout["nx"],
+        "height": layout["ny"],
+        "bounds": [w, s, e, n],
+        "crs": "EPSG:3857",
+        "encoding": "uint8-base64",
+        "scale": 1 / 254,
+        "nodata": 255,
+        "data": base64.b64encode(q.tobytes()).decode("ascii"),
+    }
+
+
+def summarize(layout: dict, probs: np.ndarray, risk_fn) -> dict:
+    """Coverage-weighted mean stress and the share of the field in each risk level."""
+    weights = np.where(np.isnan(probs), 0, layout["coverage"])
+    total = weights.sum()
+    shares = {"High": 0.0, "Moderate": 0.0, "Healthy": 0.0}
+    for (r, c) in map_cells(layout):
+        shares[risk_fn(float(probs[r, c]))] += weights[r, c]
+    return {
+        "mean_stress_prob": round(float(np.nansum(probs * weights) / total), 4) if total else None,
+        "risk_share": {k: round(v / total, 4) if total else 0.0 for k, v in shares.items()},
+        "cells": int(len(map_cells(layout))),
+        "cell_size_m": round(layout["cell_m"], 1),
+    }
@@ -0,0 +1,334 @@
+import asyncio
+import datetime
+import json
+import os
+import random
+import socket
+import sqlite3
+import threading
+import time
+
+# --- CONFIGURATION ---
+FIELD_SCHEDULER_ENABLED = os.getenv("FIELD_SCHEDULER", "1") != "0"
+FIELD_REGISTRY_PATH = os.getenv("FIELD_REGISTRY_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "fields.sqlite3"))
+# Registered fields are refreshed daily at this UTC hour (after the night's Sentinel passes are ingested)
+FIELD_REFRESH_HOUR_UTC = int(os.getenv("FIELD_REFRESH_HOUR_UTC", 2))
+FIELD_REFRESH_WORKERS = int(os.getenv("FIELD_REFRESH_WORKERS", 4))
+# Token bucket for Earth Engine quota: sustained field refreshes per second and burst size
+FIELD_REFRESH_RATE = float(os.getenv("FIELD_REFRESH_RATE", 0.5))
+FIELD_REFRESH_BURST = int(os.getenv("FIELD_REFRESH_BURST", 4))
+FIELD_REFRESH_RETRIES = int(os.getenv("FIELD_REFRESH_RETRIES", 3))
+FIELD_RETRY_BASE_SECONDS = float(os.getenv("FIELD_RETRY_BASE_SECONDS", 5))
+# Precomputed results older than this are not served by /predict
+FIELD_RESULT_MAX_AGE = float(os.getenv("FIELD_RESULT_MAX_AGE", 36 * 3600))
+FIELD_SCHEDULER_TICK = 60  # seconds between checks for due fields
+# A refresh claims its field for this long; if the worker dies, another one picks it up afterwards
+FIELD_CLAIM_SECONDS = 15 * 60
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS fields (
+    field_id TEXT PRIMARY KEY,
+    boundary TEXT NOT NULL,
+    crop_type TEXT NOT NULL,
+    registered_at REAL NOT NULL,
+    next_due REAL NOT NULL,
+    last_attempt REAL,
+    last_success REAL,
+    last_error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT
+);
+CREATE INDEX IF NOT EXISTS fields_next_due ON fields (next_due);
+CREATE TABLE IF NOT EXISTS leases (
+    name TEXT PRIMARY KEY,
+    holder TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+"""
+
+
+def next_refresh_time(now: float, hour_utc: int = FIELD_REFRESH_HOUR_UTC) -> float:
+    """Timestamp of the next daily refresh slot after `now`."""
+    current = datetime.datetime.fromtimestamp(now, datetime.timezone.utc)
+    slot = current.replace(hour=hour_utc, minute=0, second=0, microsecond=0)
+    if slot <= current:
+        slot += datetime.timedelta(days=1)
+    return slot.timestamp()
+
+
+class FieldRegistry:
+    """SQLite table of registered fields, their refresh schedule and latest precomputed result."""
+
+    def __init__(self, path: str = FIELD_REGISTRY_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _execute(self, sql: str, args: tuple = ()) -> list:
+        with self._lock:
+            conn = self._db()
+            with conn:
+                return conn.execute(sql, args).fetchall()
+
+    def _update(self, sql: str, args: tuple = ()) -> int:
+        """Run a write statement; returns the number of rows changed."""
+        with self._lock:
+            conn = self._db()
+            with conn:
+                return conn.execute(sql, args).rowcount
+
+    def register(self, field_id: str, boundary_geojson: dict, crop_type: str = "general"):
+        """
+        Add or update a field; it becomes due immediately. A stored result is
+        dropped when the boundary or crop type changes.
+        """
+        now = time.time()
+        self._execute(
+            "INSERT INTO fields (field_id, boundary, crop_type, registered_at, next_due) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(field_id) DO UPDATE SET boundary = excluded.boundary, crop_type = excluded.crop_type, "
+            "next_due = excluded.next_due, result = CASE WHEN fields.boundary = excluded.boundary "
+            "AND fields.crop_type = excluded.crop_type THEN fields.result ELSE NULL END",
+            (field_id, json.dumps(boundary_geojson), crop_type, now, now))
+
+    def remove(self, field_id: str) -> bool:
+        exists = bool(self._execute("SELECT 1 FROM fields WHERE field_id = ?", (field_id,)))
+        self._execute("DELETE FROM fields WHERE field_id = ?", (field_id,))
+        return exists
+
+    def get(self, field_id: str):
+        rows = self._execute("SELECT field_id, boundary, crop_type FROM fields WHERE field_id = ?", (field_id,))
+        if not rows:
+            return None
+        return {"field_id": rows[0][0], "boundary": json.loads(rows[0][1]), "crop_type": rows[0][2]}
+
+    def fields(self) -> list:
+        rows = self._execute(
+            "SELECT field_id, crop_type, registered_at, next_due, last_attempt, last_success, last_error, attempts "
+            "FROM fields ORDER BY field_id")
+        keys = ["field_id", "crop_type", "registered_at", "next_due", "last_attempt", "last_success", "last_error", "attempts"]
+        return [dict(zip(keys, row)) for row in rows]
+
+    def due(self, now: float) -> list:
+        rows = self._execute("SELECT field_id FROM fields WHERE next_due <= ? ORDER BY next_due", (now,))
+        return [row[0] for row in rows]
+
+    def mark_due(self, field_id: str, when: float = None) -> bool:
+        self._execute("UPDATE fields SET next_due = ? WHERE field_id = ?", (when or time.time(), field_id))
+        return self.get(field_id) is not None
+
+    def claim(self, field_id: str, seconds: float = FIELD_CLAIM_SECONDS) -> bool:
+        """Take a due field for refreshing (pushes next_due out); False if it is not due or another process has it."""
+        now = time.time()
+        return self._update("UPDATE fields SET next_due = ? WHERE field_id = ? AND next_due <= ?",
+                            (now + seconds, field_id, now)) == 1
+
+    def acquire_lease(self, name: str, holder: str, seconds: float) -> bool:
+        """Take or renew the lease `name` for `holder`; False while another holder's lease is unexpired."""
+        now = time.time()
+        self._execute(
+            "INSERT INTO leases (name, holder, expires_at) VALUES (?, ?, ?) ON CONFLICT(name) DO UPDATE SET "
+            "holder = excluded.holder, expires_at = excluded.expires_at "
+            "WHERE leases.holder = excluded.holder OR leases.expires_at <= ?",
+            (name, holder, now + seconds, now))
+        rows = self._execute("SELECT holder FROM leases WHERE name = ?", (name,))
+        return bool(rows) and rows[0][0] == holder
+
+    def record_success(self, field_id: str, result: dict, next_due: float):
+        now = time.time()
+        self._execute(
+            "UPDATE fields SET result = ?, last_attempt = ?, last_success = ?, last_error = NULL, attempts = 0, "
+            "next_due = ? WHERE field_id = ?", (json.dumps(result), now, now, next_due, field_id))
+
+    def record_failure(self, field_id: str, error: str, next_due: float):
+        self._execute(
+            "UPDATE fields SET last_attempt = ?, last_error = ?, attempts = attempts + 1, next_due = ? "
+            "WHERE field_id = ?", (time.time(), error, next_due, field_id))
+
+    def latest(self, field_id: str, max_age: float = FIELD_RESULT_MAX_AGE):
+        """
+        The stored result if it is younger than `max_age` seconds:
+        {"result", "computed_at", "crop_type", "boundary"}.
+        """
+        rows = self._execute("SELECT result, last_success, crop_type, boundary FROM fields WHERE field_id = ?",
+                             (field_id,))
+        if not rows or rows[0][0] is None or time.time() - rows[0][1] > max_age:
+            return None
+        return {"result": json.loads(rows[0][0]), "computed_at": rows[0][1], "crop_type": rows[0][2],
+                "boundary": json.loads(rows[0][3])}
+
+
+class TokenBucket:
+    """Async token bucket: `rate` tokens per second, at most `burst` saved up."""
+
+    def __init__(self, rate: float = FIELD_REFRESH_RATE, burst: int = FIELD_REFRESH_BURST):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        async with self._lock:
+            self._refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+
+class FieldRefreshScheduler:
+    """
+    Refreshes registered fields in the background. A ticker enqueues fields
+    whose next_due has passed; FIELD_REFRESH_WORKERS workers run
+    `refresh_fn(field_id, boundary, crop_type)` (a coroutine returning the
+    /predict result), each Earth Engine-bound attempt taking a token from the
+    bucket, and retry failures with exponential backoff and jitter.
+
+    With several server processes on one registry, only the holder of the
+    "field-scheduler" lease ticks, and every refresh first claims its field,
+    so each due field is refreshed once.
+    """
+
+    def __init__(self, refresh_fn, registry: FieldRegistry, workers: int = FIELD_REFRESH_WORKERS,
+                 bucket: TokenBucket = None, retries: int = FIELD_REFRESH_RETRIES,
+                 retry_base: float = FIELD_RETRY_BASE_SECONDS):
+        self.refresh_fn = refresh_fn
+        self.registry = registry
+        self.workers = workers
+        self.bucket = bucket or TokenBucket()
+        self.retries = retries
+        self.retry_base = retry_base
+        self.counters = {"refreshed": 0, "failed": 0, "retries": 0, "ticks": 0}
+        self.running = {}  # field_id -> start time
+        self._queue = None
+        self._queued = set()
+        self._tasks = []
+        self._loop = None
+        self.holder = None
+        self.leader = False
+        self.last_tick = None
+
+    def start(self):
+        if self._tasks:
+            return
+        self._loop = asyncio.get_running_loop()
+        self.holder = f"{socket.gethostname()}:{os.getpid()}"
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._ticker())]
+        self._tasks += [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def enqueue(self, field_id: str):
+        """Queue a refresh; safe to call from any thread."""
+        if self._loop is None:
+            return
+        try:
+            on_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            self._enqueue(field_id)
+        else:
+            self._loop.call_soon_threadsafe(self._enqueue, field_id)
+
+    def _enqueue(self, field_id: str):
+        if self._queue is not None and field_id not in self._queued and field_id not in self.running:
+            self._queued.add(field_id)
+            self._queue.put_nowait(field_id)
+
+    def enqueue_due(self):
+        self.last_tick = time.time()
+        self.counters["ticks"] += 1
+        for field_id in self.registry.due(self.last_tick):
+            self.enqueue(field_id)
+
+    async def _ticker(self):
+        # Registry calls are blocking SQLite queries, so they run off the event loop
+        while True:
+            try:
+                self.leader = await asyncio.to_thread(
+                    self.registry.acquire_lease, "field-scheduler", self.holder, 3 * FIELD_SCHEDULER_TICK)
+                if self.leader:
+                    await asyncio.to_thread(self.enqueue_due)
+            except Exception as e:
+                print(f"Field scheduler: tick failed: {e}")
+            await asyncio.sleep(FIELD_SCHEDULER_TICK)
+
+    async def _worker(self):
+        while True:
+            field_id = await self._queue.get()
+            self._queued.discard(field_id)
+            self.running[field_id] = time.time()
+            try:
+                await self._refresh(field_id)
+            finally:
+                self.running.pop(field_id, None)
+                self._queue.task_done()
+
+    async def _refresh(self, field_id: str):
+        field = await asyncio.to_thread(self.registry.get, field_id)
+        if field is None or not await asyncio.to_thread(self.registry.claim, field_id):
+            return  # removed while queued, not due anymore, or taken by another process
+        error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self.counters["retries"] += 1
+                await asyncio.sleep(self.retry_base * 2 ** (attempt - 1) * (1 + random.random()))
+            await self.bucket.acquire()
+            try:
+                result = await self.refresh_fn(field_id, field["boundary"], field["crop_type"])
+            except Exception as e:
+                error = getattr(e, "detail", None) or str(e) or type(e).__name__
+                continue
+            await asyncio.to_thread(self.registry.record_success, field_id, result, next_refresh_time(time.time()))
+            self.counters["refreshed"] += 1
+            return
+        # Give up until the next slot, but no later than an hour from now
+        await asyncio.to_thread(self.registry.record_failure, field_id, error,
+                                min(next_refresh_time(time.time()), time.time() + 3600))
+        self.counters["failed"] += 1
+        print(f"Field scheduler: {field_id} failed after {self.retries + 1} attempts: {error}")
+
+    def status(self) -> dict:
+        now = time.time()
+        fields = self.registry.fields()
+        lags = [now - f["last_success"] if f["last_success"] else now - f["registered_at"] for f in fields]
+        overdue = [f["field_id"] for f in fields if f["next_due"] <= now]
+        return {
+            "enabled": bool(self._tasks),
+            "leader": self.leader,
+            "fields": len(fields),
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "running": {k: round(now - v, 1) for k, v in self.running.items()},
+            "overdue": len(overdue),
+            "never_refreshed": sum(1 for f in fields if not f["last_success"]),
+            "failing": [f["field_id"] for f in fields if f["last_error"]],
+            "max_lag_seconds": round(max(lags), 1) if lags else None,
+            "mean_lag_seconds": round(sum(lags) / len(lags), 1) if lags else None,
+            "tokens": round(min(self.bucket.burst, self.bucket.tokens + (time.monotonic() - self.bucket.updated) * self.bucket.rate), 2),
+            "last_tick": self.last_tick,
+            "next_slot": next_refresh_time(now),
+            **self.counters,
+        }
+
+
+field_registry = FieldRegistry()
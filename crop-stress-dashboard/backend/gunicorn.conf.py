@@ -0,0 +1,28 @@
+"""
+Gunicorn settings for multi-worker deployments that share one copy of the
+model weights:
+
+    gunicorn -c gunicorn.conf.py app:app
+
+With preload_app the master imports the app and loads the weights before
+forking, so workers inherit them copy-on-write; MODEL_WEIGHTS_MMAP=1 adds a
+memory-mapped, page-cache-backed copy that also survives worker restarts.
+Only weights are loaded in the master: no forward pass (OpenMP threads)
+and no Earth Engine session, which must not cross a fork.
+"""
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", 2))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 120))
+
+
+def on_starting(server):
+    from predictor import preload_weights
+    try:
+        preload_weights()
+    except Exception as e:
+        # Workers fall back to loading their own copy
+        print(f"Warning: could not preload model weights ({e})")
@@ -0,0 +1,116 @@
+import datetime
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# --- CONFIGURATION ---
+HISTORY_ENABLED = os.getenv("HISTORY_STORE", "1") != "0"
+HISTORY_DB_PATH = os.getenv("HISTORY_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "history.sqlite3"))
+HISTORY_MAX_ROWS = int(os.getenv("HISTORY_MAX_ROWS", 2000))  # per query
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS observations (
+    field_id TEXT NOT NULL,
+    date TEXT NOT NULL,
+    stress_prob REAL NOT NULL,
+    risk_level TEXT NOT NULL,
+    anomalies TEXT,
+    model_version TEXT,
+    source TEXT,
+    recorded_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS observations_field_date ON observations (field_id, date);
+"""
+
+
+class HistoryStore:
+    """
+    Append-only SQLite log of per-field, per-day stress probabilities.
+
+    Every prediction appends one row per scored day; re-scoring a day adds a
+    new row rather than updating the old one, and queries return the latest
+    row per day. Reads are (field_id, date) index range scans.
+    """
+
+    def __init__(self, path: str = HISTORY_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._ready = False
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            if not self._ready:
+                with self._write_lock:
+                    conn.executescript(_SCHEMA)
+                self._ready = True
+            self._local.conn = conn
+        return conn
+
+    def append(self, field_id: str, day_probs: dict, risk_fn, anomalies: list = None,
+               model_version: str = None, source: str = "cnn", today: datetime.date = None):
+        """
+        Record {day offset: stress_prob} for a field (offset 0 = `today`).
+        Anomalies describe today's patch and are stored on that day only.
+        """
+        today = today or datetime.date.today()
+        now = time.time()
+        rows = [
+            (field_id, (today - datetime.timedelta(days=offset)).isoformat(), float(prob), risk_fn(float(prob)),
+             json.dumps(anomalies or []) if offset == 0 else None, model_version, source, now)
+            for offset, prob in day_probs.items()
+        ]
+        conn = self._conn()
+        with self._write_lock, conn:
+            conn.executemany("INSERT INTO observations VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def query(self, field_id: str, start: str = None, end: str = None, limit: int = HISTORY_MAX_ROWS) -> list:
+        """Latest record per day for the newest `limit` days of `field_id` in [start, end] (ISO dates), oldest first."""
+        # Latest row per day, newest `limit` days first, then flipped to oldest first
+        sql = ("SELECT date, stress_prob, risk_level, anomalies, model_version, source, recorded_at FROM ("
+               "SELECT *, ROW_NUMBER() OVER (PARTITION BY date ORDER BY recorded_at DESC, rowid DESC) AS rank "
+               "FROM observations WHERE field_id = ? AND date >= ? AND date <= ?) "
+               "WHERE rank = 1 ORDER BY date DESC LIMIT ?")
+        cur = self._conn().execute(sql, (field_id, start or "0000-00-00", end or "9999-99-99", max(1, min(limit, HISTORY_MAX_ROWS))))
+        records = [{
+            "date": date,
+            "stress_prob": round(prob, 4),
+            "health_score": round(1 - prob, 2),
+            "risk_level": risk,
+            "anomalies": json.loads(anomalies) if anomalies is not None else None,
+            "model_version": version,
+            "source": source,
+            "recorded_at": recorded_at,
+        } for date, prob, risk, anomalies, version, source, recorded_at in cur]
+        records.reverse()
+        return records
+
+    def fields(self) -> list:
+        return [row[0] for row in self._conn().execute("SELECT DISTINCT field_id FROM observations")]
+
+
+def summarize(records: list) -> dict:
+    """Mean stress and the change in health score over the returned range."""
+    if not records:
+        return {"days": 0}
+    probs = [r["stress_prob"] for r in records]
+    change = round(records[-1]["health_score"] - records[0]["health_score"], 2)
+    return {
+        "days": len(records),
+        "first_date": records[0]["date"],
+        "last_date": records[-1]["date"],
+        "mean_stress_prob": round(sum(probs) / len(probs), 4),
+        "max_stress_prob": round(max(probs), 4),
+        "health_change": change,
+        "trend_status": "Improving" if change > 0.05 else "Increasing" if change < -0.05 else "Stable",
+    }
+
+
+history_store = HistoryStore()
@@ -0,0 +1,249 @@
+import functools
+import os
+
+import numpy as np
+
+from patch_cache import polygon_hash
+
+# --- CONFIGURATION ---
+# "gee" (Earth Engine), "local" (dataset GeoTIFFs) or "fixtures" (recorded NPZ)
+IMAGERY_PROVIDER = os.getenv("IMAGERY_PROVIDER", "gee")
+LOCAL_DATASET_DIR = os.getenv("LOCAL_DATASET_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Dataset"))
+IMAGERY_FIXTURE_DIR = os.getenv("IMAGERY_FIXTURE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures"))
+
+# Band order of provider arrays; matches the model's training order.
+PROVIDER_BANDS = ["B4", "B3", "B2", "NDVI", "VH", "VV"]
+
+
+class ImageryProvider:
+    """
+    Source of 6-band patches for the prediction pipeline.
+
+    fetch_patch_as_array / fetch_daily_timeseries return the same result dicts
+    as satellite_gee: {"status": "success", ...} or {"status": "error", "message": ...}.
+    Offline providers always return "array" results: (days, 6, H, W) float32 in
+    PROVIDER_BANDS order with raw band units (S2 reflectance, NDVI, SAR dB).
+    """
+    name = "base"
+
+    def fetch_patch_as_array(self, boundary_geojson: dict, size: int = 224, end_date: str = None) -> dict:
+        raise NotImplementedError
+
+    def fetch_daily_timeseries(self, boundary_geojson: dict, days: int = 7) -> dict:
+        raise NotImplementedError
+
+    def fetch_raster(self, boundary_geojson: dict, grid: dict, end_date: str = None) -> dict:
+        """(6, H, W) "array" covering a computePixels-style `grid` (see field_map.py)."""
+        raise NotImplementedError
+
+    def fetch_region_stats(self, boundary_geojson: dict, end_date: str = None) -> dict:
+        """"stats": {band: {"mean", "min", "max"}} over the field, in raw band units."""
+        raise NotImplementedError
+
+
+class GEEProvider(ImageryProvider):
+    """Live Earth Engine imagery (satellite_gee)."""
+    name = "gee"
+
+    def __init__(self):
+        import satellite_gee
+        self._gee = satellite_gee
+
+    def fetch_patch_as_array(self, boundary_geojson: dict, size: int = 224, end_date: str = None) -> dict:
+        return self._gee.fetch_patch_as_array(boundary_geojson, size=size, end_date=end_date)
+
+    def fetch_daily_timeseries(self, boundary_geojson: dict, days: int = 7) -> dict:
+        return self._gee.fetch_daily_timeseries(boundary_geojson, days=days)
+
+    def fetch_raster(self, boundary_geojson: dict, grid: dict, end_date: str = None) -> dict:
+        return self._gee.fetch_raster(boundary_geojson, grid, end_date=end_date)
+
+    def fetch_region_stats(self, boundary_geojson: dict, end_date: str = None) -> dict:
+        return self._gee.fetch_region_stats(boundary_geojson, end_date=end_date)
+
+
+class _OfflineProvider(ImageryProvider):
+    """Shared logic for providers that map every polygon onto a fixed set of samples."""
+
+    def _names(self) -> list:
+        raise NotImplementedError
+
+    def _load(self, name: str) -> np.ndarray:
+        """(days, 6, H, W) float32 stack for one sample."""
+        raise NotImplementedError
+
+    def _pick(self, boundary_geojson: dict) -> str:
+        """Deterministically map a polygon to a sample (exact hash match first)."""
+        names = self._names()
+        if not names:
+            raise FileNotFoundError(f"No samples available for the '{self.name}' imagery provider")
+        key = polygon_hash(boundary_geojson)
+        if key in names:
+            return key
+        return names[int(key, 16) % len(names)]
+
+    def _days(self, boundary_geojson: dict, n_days: int) -> np.ndarray:
+        stack = self._load(self._pick(boundary_geojson))
+        if len(stack) < n_days:
+            # Repeat the oldest available day to fill the window
+            stack = np.concatenate([stack, np.repeat(stack[-1:], n_days - len(stack), axis=0)])
+        return stack[:n_days]
+
+    def fetch_patch_as_array(self, boundary_geojson: dict, size: int = 224, end_date: str = None) -> dict:
+        try:
+            return {"status": "success", "array": self._days(boundary_geojson, 1), "bands": PROVIDER_BANDS}
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+    def fetch_daily_timeseries(self, boundary_geojson: dict, days: int = 7) -> dict:
+        try:
+            return {"status": "success", "array": self._days(boundary_geojson, days + 1), "bands": PROVIDER_BANDS}
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+    def fetch_raster(self, boundary_geojson: dict, grid: dict, end_date: str = None) -> dict:
+        # Tile the sample (most recent day) across the requested grid
+        try:
+            sample = self._days(boundary_geojson, 1)[0]
+            height, width = grid["dimensions"]["height"], grid["dimensions"]["width"]
+            reps = (1, -(-height // sample.shape[1]), -(-width // sample.shape[2]))
+            arr = np.ascontiguousarray(np.tile(sample, reps)[:, :height, :width])
+            return {"status": "success", "array": arr, "bands": PROVIDER_BANDS}
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+    def fetch_region_stats(self, boundary_geojson: dict, end_date: str = None) -> dict:
+        # Statistics of the whole sample (most recent day)
+        try:
+            sample = self._days(boundary_geojson, 1)[0]
+            stats = {
+                band: {"mean": float(plane.mean()), "min": float(plane.min()), "max": float(plane.max())}
+                for band, plane in zip(PROVIDER_BANDS, sample)
+            }
+            return {"status": "success", "stats": stats}
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+
+def _read_band(path: str) -> np.ndarray:
+    """Single-band GeoTIFF as float32 (rasterio if installed, else OpenCV)."""
+    try:
+        import rasterio
+        with rasterio.open(path) as src:
+            return src.read(1).astype(np.float32)
+    except ImportError:
+        import cv2
+        img = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+        if img is None:
+            raise FileNotFoundError(path)
+        return (img if img.ndim == 2 else img[..., 0]).astype(np.float32)
+
+
+class LocalRasterProvider(_OfflineProvider):
+    """
+    Serves patches from the dataset layout used by the notebooks:
+    <dataset>/RGB, <dataset>/NDVI, <dataset>/SAR/VH and <dataset>/SAR/VV, with
+    aligned file names. Each polygon maps to one aligned sample, which is
+    returned for every day of a time series.
+
+    8-bit RGB is rescaled to the S2 reflectance range (x / 255 * 10000), so the
+    predictor's /10000 step gives the notebooks' x / 255. NDVI and SAR (dB) are
+    passed through unchanged.
+    """
+    name = "local"
+
+    def __init__(self, dataset_dir: str = LOCAL_DATASET_DIR, max_cached: int = 256):
+        self.dataset_dir = dataset_dir
+        self.dirs = {
+            "RGB": os.path.join(dataset_dir, "RGB"),
+            "NDVI": os.path.join(dataset_dir, "NDVI"),
+            "VH": os.path.join(dataset_dir, "SAR", "VH"),
+            "VV": os.path.join(dataset_dir, "SAR", "VV"),
+        }
+        self._load = functools.lru_cache(maxsize=max_cached)(self._read_sample)
+
+    @functools.lru_cache(maxsize=1)
+    def _names(self) -> list:
+        # Keep only aligned filenames
+        try:
+            sets = [set(os.listdir(d)) for d in self.dirs.values()]
+        except FileNotFoundError:
+            return []
+        return sorted(set.intersection(*sets))
+
+    def _read_sample(self, name: str) -> np.ndarray:
+        import cv2
+
+        ndvi = _read_band(os.path.join(self.dirs["NDVI"], name))
+        h, w = ndvi.shape
+
+        def fit(band):
+            return band if band.shape == (h, w) else cv2.resize(band, (w, h))
+
+        bgr = cv2.imread(os.path.join(self.dirs["RGB"], name))
+        if bgr is None:
+            raise FileNotFoundError(os.path.join(self.dirs["RGB"], name))
+        rgb = fit(cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB).astype(np.float32)) * (10000.0 / 255.0)
+        vh = fit(_read_band(os.path.join(self.dirs["VH"], name)))
+        vv = fit(_read_band(os.path.join(self.dirs["VV"], name)))
+
+        stack = np.stack([rgb[..., 0], rgb[..., 1], rgb[..., 2], ndvi, vh, vv])
+        stack.setflags(write=False)
+        return stack[None]
+
+
+class FixtureProvider(_OfflineProvider):
+    """
+    Serves recorded patches from NPZ fixtures: <fixture_dir>/<name>.npz, each
+    with an "array" of shape (days, 6, H, W) (index 0 = most recent day).
+    Fixtures recorded with record_fixture() are named by polygon hash, so a
+    recorded field replays exactly; other polygons map onto a fixture by hash.
+    """
+    name = "fixtures"
+
+    def __init__(self, fixture_dir: str = IMAGERY_FIXTURE_DIR, max_cached: int = 256):
+        self.fixture_dir = fixture_dir
+        self._load = functools.lru_cache(maxsize=max_cached)(self._read_fixture)
+
+    def _names(self) -> list:
+        if not os.path.isdir(self.fixture_dir):
+            return []
+        return sorted(f[:-4] for f in os.listdir(self.fixture_dir) if f.endswith(".npz"))
+
+    def _read_fixture(self, name: str) -> np.ndarray:
+        with np.load(os.path.join(self.fixture_dir, f"{name}.npz")) as f:
+            arr = np.ascontiguousarray(f["array"], dtype=np.float32)
+        arr.setflags(write=False)
+        return arr
+
+
+def record_fixture(boundary_geojson: dict, result: dict, fixture_dir: str = IMAGERY_FIXTURE_DIR) -> str:
+    """
+    Save a successful fetch_daily_timeseries / fetch_patch_as_array result as
+    an NPZ fixture named by the polygon hash. Returns the fixture path.
+    """
+    if "array" in result:
+        arr = np.asarray(result["array"], dtype=np.float32)
+    elif "data" in result:
+        from satellite_gee import json_days_to_array
+        n_days = len([k for k in result["data"] if k.endswith("_NDVI")])
+        arr = json_days_to_array(result["data"], n_days)
+    else:
+        # JSON single patch: {"B4": ..., "B3": ..., ...}
+        from preprocessing import stack_patches
+        arr, _ = stack_patches([result["patch_data"]])
+    os.makedirs(fixture_dir, exist_ok=True)
+    path = os.path.join(fixture_dir, f"{polygon_hash(boundary_geojson)}.npz")
+    np.savez_compressed(path, array=arr, bands=np.array(PROVIDER_BANDS))
+    return path
+
+
+_PROVIDERS = {"gee": GEEProvider, "local": LocalRasterProvider, "fixtures": FixtureProvider}
+
+
+def get_provider(name: str = None) -> ImageryProvider:
+    """Build the imagery provider selected by `name` or IMAGERY_PROVIDER."""
+    name = name or IMAGERY_PROVIDER
+    if name not in _PROVIDERS:
+        raise ValueError(f"Unknown imagery provider '{name}' (choose from {', '.join(_PROVIDERS)})")
+    return _PROVIDERS[name]()
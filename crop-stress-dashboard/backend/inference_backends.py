@@ -0,0 +1,273 @@
+import copy
+import os
+import tempfile
+import time
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+from imagery_provider import IMAGERY_FIXTURE_DIR
+from preprocessing import MODEL_BANDS, MODEL_SIZE, preprocess_stack
+
+# --- CONFIGURATION ---
+# eager | torchscript | compile | onnx | quant_dynamic | quant_static
+# (quant_dynamic only quantizes the Linear classifier head, so it is not
+# meaningfully faster on this conv-dominated network; see _quant_dynamic)
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "eager")
+INFERENCE_CHANNELS_LAST = os.getenv("INFERENCE_CHANNELS_LAST", "0") == "1"
+# Intra-/inter-op thread pools; 0 leaves torch's defaults
+TORCH_NUM_THREADS = int(os.getenv("TORCH_NUM_THREADS", 0))
+TORCH_INTEROP_THREADS = int(os.getenv("TORCH_INTEROP_THREADS", 0))
+# Recorded NPZ patches used for static-quantization calibration and the accuracy check
+INFERENCE_CALIBRATION_DIR = os.getenv("INFERENCE_CALIBRATION_DIR", IMAGERY_FIXTURE_DIR)
+INFERENCE_CALIBRATION_SAMPLES = int(os.getenv("INFERENCE_CALIBRATION_SAMPLES", 64))
+# An optimized backend is rejected (eager is used instead) if fewer samples
+# than this keep the eager model's prob_to_risk level.
+INFERENCE_MIN_RISK_AGREEMENT = float(os.getenv("INFERENCE_MIN_RISK_AGREEMENT", 0.99))
+
+BACKENDS = ["eager", "torchscript", "compile", "onnx", "quant_dynamic", "quant_static"]
+CPU_ONLY_BACKENDS = {"onnx", "quant_dynamic", "quant_static"}
+
+
+def configure_threads(num_threads: int = TORCH_NUM_THREADS, interop_threads: int = TORCH_INTEROP_THREADS):
+    """Apply the intra-/inter-op thread settings (inter-op only works before the first parallel op)."""
+    if num_threads > 0:
+        torch.set_num_threads(num_threads)
+    if interop_threads > 0:
+        try:
+            torch.set_num_interop_threads(interop_threads)
+        except RuntimeError as e:
+            print(f"Warning: could not set inter-op threads ({e})")
+
+
+def split_samples(samples: torch.Tensor):
+    """(calibration, validation) halves of `samples`, interleaved so both cover every fixture."""
+    return samples[0::2], samples[1::2]
+
+
+def recorded_samples(n: int = INFERENCE_CALIBRATION_SAMPLES, calibration_dir: str = INFERENCE_CALIBRATION_DIR) -> torch.Tensor:
+    """Up to `n` preprocessed (N, 6, 128, 128) patches from the NPZ fixtures in `calibration_dir` (possibly none)."""
+    stacks = []
+    if os.path.isdir(calibration_dir):
+        for name in sorted(os.listdir(calibration_dir)):
+            if name.endswith(".npz") and sum(len(s) for s in stacks) < n:
+                with np.load(os.path.join(calibration_dir, name)) as f:
+                    stacks.append(preprocess_stack(np.asarray(f["array"], dtype=np.float32)))
+    if not stacks:
+        return torch.empty((0, len(MODEL_BANDS), MODEL_SIZE, MODEL_SIZE))
+    return torch.from_numpy(np.concatenate(stacks)[:n])
+
+
+def calibration_samples(n: int = INFERENCE_CALIBRATION_SAMPLES, calibration_dir: str = INFERENCE_CALIBRATION_DIR,
+                        seed: int = 0) -> torch.Tensor:
+    """
+    recorded_samples() topped up to `n` with synthetic patches in realistic
+    raw ranges. Only for latency benchmarks: random patches say nothing about
+    whether a backend keeps real fields' risk levels.
+    """
+    recorded = recorded_samples(n, calibration_dir)
+    stacks = [recorded.numpy()]
+    have = len(recorded)
+    if have < n:
+        rng = np.random.default_rng(seed)
+        size = 225
+        raw = np.empty((n - have, len(MODEL_BANDS), size, size), dtype=np.float32)
+        raw[:, 0:3] = rng.uniform(0, 4000, (n - have, 3, size, size))
+        raw[:, 3] = rng.uniform(-0.2, 0.9, (n - have, size, size))
+        raw[:, 4:6] = rng.uniform(-30, 0, (n - have, 2, size, size))
+        stacks.append(preprocess_stack(raw))
+    return torch.from_numpy(np.concatenate(stacks)[:n])
+
+
+# --- backend builders (each returns a callable: (N, 6, 128, 128) tensor -> logits) ---
+
+def _torchscript(model, example, calibration):
+    with torch.no_grad():
+        traced = torch.jit.trace(model, example)
+    return torch.jit.optimize_for_inference(torch.jit.freeze(traced))
+
+
+def _compile(model, example, calibration):
+    # dynamic=True avoids a recompile for every new batch size
+    return torch.compile(model, dynamic=True)
+
+
+def _onnx(model, example, calibration):
+    import onnxruntime as ort
+
+    export_kwargs = dict(input_names=["x"], output_names=["logits"],
+                         dynamic_axes={"x": {0: "n"}, "logits": {0: "n"}}, opset_version=17)
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    options.intra_op_num_threads = TORCH_NUM_THREADS or torch.get_num_threads()
+    # The session keeps the model in memory, so the exported file can go
+    with tempfile.TemporaryDirectory(prefix="crop-stress-onnx-") as tmp:
+        path = os.path.join(tmp, "model.onnx")
+        try:
+            torch.onnx.export(model, (example,), path, dynamo=False, **export_kwargs)
+        except TypeError:
+            # Older torch without the dynamo switch
+            torch.onnx.export(model, (example,), path, **export_kwargs)
+        session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+
+    def run(x: torch.Tensor) -> torch.Tensor:
+        (logits,) = session.run(None, {"x": x.contiguous().numpy()})
+        return torch.from_numpy(logits)
+
+    return run
+
+
+def _quant_dynamic(model, example, calibration):
+    # Dynamic quantization only covers Linear layers, i.e. the final fc head:
+    # every convolution stays fp32, so expect no real speedup (use quant_static)
+    return torch.ao.quantization.quantize_dynamic(copy.deepcopy(model), {nn.Linear}, dtype=torch.qint8)
+
+
+def _quant_static(model, example, calibration):
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+    engine = "x86" if "x86" in torch.backends.quantized.supported_engines else "fbgemm"
+    torch.backends.quantized.engine = engine
+    prepared = prepare_fx(copy.deepcopy(model).eval(), get_default_qconfig_mapping(engine), (example,))
+    with torch.no_grad():
+        for batch in calibration.split(16):
+            prepared(batch)
+    return convert_fx(prepared)
+
+
+_BUILDERS = {
+    "eager": lambda model, example, calibration: model,
+    "torchscript": _torchscript,
+    "compile": _compile,
+    "onnx": _onnx,
+    "quant_dynamic": _quant_dynamic,
+    "quant_static": _quant_static,
+}
+
+
+def build_backend(model: nn.Module, name: str = INFERENCE_BACKEND, device: torch.device = torch.device("cpu"),
+                  channels_last: bool = INFERENCE_CHANNELS_LAST, calibration: torch.Tensor = None):
+    """
+    Wrap the eval-mode eager `model` in the requested inference backend.
+    Returns (backend name, runner); runner maps an (N, 6, 128, 128) float
+    tensor on `device` to logits.
+    """
+    if name not in _BUILDERS:
+        raise ValueError(f"Unknown inference backend '{name}' (choose from {', '.join(BACKENDS)})")
+    if name in CPU_ONLY_BACKENDS and device.type != "cpu":
+        print(f"Warning: inference backend '{name}' is CPU-only; using eager on {device}")
+        name = "eager"
+
+    memory_format = torch.channels_last if channels_last and name != "onnx" else torch.contiguous_format
+    if memory_format is torch.channels_last:
+        model = copy.deepcopy(model).to(memory_format=memory_format)
+    if calibration is None and name == "quant_static":
+        calibration = calibration_samples()
+    example = torch.rand(2, len(MODEL_BANDS), MODEL_SIZE, MODEL_SIZE, device=device).contiguous(memory_format=memory_format)
+
+    compiled = _BUILDERS[name](model, example, calibration)
+
+    def run(x: torch.Tensor) -> torch.Tensor:
+        return compiled(x.contiguous(memory_format=memory_format))
+
+    return name, run
+
+
+def check_accuracy(reference, candidate, samples: torch.Tensor, stress_class_index: int = 1) -> dict:
+    """
+    Compare a backend's stress probabilities with the eager model's on
+    `samples`: max/mean absolute difference and the share of samples whose
+    prob_to_risk level is unchanged.
+    """
+    from predictor import prob_to_risk
+
+    with torch.no_grad():
+        ref = torch.softmax(reference(samples), dim=1)[:, stress_class_index].cpu().numpy()
+        out = torch.softmax(candidate(samples), dim=1)[:, stress_class_index].cpu().numpy()
+    diff = np.abs(ref - out)
+    agree = np.mean([prob_to_risk(a) == prob_to_risk(b) for a, b in zip(ref, out)])
+    return {
+        "max_abs_diff": float(diff.max()),
+        "mean_abs_diff": float(diff.mean()),
+        "risk_agreement": float(agree),
+        "samples": len(samples),
+    }
+
+
+def select_backend(model: nn.Module, name: str = INFERENCE_BACKEND, device: torch.device = torch.device("cpu"),
+                   channels_last: bool = INFERENCE_CHANNELS_LAST):
+    """
+    Build the configured backend and validate it against the eager model on
+    recorded patches: half of them calibrate quant_static, the other half are
+    held out for the accuracy check. Falls back to eager (with a warning) if
+    there are too few recorded patches to check against, or if the backend
+    cannot be built or changes risk levels on them. Returns (name, runner, report).
+    """
+    eager = build_backend(model, "eager", device, channels_last=False)[1]
+    if name == "eager" and not channels_last:
+        return "eager", eager, None
+    calibration, validation = split_samples(recorded_samples().to(device))
+    if not len(validation):
+        print(f"WARNING: fewer than 2 recorded patches in {INFERENCE_CALIBRATION_DIR} to calibrate and validate "
+              f"inference backend '{name}' with; using eager. Record fixtures or set INFERENCE_CALIBRATION_DIR.")
+        return "eager", eager, None
+    try:
+        name, runner = build_backend(model, name, device, channels_last=channels_last, calibration=calibration)
+        report = check_accuracy(eager, runner, validation)
+    except Exception as e:
+        print(f"Warning: inference backend '{name}' unavailable ({e}); using eager")
+        return "eager", eager, None
+    if report["risk_agreement"] < INFERENCE_MIN_RISK_AGREEMENT:
+        print(f"Warning: inference backend '{name}' changes risk levels ({report}); using eager")
+        return "eager", eager, report
+    print(f"Inference backend: {name} (channels_last={channels_last}, max |dp|={report['max_abs_diff']:.2e})")
+    return name, runner, report
+
+
+def main():
+    """Compare every backend's latency and accuracy against eager on this machine."""
+    import argparse
+
+    from predictor import MODEL_PATH, Predictor
+
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    parser.add_argument("--batch-sizes", default="1,8,32")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--channels-last", action="store_true")
+    args = parser.parse_args()
+
+    configure_threads()
+    model = Predictor(MODEL_PATH).model.cpu().eval()
+    eager = build_backend(model, "eager")[1]
+    samples = calibration_samples()
+    if not len(recorded_samples()):
+        print(f"WARNING: no recorded patches in {INFERENCE_CALIBRATION_DIR}; accuracy below is on synthetic patches only")
+    batch_sizes = [int(b) for b in args.batch_sizes.split(",")]
+
+    print(f"{'Backend':<14} | " + " | ".join(f"b={n:<3} ms" for n in batch_sizes) + " | max |dp|  | risk agree")
+    print("-" * (45 + 11 * len(batch_sizes)))
+    for name in args.backends.split(","):
+        try:
+            calibration, validation = split_samples(samples)
+            _, runner = build_backend(model, name, channels_last=args.channels_last, calibration=calibration)
+            report = check_accuracy(eager, runner, validation)
+            timings = []
+            with torch.no_grad():
+                for n in batch_sizes:
+                    x = samples[:n] if n <= len(samples) else samples.repeat(n // len(samples) + 1, 1, 1, 1)[:n]
+                    runner(x)
+                    t0 = time.perf_counter()
+                    for _ in range(args.repeat):
+                        runner(x)
+                    timings.append((time.perf_counter() - t0) / args.repeat * 1e3)
+        except Exception as e:
+            print(f"{name:<14} | unavailable: {e}")
+            continue
+        print(f"{name:<14} | " + " | ".join(f"{t:>8.2f}" for t in timings)
+              + f" | {report['max_abs_diff']:.2e} | {report['risk_agreement']:.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+import asyncio
+import collections
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+# --- CONFIGURATION ---
+INFERENCE_MAX_BATCH = int(os.getenv("INFERENCE_MAX_BATCH", 64))
+# How long the first queued patch may wait for others to join its batch
+INFERENCE_MAX_WAIT_MS = float(os.getenv("INFERENCE_MAX_WAIT_MS", 5))
+
+HISTOGRAM_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+def _bucket(value: int) -> str:
+    for edge in HISTOGRAM_BUCKETS:
+        if value <= edge:
+            return str(edge)
+    return "+Inf"
+
+
+class InferenceScheduler:
+    """
+    Micro-batching queue in front of the model. Callers submit preprocessed
+    (n, 6, 128, 128) arrays from any thread; a single worker thread gathers
+    queued requests until it has `max_batch_size` patches or the oldest has
+    waited `max_wait_ms`, runs one forward pass for all of them and resolves
+    each caller's Future with its own slice of stress probabilities.
+    """
+
+    def __init__(self, predict_fn, max_batch_size: int = INFERENCE_MAX_BATCH, max_wait_ms: float = INFERENCE_MAX_WAIT_MS):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = collections.deque()  # (x, future, enqueued_at)
+        self._pending = 0                   # patches waiting in the queue
+        self._cond = threading.Condition()
+        self._buffer = None
+        self._closed = False
+        self.counters = {"requests": 0, "patches": 0, "batches": 0, "errors": 0, "max_queue_depth": 0,
+                         "wait_seconds": 0.0, "forward_seconds": 0.0}
+        self.batch_size_histogram = {b: 0 for b in list(map(str, HISTOGRAM_BUCKETS)) + ["+Inf"]}
+        self.queue_depth_histogram = dict.fromkeys(self.batch_size_histogram, 0)
+        # Started on first submit() rather than here: a thread started at import
+        # time in a pre-fork master (gunicorn preload_app) does not exist in the workers
+        self._worker = None
+        self._worker_pid = None
+
+    def _ensure_worker(self):
+        # Caller holds self._cond
+        if self._worker is None or self._worker_pid != os.getpid():
+            self._worker = threading.Thread(target=self._run, name="inference-scheduler", daemon=True)
+            self._worker_pid = os.getpid()
+            self._worker.start()
+
+    def submit(self, x: np.ndarray) -> Future:
+        """Queue (n, 6, 128, 128) patches; the Future resolves to a list of n probabilities."""
+        future = Future()
+        if len(x) == 0:
+            future.set_result([])
+            return future
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Inference scheduler is closed")
+            self._ensure_worker()
+            self._queue.append((x, future, time.perf_counter()))
+            self._pending += len(x)
+            self.counters["requests"] += 1
+            self.counters["max_queue_depth"] = max(self.counters["max_queue_depth"], self._pending)
+            self._cond.notify()
+        return future
+
+    async def score(self, x: np.ndarray) -> list:
+        """Awaitable submit() for use from the event loop."""
+        return await asyncio.wrap_future(self.submit(x))
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+            worker = self._worker if self._worker_pid == os.getpid() else None
+        if worker is not None:
+            worker.join()
+
+    def stats(self) -> dict:
+        with self._cond:
+            batches = self.counters["batches"]
+            requests = self.counters["requests"]
+            return {
+                "queue_depth": self._pending,
+                "queued_requests": len(self._queue),
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+                **{k: v for k, v in self.counters.items() if not k.endswith("_seconds")},
+                "avg_batch_size": round(self.counters["patches"] / batches, 2) if batches else 0.0,
+                "avg_wait_ms": round(self.counters["wait_seconds"] / requests * 1000, 3) if requests else 0.0,
+                "avg_forward_ms": round(self.counters["forward_seconds"] / batches * 1000, 3) if batches else 0.0,
+                "batch_size_histogram": dict(self.batch_size_histogram),
+                "queue_depth_histogram": dict(self.queue_depth_histogram),
+            }
+
+    # --- worker ---
+
+    def _next_batch(self) -> list:
+        """Block until a batch is ready; [] if closed and drained, or every taken request was cancelled."""
+        with self._cond:
+            while not self._queue and not self._closed:
+                self._cond.wait()
+            if not self._queue:
+                return []
+            deadline = self._queue[0][2] + self.max_wait
+            while self._pending < self.max_batch_size and not self._closed:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            self.queue_depth_histogram[_bucket(self._pending)] += 1
+            batch, size = [], 0
+            # Always take the oldest request, even if it alone exceeds the limit
+            while self._queue and (not batch or size + len(self._queue[0][0]) <= self.max_batch_size):
+                item = self._queue.popleft()
+                self._pending -= len(item[0])
+                # Skip callers that gave up (e.g. timed out) while queued
+                if item[1].set_running_or_notify_cancel():
+                    batch.append(item)
+                    size += len(item[0])
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                with self._cond:
+                    if self._closed and not self._queue:
+                        return
+                continue
+            started = time.perf_counter()
+            try:
+                probs = self._forward([x for x, _, _ in batch])
+            except Exception as e:
+                with self._cond:
+                    self.counters["errors"] += 1
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            elapsed = time.perf_counter() - started
+
+            size = len(probs)
+            with self._cond:
+                self.counters["batches"] += 1
+                self.counters["patches"] += size
+                self.counters["forward_seconds"] += elapsed
+                self.counters["wait_seconds"] += sum(started - t for _, _, t in batch)
+                self.batch_size_histogram[_bucket(size)] += 1
+
+            offset = 0
+            for x, future, _ in batch:
+                future.set_result(probs[offset:offset + len(x)])
+                offset += len(x)
+
+    def _forward(self, arrays: list) -> list:
+        if len(arrays) == 1:
+            x = arrays[0]
+        else:
+            # Gather into a reusable contiguous buffer
+            total = sum(len(a) for a in arrays)
+            if self._buffer is None or len(self._buffer) < total or self._buffer.shape[1:] != arrays[0].shape[1:]:
+                self._buffer = np.empty((max(total, self.max_batch_size),) + arrays[0].shape[1:], dtype=np.float32)
+            x = self._buffer[:total]
+            offset = 0
+            for a in arrays:
+                x[offset:offset + len(a)] = a
+                offset += len(a)
+        probs = []
+        for start in range(0, len(x), self.max_batch_size):
+            probs += self.predict_fn(x[start:start + self.max_batch_size])
+        return probs
@@ -0,0 +1,171 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Prometheus text exposition format, version 0.0.4
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter with optional labels."""
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield self.name, _labels(self.labelnames, key), value
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram with optional labels."""
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # labels -> [per-bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            entry[i] += 1
+            entry[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, **labels)
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(entry)) for key, entry in self._values.items()]
+        for key, entry in items:
+            cumulative = 0
+            for edge, count in zip(self.buckets + (float("inf"),), entry):
+                cumulative += count
+                yield f"{self.name}_bucket", _labels(self.labelnames, key, f'le="{_num(edge)}"'), cumulative
+            yield f"{self.name}_count", _labels(self.labelnames, key), cumulative
+            yield f"{self.name}_sum", _labels(self.labelnames, key), entry[-1]
+
+
+class Collected:
+    """Metric whose samples are read from a callback at scrape time: fn() -> {label values tuple: value}."""
+
+    def __init__(self, name: str, help: str, kind: str, labelnames: tuple, fn):
+        self.name, self.help, self.kind, self.labelnames, self.fn = name, help, kind, tuple(labelnames), fn
+
+    def samples(self):
+        try:
+            values = self.fn()
+        except Exception:
+            return
+        for key, value in values.items():
+            yield self.name, _labels(self.labelnames, key), value
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self.register(Counter(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def collect(self, name, help, kind, labelnames, fn):
+        return self.register(Collected(name, help, kind, labelnames, fn))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_num(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# --- pipeline metrics ---
+requests_total = REGISTRY.counter(
+    "crop_requests_total", "HTTP requests by route and status code.", ("route", "status"))
+request_seconds = REGISTRY.histogram(
+    "crop_request_seconds", "HTTP request latency by route.", ("route",))
+stage_seconds = REGISTRY.histogram(
+    "crop_stage_seconds",
+    "Latency of pipeline stages (satellite_fetch, weather, decode, preprocess, inference, forward, ...).",
+    ("stage",))
+errors_total = REGISTRY.counter(
+    "crop_errors_total", "Pipeline errors by stage.", ("stage",))
+
+gee_requests_total = REGISTRY.counter(
+    "crop_gee_requests_total", "Earth Engine round-trips by call type.", ("call",))
+gee_request_seconds = REGISTRY.histogram(
+    "crop_gee_request_seconds", "Earth Engine round-trip latency by call type.", ("call",))
+gee_fallbacks_total = REGISTRY.counter(
+    "crop_gee_fallbacks_total", "Earth Engine query fallbacks (e.g. relaxed CLOUDY_PIXEL_PERCENTAGE).", ("fallback",))
+gee_payload_bytes_total = REGISTRY.counter(
+    "crop_gee_payload_bytes_total",
+    "Earth Engine pixel payload bytes: raw NPY bytes, or decoded float32 bytes for JSON.", ("transport",))
+
+
+@contextmanager
+def stage(name: str):
+    """Time a pipeline stage and count it as an error if it raises."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        errors_total.inc(stage=name)
+        raise
+    finally:
+        stage_seconds.observe(time.perf_counter() - t0, stage=name)
+
+
+def render() -> str:
+    return REGISTRY.render()
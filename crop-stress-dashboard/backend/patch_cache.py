@@ -0,0 +1,262 @@
+import collections
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+
+import numpy as np
+
+# --- CONFIGURATION ---
+PATCH_CACHE_ENABLED = os.getenv("PATCH_CACHE", "1") != "0"
+PATCH_CACHE_DIR = os.getenv("PATCH_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "patches"))
+PATCH_CACHE_MAX_BYTES = int(os.getenv("PATCH_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+PATCH_CACHE_TTL = float(os.getenv("PATCH_CACHE_TTL", 24 * 3600))
+# Expired on-disk entries are deleted on first use and then at most this often
+PATCH_CACHE_PURGE_INTERVAL = float(os.getenv("PATCH_CACHE_PURGE_INTERVAL", 3600))
+
+
+def polygon_hash(boundary_geojson: dict) -> str:
+    """
+    Stable hash of a polygon's outer ring, independent of the starting vertex,
+    winding direction and sub-centimetre coordinate noise.
+    """
+    geom = boundary_geojson.get("geometry", boundary_geojson)
+    ring = [(round(p[0], 6), round(p[1], 6)) for p in geom["coordinates"][0]]
+    if len(ring) > 1 and ring[0] == ring[-1]:
+        ring = ring[:-1]
+    # Normalize winding to counter-clockwise (positive shoelace area)
+    area = sum(x0 * y1 - x1 * y0 for (x0, y0), (x1, y1) in zip(ring, ring[1:] + ring[:1]))
+    if area < 0:
+        ring = ring[::-1]
+    # Start from the smallest vertex
+    start = ring.index(min(ring))
+    ring = ring[start:] + ring[:start]
+    return hashlib.sha1(json.dumps(ring).encode()).hexdigest()[:20]
+
+
+def make_key(kind: str, boundary_geojson: dict, end_date: str, window: int, bands, **extra) -> str:
+    """Cache key: canonical polygon hash + end date + window length + band set."""
+    parts = [kind, polygon_hash(boundary_geojson), str(end_date), str(window), ",".join(bands)]
+    parts += [f"{k}={extra[k]}" for k in sorted(extra)]
+    return hashlib.sha1("|".join(parts).encode()).hexdigest()
+
+
+def _pack(value):
+    """Convert nested JSON lists (GEE getInfo payloads) into float32 arrays."""
+    if isinstance(value, dict):
+        return {k: _pack(v) for k, v in value.items()}
+    if isinstance(value, list) and value and isinstance(value[0], list):
+        try:
+            return np.asarray(value, dtype=np.float32)
+        except (TypeError, ValueError):
+            return value
+    return value
+
+
+def _nbytes(value) -> int:
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sum(_nbytes(v) for v in value.values())
+    return 64
+
+
+class PatchCache:
+    """
+    Two-tier cache for satellite fetch results.
+
+    Tier 1 is a size-bounded in-process LRU. Tier 2 is an on-disk store (one
+    directory per entry with .npy arrays and a meta.json) that is memory-mapped
+    on read and survives restarts. Entries expire after `ttl` seconds; the
+    end date is part of every key, so a new day never reuses old imagery.
+    Because old keys are never read again, expired entries are purged from
+    disk in the background on first use and every `purge_interval` seconds.
+    """
+
+    def __init__(self, cache_dir: str = PATCH_CACHE_DIR, max_bytes: int = PATCH_CACHE_MAX_BYTES, ttl: float = PATCH_CACHE_TTL,
+                 purge_interval: float = PATCH_CACHE_PURGE_INTERVAL):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.purge_interval = purge_interval
+        self._next_purge = 0.0
+        self._lru = collections.OrderedDict()  # key -> (expires_at, nbytes, value)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0, "expired": 0,
+                         "purged": 0}
+
+    # --- public API ---
+
+    def get(self, key: str):
+        now = time.time()
+        self._maybe_purge(now)
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._lru.move_to_end(key)
+                    self.counters["memory_hits"] += 1
+                    return entry[2]
+                self._drop(key)
+                self.counters["expired"] += 1
+
+        value, expires_at = self._disk_read(key, now)
+        with self._lock:
+            if value is None:
+                self.counters["misses"] += 1
+                return None
+            self.counters["disk_hits"] += 1
+            self._remember(key, expires_at, value)
+        return value
+
+    def put(self, key: str, value: dict):
+        value = _pack(value)
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._remember(key, expires_at, value)
+            self.counters["stores"] += 1
+        self._disk_write(key, expires_at, value)
+        return value
+
+    def get_or_fetch(self, key: str, fetch):
+        """Return the cached result for `key`, or call `fetch()` and cache it if successful."""
+        value = self.get(key)
+        if value is not None:
+            return value
+        value = fetch()
+        if value.get("status") == "success":
+            value = self.put(key, value)
+        return value
+
+    def _maybe_purge(self, now: float):
+        with self._lock:
+            if now < self._next_purge:
+                return
+            self._next_purge = now + self.purge_interval
+        threading.Thread(target=self._purge_quietly, name="patch-cache-purge", daemon=True).start()
+
+    def _purge_quietly(self):
+        try:
+            removed = self.purge_expired()
+        except Exception as e:
+            print(f"Patch cache purge failed: {e}")
+            return
+        with self._lock:
+            self.counters["purged"] += removed
+
+    def purge_expired(self) -> int:
+        """Delete expired on-disk entries. Returns how many were removed."""
+        removed = 0
+        now = time.time()
+        if not os.path.isdir(self.cache_dir):
+            return 0
+        for name in os.listdir(self.cache_dir):
+            if name.startswith(".tmp-"):
+                continue
+            meta = self._read_meta(os.path.join(self.cache_dir, name))
+            if meta is None or meta["expires_at"] <= now:
+                shutil.rmtree(os.path.join(self.cache_dir, name), ignore_errors=True)
+                removed += 1
+        return removed
+
+    def clear(self):
+        with self._lock:
+            self._lru.clear()
+            self._bytes = 0
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.counters["memory_hits"] + self.counters["disk_hits"] + self.counters["misses"]
+            hits = lookups - self.counters["misses"]
+            return dict(
+                self.counters,
+                entries=len(self._lru),
+                memory_bytes=self._bytes,
+                hit_rate=round(hits / lookups, 4) if lookups else 0.0,
+            )
+
+    # --- memory tier ---
+
+    def _remember(self, key, expires_at, value):
+        size = _nbytes(value)
+        if size > self.max_bytes:
+            return
+        if key in self._lru:
+            self._drop(key)
+        self._lru[key] = (expires_at, size, value)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            oldest = next(iter(self._lru))
+            self._drop(oldest)
+            self.counters["evictions"] += 1
+
+    def _drop(self, key):
+        _, size, _ = self._lru.pop(key)
+        self._bytes -= size
+
+    # --- disk tier ---
+
+    def _disk_write(self, key, expires_at, value):
+        arrays = {}
+
+        def strip(v):
+            if isinstance(v, np.ndarray):
+                name = f"a{len(arrays)}.npy"
+                arrays[name] = v
+                return {"__npy__": name}
+            if isinstance(v, dict):
+                return {k: strip(item) for k, item in v.items()}
+            return v
+
+        meta = {"expires_at": expires_at, "value": strip(value)}
+        tmp = os.path.join(self.cache_dir, f".tmp-{uuid.uuid4().hex}")
+        try:
+            os.makedirs(tmp)
+            for name, arr in arrays.items():
+                np.save(os.path.join(tmp, name), arr)
+            with open(os.path.join(tmp, "meta.json"), "w") as f:
+                json.dump(meta, f)
+            final = os.path.join(self.cache_dir, key)
+            shutil.rmtree(final, ignore_errors=True)
+            os.replace(tmp, final)
+        except Exception as e:
+            print(f"Patch cache write failed: {e}")
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    def _read_meta(self, entry_dir):
+        try:
+            with open(os.path.join(entry_dir, "meta.json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _disk_read(self, key, now):
+        entry_dir = os.path.join(self.cache_dir, key)
+        meta = self._read_meta(entry_dir)
+        if meta is None:
+            return None, None
+        if meta["expires_at"] <= now:
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            with self._lock:
+                self.counters["expired"] += 1
+            return None, None
+
+        def load(v):
+            if isinstance(v, dict):
+                if "__npy__" in v:
+                    return np.load(os.path.join(entry_dir, v["__npy__"]), mmap_mode="r")
+                return {k: load(item) for k, item in v.items()}
+            return v
+
+        try:
+            return load(meta["value"]), meta["expires_at"]
+        except (OSError, ValueError):
+            return None, None
+
+
+patch_cache = PatchCache()
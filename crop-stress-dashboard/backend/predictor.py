@@ -1,98 +1,135 @@
+import os
 import torch
 import torch.nn as nn
 import numpy as np
-import time
-from fastapi import FastAPI, HTTPException
-from fastapi.middleware.cors import CORSMiddleware
 from model_def import build_resnet18_6ch
-from satellite_gee import fetch_patch_as_array
-
-app = FastAPI()
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["http://localhost:5173"],
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+from preprocessing import MODEL_BANDS, preprocess_stack, stack_patches
+from inference_backends import INFERENCE_BACKEND, configure_threads, select_backend
+import metrics
 
 MODEL_PATH = "cnn_crop_stress_model1.pth"
+# Memory-map a prefix-stripped copy of the weights (CPU only) so that all
+# worker processes on a node share one page-cache copy instead of one each
+MODEL_WEIGHTS_MMAP = os.getenv("MODEL_WEIGHTS_MMAP", "0") == "1"
+MODEL_WEIGHTS_CACHE_DIR = os.getenv("MODEL_WEIGHTS_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "weights"))
+
+_preloaded = {}  # checkpoint path -> state dict loaded before forking (see preload_weights)
+
+def _strip_prefix(state_dict: dict) -> dict:
+    # Fix: Strip 'model.' prefix if present in the weights file
+    return {(k[6:] if k.startswith('model.') else k): v for k, v in state_dict.items()}
+
+def _mmap_weights_path(full_path: str) -> str:
+    """
+    Prefix-stripped copy of the checkpoint in torch's zip format (which
+    torch.load can memory-map), written once per checkpoint size/mtime.
+    """
+    st = os.stat(full_path)
+    name = f"{os.path.splitext(os.path.basename(full_path))[0]}-{st.st_size}-{int(st.st_mtime)}.pt"
+    path = os.path.join(MODEL_WEIGHTS_CACHE_DIR, name)
+    if not os.path.exists(path):
+        try:
+            import fcntl
+        except ImportError:  # Windows: no locking
+            fcntl = None
+        os.makedirs(MODEL_WEIGHTS_CACHE_DIR, exist_ok=True)
+        # Workers starting together must all map the same file, so only one writes it
+        with open(f"{path}.lock", "w") as lock:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            if not os.path.exists(path):
+                tmp = f"{path}.{os.getpid()}.tmp"
+                torch.save(_strip_prefix(torch.load(full_path, map_location="cpu")), tmp)
+                os.replace(tmp, path)
+    return path
+
+def load_weights(model_path: str = MODEL_PATH, mmap: bool = None) -> dict:
+    """
+    Prefix-stripped CPU state dict: preloaded, memory-mapped (read-only use,
+    default MODEL_WEIGHTS_MMAP) or read into memory.
+    """
+    full_path = os.path.join(os.path.dirname(__file__), model_path)
+    if full_path in _preloaded:
+        return _preloaded[full_path]
+    if MODEL_WEIGHTS_MMAP if mmap is None else mmap:
+        return torch.load(_mmap_weights_path(full_path), map_location="cpu", mmap=True, weights_only=True)
+    return _strip_prefix(torch.load(full_path, map_location="cpu"))
+
+def preload_weights(model_path: str = MODEL_PATH) -> dict:
+    """
+    Load the weights in a pre-fork master (gunicorn preload_app, see
+    gunicorn.conf.py); forked workers then build their model on these
+    tensors and share the pages copy-on-write.
+    """
+    full_path = os.path.join(os.path.dirname(__file__), model_path)
+    _preloaded[full_path] = load_weights(model_path)
+    return _preloaded[full_path]
 
 class Predictor:
     def __init__(self, model_path: str):
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         self.model = build_resnet18_6ch(num_classes=2)
+        # How the weights are held: "shared" (mmap or pre-fork, no per-process copy) or "private"
+        self.weights = "private"
+        # Set when the checkpoint could not be loaded (the model then has random weights)
+        self.load_error = None
         try:
-            import os
             full_path = os.path.join(os.path.dirname(__file__), model_path)
-            state_dict = torch.load(full_path, map_location=self.device)
-            
-            # Fix: Strip 'model.' prefix if present in the weights file
-            new_state_dict = {}
-            for k, v in state_dict.items():
-                name = k[6:] if k.startswith('model.') else k
-                new_state_dict[name] = v
-                
-            self.model.load_state_dict(new_state_dict)
-            print(f"Success: Model loaded from {full_path}")
+            state_dict = load_weights(model_path)
+            shared = self.device.type == "cpu" and (MODEL_WEIGHTS_MMAP or full_path in _preloaded)
+            # assign=True makes the parameters the loaded tensors themselves instead of copies
+            self.model.load_state_dict(state_dict, assign=shared)
+            self.weights = "shared" if shared else "private"
+            print(f"Success: Model loaded from {full_path}" + (" (shared weights)" if shared else ""))
         except Exception as e:
+            self.load_error = str(e)
             print(f"Warning: Could not load model ({e}). Inference will fail.")
         self.model.to(self.device)
         self.model.eval()
 
-    def preprocess(self, patch_data: dict) -> torch.Tensor:
-        import cv2 # Ensure cv2 is available for resizing
-        
-        # Reconstruct HxWx6 array from GEE dict
+        configure_threads()
+        self.backend, self.runner, self.backend_report = select_backend(self.model, INFERENCE_BACKEND, self.device)
+
+    def preprocess(self, patch_data) -> torch.Tensor:
+        # Accepts a GEE band dict or a (6, H, W) / (1, 6, H, W) array
         # Training order: [R, G, B, NDVI, VH, VV]
-        bands = ["B4", "B3", "B2", "NDVI", "VH", "VV"]
-        layers = []
-        
-        for b in bands:
-            if b in patch_data:
-                arr = np.array(patch_data[b]).astype(np.float32)
-                
-                # Normalization logic from training notebook
-                # Normalization logic: Stable scaling for Sri Lankan regions
-                if b in ["B4", "B3", "B2"]:
-                    # Visual scaling for RGB: Sentinel-2 SR 0-10000 mapping to 0-1
-                    arr = np.clip(arr / 10000.0, 0, 1)
-                elif b == "NDVI":
-                    # NDVI range is [-1, 1]. In crops, it's usually [0, 1].
-                    # Using a stable range [-0.1, 0.9] maps to [0, 1] for better contrast
-                    arr = np.clip((arr + 0.1) / 1.0, 0, 1)
-                elif b in ["VH", "VV"]:
-                    # SAR values are in dB, typically [-30, 0].
-                    # Using fixed range [-25, -5] to avoid local noise stretching
-                    arr = np.clip((arr + 25) / 20.0, 0, 1)
-                else:
-                    arr = np.zeros_like(arr)
-                
-                # Center crop to 224, 224 (initial GEE fetch size)
-                h, w = arr.shape
-                start_h = (h - 224) // 2
-                start_w = (w - 224) // 2
-                cropped = arr[start_h:start_h+224, start_w:start_w+224]
-                
-                # IMPORTANT: Resize to 128x128 to match training dimensions
-                resized = cv2.resize(cropped, (128, 128))
-                layers.append(resized)
-            else:
-                layers.append(np.zeros((128, 128), dtype=np.float32))
-        
-        # Stack to 6-channel: (6, 128, 128)
-        x = np.stack(layers, axis=0)
-        return torch.from_numpy(x).unsqueeze(0).to(self.device)
+        if isinstance(patch_data, np.ndarray):
+            x = preprocess_stack(patch_data)
+            return torch.from_numpy(x).to(self.device)
+
+        # Reconstruct 1x6xHxW array from GEE dict
+        stack, present = stack_patches([patch_data])
+        x = preprocess_stack(stack, present=present)
+        return torch.from_numpy(x).to(self.device)
 
     def predict_stress_prob(self, x: torch.Tensor, stress_class_index=1):
-        with torch.no_grad():
-            outputs = self.model(x)
+        return self.predict_stress_probs(x, stress_class_index)[0]
+
+    def predict_stress_probs(self, batch, stress_class_index=1):
+        """Score N patches (N, 6, 128, 128) in a single forward pass.
+
+        Accepts a batched tensor or array, or a list of preprocessed (1, 6, 128, 128) tensors.
+        """
+        if len(batch) == 0:
+            return []
+        if isinstance(batch, (list, tuple)):
+            batch = torch.cat(batch, dim=0)
+        elif isinstance(batch, np.ndarray):
+            batch = torch.from_numpy(batch)
+        with torch.no_grad(), metrics.stage("forward"):
+            outputs = self.runner(batch.to(self.device))
             probs = torch.softmax(outputs, dim=1)
-            return probs[0][stress_class_index].item()
+            return probs[:, stress_class_index].cpu().tolist()
 
-    def get_anomalies(self, patch_data: dict):
+    def get_anomalies(self, patch_data):
         """Detect anomalies based on spectral signatures (Feature 4)."""
         anomalies = []
         try:
+            if isinstance(patch_data, np.ndarray):
+                # (6, H, W) array in MODEL_BANDS order
+                if patch_data.ndim == 4:
+                    patch_data = patch_data[0]
+                patch_data = dict(zip(MODEL_BANDS, patch_data))
             ndvi = np.mean(patch_data.get("NDVI", [0]))
             vh = np.mean(patch_data.get("VH", [-20]))
             vv = np.mean(patch_data.get("VV", [-10]))
@@ -134,48 +171,15 @@ class Predictor:
 
         return list(dict.fromkeys(actions)) # Remove duplicates
 
-# Load model ONCE
-predictor = Predictor(MODEL_PATH)
-
 def prob_to_risk(prob: float):
     # Sri Lanka Optimized Thresholds
     if prob > 0.85: return "High"
     if prob > 0.55: return "Moderate"
     return "Healthy"
 
-@app.post("/predict")
-async def predict_endpoint(payload: dict):
-    boundary = payload.get("boundary")
-    if not boundary:
-        raise HTTPException(status_code=400, detail="Missing 'boundary'")
-
-    # Start timing
-    t0 = time.time()
-
-    # 1. Fetch real imagery patch from GEE
-    res = fetch_patch_as_array(boundary)
-    if res.get("status") == "error":
-        raise HTTPException(status_code=500, detail=f"GEE Fetch Error: {res.get('message')}")
-
-    # 2. Preprocess and Predict
-    try:
-        x = predictor.preprocess(res["patch_data"])
-        stress_prob = predictor.predict_stress_prob(x, stress_class_index=1)
-        risk = prob_to_risk(stress_prob)
-        
-        actions = {
-            "High": ["Check irrigation within 24–48h", "Inspect pests/disease in high-risk zones", "Check nutrients (NPK)"],
-            "Moderate": ["Monitor field in next 2–3 days", "Check irrigation schedule", "Inspect leaves for early issues"],
-            "Healthy": ["Continue normal monitoring", "Maintain irrigation and nutrient schedule"]
-        }[risk]
-
-        return {
-            "risk_level": risk,
-            "confidence": round(stress_prob if stress_prob > 0.5 else 1 - stress_prob, 2),
-            "stress_prob": round(float(stress_prob), 4),
-            "recommended_actions": actions,
-            "ml_based": True,
-            "processing_time": round(time.time() - t0, 3)
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Inference Error: {str(e)}")
+def __getattr__(name):
+    # `predictor` is loaded lazily, once per process (see startup.get_predictor)
+    if name == "predictor":
+        from startup import get_predictor
+        return get_predictor()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,143 @@
+import threading
+
+import cv2
+import numpy as np
+
+# Training channel order: [R, G, B, NDVI, VH, VV]
+MODEL_BANDS = ["B4", "B3", "B2", "NDVI", "VH", "VV"]
+
+# GEE patches are 225x225; the model was trained on a 224 crop resized to 128.
+CROP_SIZE = 224
+MODEL_SIZE = 128
+
+# Normalization table (same order as MODEL_BANDS): clip((raw + offset) / scale, 0, 1)
+#   RGB : Sentinel-2 SR 0-10000 mapped to 0-1
+#   NDVI: stable range [-0.1, 0.9] mapped to 0-1 for better contrast
+#   SAR : fixed dB range [-25, -5] to avoid local noise stretching
+BAND_OFFSET = np.array([0.0, 0.0, 0.0, 0.1, 25.0, 25.0], dtype=np.float32)
+BAND_SCALE = np.array([10000.0, 10000.0, 10000.0, 1.0, 20.0, 20.0], dtype=np.float32)
+_RAW_MIN = -BAND_OFFSET
+_RAW_MAX = BAND_SCALE - BAND_OFFSET
+_INV_SCALE = (1.0 / BAND_SCALE).astype(np.float32)
+_SCALED_OFFSET = (BAND_OFFSET / BAND_SCALE).astype(np.float32)
+
+_scratch = threading.local()
+
+
+def _scratch_buffer(shape) -> np.ndarray:
+    """Per-thread reusable float32 buffer, grown on demand."""
+    size = int(np.prod(shape))
+    buf = getattr(_scratch, "buf", None)
+    if buf is None or buf.size < size:
+        buf = np.empty(size, dtype=np.float32)
+        _scratch.buf = buf
+    return buf[:size].reshape(shape)
+
+
+def stack_patches(patches: list):
+    """
+    Turn GEE-style band dicts ({"B4": [[...]], ...}) into one (N, 6, H, W) array.
+    Returns the stack and an (N, 6) mask of which bands were present.
+    """
+    n = len(patches)
+    present = np.zeros((n, len(MODEL_BANDS)), dtype=bool)
+    stack = None
+    for i, patch in enumerate(patches):
+        for c, b in enumerate(MODEL_BANDS):
+            if patch.get(b) is None:
+                continue
+            band = np.asarray(patch[b], dtype=np.float32)
+            if stack is None:
+                stack = np.zeros((n, len(MODEL_BANDS)) + band.shape, dtype=np.float32)
+            stack[i, c] = band
+            present[i, c] = True
+    if stack is None:
+        stack = np.zeros((n, len(MODEL_BANDS), MODEL_SIZE, MODEL_SIZE), dtype=np.float32)
+    return stack, present
+
+
+def preprocess_stack(stack: np.ndarray, out: np.ndarray = None, present: np.ndarray = None) -> np.ndarray:
+    """
+    Normalize, center-crop and resize an (N, 6, H, W) stack of raw band values
+    into an (N, 6, 128, 128) float32 model input.
+
+    All days and bands are normalized with one set of broadcast operations and
+    resized with a single cv2.resize call. `out` may be a preallocated
+    (N, 6, 128, 128) float32 buffer to write into.
+    """
+    stack = np.asarray(stack)
+    if stack.ndim == 3:
+        stack = stack[None]
+    n, c, h, w = stack.shape
+    if out is None:
+        out = np.empty((n, c, MODEL_SIZE, MODEL_SIZE), dtype=np.float32)
+    elif not out.flags.c_contiguous:
+        raise ValueError("out buffer must be C-contiguous")
+    if n == 0:
+        return out
+
+    # Center crop to 224, 224 (initial GEE fetch size)
+    if h >= CROP_SIZE and w >= CROP_SIZE:
+        top, left = (h - CROP_SIZE) // 2, (w - CROP_SIZE) // 2
+        stack = stack[:, :, top:top + CROP_SIZE, left:left + CROP_SIZE]
+        h, w = CROP_SIZE, CROP_SIZE
+
+    # clip((raw + offset) / scale, 0, 1) is the affine map of raw clipped to
+    # [-offset, scale - offset]. Bilinear resizing is affine-invariant, so only
+    # the clip runs at full resolution; the scale and offset are applied to the
+    # 128x128 output, which is three times smaller.
+    clipped = _scratch_buffer((n, c, h, w))
+    np.clip(stack, _RAW_MIN[:c, None, None], _RAW_MAX[:c, None, None], out=clipped, casting="unsafe")
+
+    if h >= MODEL_SIZE:
+        # Resize every channel of every day in one call by treating the stack as
+        # one tall (N*6*H, W) image. Bilinear taps for a downscale never cross a
+        # channel boundary, so this matches per-channel cv2.resize exactly.
+        cv2.resize(
+            clipped.reshape(n * c * h, w),
+            (MODEL_SIZE, n * c * MODEL_SIZE),
+            dst=out.reshape(n * c * MODEL_SIZE, MODEL_SIZE),
+        )
+    else:
+        # Upscaling would sample across channel edges; resize one plane at a time.
+        flat_out = out.reshape(n * c, MODEL_SIZE, MODEL_SIZE)
+        for i, plane in enumerate(clipped.reshape(n * c, h, w)):
+            cv2.resize(plane, (MODEL_SIZE, MODEL_SIZE), dst=flat_out[i])
+
+    out *= _INV_SCALE[:c, None, None]
+    out += _SCALED_OFFSET[:c, None, None]
+
+    if present is not None:
+        out[~np.asarray(present, dtype=bool)] = 0
+    return out
+
+
+# A 224-px window shrinks to 128 px: 7 source pixels per 4 model pixels.
+RASTER_STEP = 7
+_RESIZED_STEP = 4
+
+
+def preprocess_raster(raster: np.ndarray, present: np.ndarray = None) -> np.ndarray:
+    """
+    Normalize and shrink a whole (6, H, W) raster by MODEL_SIZE / CROP_SIZE
+    (H and W must be multiples of 7).
+
+    Bilinear taps stay inside a 224-px window, so the 128-px window of the
+    result starting at 4/7 of any 7-aligned source offset equals
+    preprocess_stack applied to that 224-px window alone. Overlapping sliding
+    windows can therefore share one resize instead of one per window.
+    """
+    c, h, w = raster.shape
+    if h % RASTER_STEP or w % RASTER_STEP:
+        raise ValueError(f"Raster size {h}x{w} is not a multiple of {RASTER_STEP}")
+    rh, rw = h // RASTER_STEP * _RESIZED_STEP, w // RASTER_STEP * _RESIZED_STEP
+    clipped = _scratch_buffer((c, h, w))
+    np.clip(raster, _RAW_MIN[:c, None, None], _RAW_MAX[:c, None, None], out=clipped, casting="unsafe")
+    out = np.empty((c, rh, rw), dtype=np.float32)
+    for i in range(c):
+        cv2.resize(clipped[i], (rw, rh), dst=out[i])
+    out *= _INV_SCALE[:c, None, None]
+    out += _SCALED_OFFSET[:c, None, None]
+    if present is not None:
+        out[~np.asarray(present, dtype=bool)] = 0
+    return out
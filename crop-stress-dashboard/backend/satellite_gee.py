@@ -1,28 +1,264 @@
 import ee
 import datetime
+import io
+import json
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
 
-# Initialize EE once
-# IMPORTANT: Modern Earth Engine requires a Google Cloud Project ID.
-# If you get a 'no project found' error, replace None with your project string: 'your-project-id'
-GEE_PROJECT = 'just-student-485912-k1'
+import numpy as np
 
-try:
-    if GEE_PROJECT:
-        ee.Initialize(project=GEE_PROJECT)
-    else:
-        ee.Initialize()
-except Exception as e:
-    print(f"GEE Initialization failed: {e}")
-    print("Please ensure you have a Cloud Project. See: https://developers.google.com/earth-engine/guides/projects")
+from patch_cache import PATCH_CACHE_ENABLED, make_key, patch_cache
+from preprocessing import BAND_OFFSET, BAND_SCALE, CROP_SIZE, MODEL_SIZE
+from tile_grid import TILE_GRID_ENABLED, TILE_SCENE_CELL, shared_tiles, tile_geojson, tile_grid
+from timeseries_store import timeseries_store
+from startup import ensure_ee
+import metrics
+
+# Pixel transport for patch fetches:
+#   "json" - neighborhoodToArray(...).sample(...).toDictionary().getInfo() (nested lists)
+#   "npy"  - ee.data.computePixels returning raw NPY bytes, decoded without copies
+#   "npy128" - like "npy", but resampled server-side to the model's 128x128
+#              input grid and quantized to uint16 (see decode_u16); ~6x smaller
+GEE_TRANSPORT = os.getenv("GEE_TRANSPORT", "json")
+NPY_TRANSPORTS = ("npy", "npy128")
+
+# Compose cloud-threshold fallbacks and empty-collection checks server-side
+# so a patch or feature fetch is one Earth Engine round-trip instead of up to five.
+GEE_SINGLE_REQUEST = os.getenv("GEE_SINGLE_REQUEST", "0") == "1"
+
+# Incremental daily time series: reuse stored per-day composites and only
+# fetch the days that are missing (see timeseries_store.py).
+TIMESERIES_INCREMENTAL = os.getenv("TIMESERIES_INCREMENTAL", "0") == "1"
+
+# radius=112 gives 225 pixels at 10 m; the preprocessor crops to 224.
+PATCH_PIXELS = 225
+PATCH_SCALE = 10
+
+# Band order of "npy" patches matches the model's training order.
+NPY_BANDS = ["B4", "B3", "B2", "NDVI", "VH", "VV"]
+
+# Field rasters larger than this (pixels per side) are fetched as concurrent blocks
+RASTER_BLOCK_PX = int(os.getenv("RASTER_BLOCK_PX", 1024))
+RASTER_FETCH_WORKERS = int(os.getenv("RASTER_FETCH_WORKERS", 4))
 
 def _geojson_to_polygon(boundary_geojson: dict) -> ee.Geometry:
+    # Every Earth Engine request starts here, so initialize the client (once) on first use
+    ensure_ee()
     # Leaflet sends a GeoJSON Feature with geometry
     geom = boundary_geojson.get("geometry", boundary_geojson)
     if geom.get("type") != "Polygon":
         raise ValueError("Only Polygon supported")
     return ee.Geometry.Polygon(geom["coordinates"])
 
+def json_days_to_array(data: dict, n_days: int) -> np.ndarray:
+    """
+    Convert a JSON-transport time series ("d{i}_R", ...) into an
+    (n_days, 6, H, W) array in NPY_BANDS order; missing days are all zeros.
+    """
+    suffixes = ["R", "G", "B", "NDVI", "VH", "VV"]  # NPY_BANDS order
+    arr = None
+    for i in range(n_days):
+        for c, suffix in enumerate(suffixes):
+            band = data.get(f"d{i}_{suffix}")
+            if band is None:
+                continue
+            band = np.asarray(band, dtype=np.float32)
+            if arr is None:
+                arr = np.zeros((n_days, len(suffixes)) + band.shape, dtype=np.float32)
+            arr[i, c] = band
+    if arr is None:
+        arr = np.zeros((n_days, len(suffixes), PATCH_PIXELS, PATCH_PIXELS), dtype=np.float32)
+    return arr
+
+def _local_centroid(boundary_geojson: dict):
+    geom = boundary_geojson.get("geometry", boundary_geojson)
+    coords = geom["coordinates"][0]
+    lat = sum(p[1] for p in coords) / len(coords)
+    lon = sum(p[0] for p in coords) / len(coords)
+    return lat, lon
+
+def _patch_grid(boundary_geojson: dict, pixels: int = PATCH_PIXELS, scale: float = PATCH_SCALE) -> dict:
+    """
+    computePixels grid of `pixels` x `pixels` cells of roughly `scale` metres,
+    centred on the polygon centroid (Web Mercator, corrected for latitude).
+    """
+    lat, lon = _local_centroid(boundary_geojson)
+    r = 6378137.0
+    x = r * math.radians(lon)
+    y = r * math.log(math.tan(math.pi / 4 + math.radians(lat) / 2))
+    step = scale / math.cos(math.radians(lat))
+    half = pixels * step / 2
+    return {
+        "dimensions": {"width": pixels, "height": pixels},
+        "affineTransform": {
+            "scaleX": step, "shearX": 0, "translateX": x - half,
+            "shearY": 0, "scaleY": -step, "translateY": y + half,
+        },
+        "crsCode": "EPSG:3857",
+    }
+
+def _model_grid(boundary_geojson: dict) -> dict:
+    """
+    The model's 128x128 input grid: the 224-px centre crop of the patch grid
+    (as taken by preprocess_stack) with pixels CROP_SIZE / MODEL_SIZE larger.
+    """
+    grid = _patch_grid(boundary_geojson)
+    a = grid["affineTransform"]
+    offset = (PATCH_PIXELS - CROP_SIZE) // 2
+    factor = CROP_SIZE / MODEL_SIZE
+    return dict(grid, dimensions={"width": MODEL_SIZE, "height": MODEL_SIZE}, affineTransform=dict(
+        a, scaleX=a["scaleX"] * factor, scaleY=a["scaleY"] * factor,
+        translateX=a["translateX"] + offset * a["scaleX"], translateY=a["translateY"] + offset * a["scaleY"]))
+
+# npy128 quantization: each band's clip range (from the normalization table)
+# maps onto 1..65535; 0 marks masked pixels.
+_U16_LO = -BAND_OFFSET
+_U16_HI = BAND_SCALE - BAND_OFFSET
+_U16_STEPS = 65534
+
+def _encode_u16(image: ee.Image, boundary_geojson: dict, n_sets: int = 1) -> ee.Image:
+    """
+    Server side of the npy128 transport for an image of `n_sets` x NPY_BANDS
+    bands: evaluate on the 10 m patch grid, clip to the normalization range,
+    resample bilinearly onto the model grid (as preprocess_stack's cv2.resize
+    does) and quantize to uint16.
+    """
+    a = _patch_grid(boundary_geojson)["affineTransform"]
+    on_grid = image.reproject(crs="EPSG:3857", crsTransform=[a["scaleX"], 0, a["translateX"], 0, a["scaleY"], a["translateY"]])
+    lo = ee.Image.constant(_U16_LO.tolist() * n_sets)
+    hi = ee.Image.constant(_U16_HI.tolist() * n_sets)
+    clipped = on_grid.max(lo).min(hi).resample("bilinear")
+    return clipped.subtract(lo).divide(hi.subtract(lo)).multiply(_U16_STEPS).add(1).round().unmask(0).toUint16()
+
+def decode_u16(arr: np.ndarray) -> np.ndarray:
+    """
+    Decode npy128 uint16 bands (..., 6, H, W) back to raw band units (float32,
+    already clipped to the normalization range; masked pixels -> 0). Feeding
+    the result to preprocess_stack matches the float transport's model input
+    to within one quantization step (1 / 65534 after normalization).
+    """
+    lo = _U16_LO[:, None, None]
+    step = ((_U16_HI - _U16_LO) / _U16_STEPS).astype(np.float32)[:, None, None]
+    q = np.asarray(arr)
+    out = (q.astype(np.float32) - 1) * step + lo
+    out[q == 0] = 0
+    return out
+
+def decode_npy(data: bytes) -> np.ndarray:
+    """
+    Decode NPY bytes from computePixels into a (bands, H, W) array that views
+    the response buffer directly (no copies; the result is read-only).
+    """
+    buf = io.BytesIO(data)
+    version = np.lib.format.read_magic(buf)
+    if version == (1, 0):
+        shape, _, dtype = np.lib.format.read_array_header_1_0(buf)
+    else:
+        shape, _, dtype = np.lib.format.read_array_header_2_0(buf)
+    arr = np.frombuffer(data, dtype=dtype, count=int(np.prod(shape)), offset=buf.tell()).reshape(shape)
+    if dtype.names:
+        # Structured (H, W) array, one field per band, all the same type
+        n_bands = len(dtype.names)
+        arr = arr.view(dtype[0]).reshape(shape + (n_bands,))
+        return arr.transpose(2, 0, 1)
+    return arr
+
+def _get_info(obj, call: str):
+    """obj.getInfo() with round-trip count and latency metrics."""
+    metrics.gee_requests_total.inc(call=call)
+    with metrics.gee_request_seconds.time(call=call):
+        return obj.getInfo()
+
+def _record_json_payload(data: dict):
+    # getInfo() hands back parsed JSON, so count the decoded float32 size
+    n = sum(len(v) * len(v[0]) for v in data.values() if isinstance(v, list) and v and isinstance(v[0], list))
+    metrics.gee_payload_bytes_total.inc(4 * n, transport="json")
+
+def _compute_patch(image: ee.Image, boundary_geojson: dict, grid: dict = None, transport: str = "npy") -> np.ndarray:
+    """
+    Fetch `image` as a (bands, H, W) float32 array in one binary request, on
+    `grid` or by default a patch around the polygon centroid. With
+    transport="npy128" the image must already be _encode_u16-encoded; it is
+    fetched on the model grid and returned as raw uint16.
+    """
+    if transport == "npy128":
+        expression, grid = image, _model_grid(boundary_geojson)
+    else:
+        expression, grid = image.toFloat(), grid or _patch_grid(boundary_geojson)
+    metrics.gee_requests_total.inc(call="computePixels")
+    with metrics.gee_request_seconds.time(call="computePixels"):
+        data = ee.data.computePixels({
+            "expression": expression,
+            "fileFormat": "NPY",
+            "grid": grid,
+        })
+    metrics.gee_payload_bytes_total.inc(len(data), transport=transport)
+    with metrics.stage("decode_npy"):
+        return decode_npy(data)
+
+def _fetch_bands(image: ee.Image, boundary_geojson: dict, transport: str, n_sets: int = 1) -> np.ndarray:
+    """(n_sets * 6, H, W) float32 raw bands of an NPY_BANDS-ordered image, via either binary transport."""
+    if transport == "npy128":
+        q = _compute_patch(_encode_u16(image, boundary_geojson, n_sets), boundary_geojson, transport="npy128")
+        return decode_u16(q.reshape((n_sets, len(NPY_BANDS)) + q.shape[1:])).reshape(q.shape)
+    return _compute_patch(image, boundary_geojson)
+
+def _s2_with_fallback(region: ee.Geometry, start, end, max_cloud: int, fallback_cloud: int):
+    """
+    Sentinel-2 collection under `max_cloud` % cloud, or under `fallback_cloud`
+    when that is empty, chosen server-side. Returns (collection, fallback used
+    as an ee.Number 0/1).
+    """
+    base = (ee.ImageCollection("COPERNICUS/S2_SR_HARMONIZED")
+            .filterBounds(region)
+            .filterDate(str(start), str(end)))
+    strict = base.filter(ee.Filter.lt("CLOUDY_PIXEL_PERCENTAGE", max_cloud))
+    fallback = strict.size().eq(0)
+    relaxed = base.filter(ee.Filter.lt("CLOUDY_PIXEL_PERCENTAGE", fallback_cloud))
+    return ee.ImageCollection(ee.Algorithms.If(fallback, relaxed, strict)), fallback
+
+def _median_or_empty(col: ee.ImageCollection, bands: list) -> ee.Image:
+    """Median of `bands`; a fully masked placeholder when `col` is empty, so the expression still evaluates."""
+    placeholder = ee.Image.constant([0] * len(bands)).rename(bands).toFloat().updateMask(0)
+    col = ee.ImageCollection(ee.Algorithms.If(col.size().gt(0), col, ee.ImageCollection([placeholder])))
+    return col.select(bands).median()
+
+def _fetch_features_single(boundary_geojson: dict, days: int) -> dict:
+    poly = _geojson_to_polygon(boundary_geojson)
+    end = datetime.date.today()
+    start = end - datetime.timedelta(days=days)
+
+    s2, fallback = _s2_with_fallback(poly, start, end, 30, 70)
+    ndvi = _median_or_empty(s2, ["B8", "B4"]).normalizedDifference(["B8", "B4"]).rename("NDVI")
+    s1 = (ee.ImageCollection("COPERNICUS/S1_GRD")
+          .filterBounds(poly)
+          .filterDate(str(start), str(end))
+          .filter(ee.Filter.eq("instrumentMode", "IW"))
+          .filter(ee.Filter.listContains("transmitterReceiverPolarisation", "VV"))
+          .filter(ee.Filter.listContains("transmitterReceiverPolarisation", "VH")))
+    stats = ee.Image.cat([ndvi, _median_or_empty(s1, ["VV", "VH"])]).reduceRegion(
+        reducer=ee.Reducer.mean(),
+        geometry=poly,
+        scale=10,
+        maxPixels=1e9
+    )
+    info = _get_info(ee.Dictionary({"stats": stats, "s1_count": s1.size(), "s2_fallback": fallback}), "reduceRegion")
+
+    if info["s2_fallback"]:
+        metrics.gee_fallbacks_total.inc(fallback="s2_cloud_70")
+    if info["s1_count"] == 0:
+        raise RuntimeError("No Sentinel-1 images found for this field/time window")
+    return {
+        "ndvi_mean": info["stats"].get("NDVI"),
+        "vv_mean": info["stats"].get("VV"),
+        "vh_mean": info["stats"].get("VH"),
+        "days": days
+    }
+
 def fetch_features(boundary_geojson: dict, days: int = 30) -> dict:
+    if GEE_SINGLE_REQUEST:
+        return _fetch_features_single(boundary_geojson, days)
     poly = _geojson_to_polygon(boundary_geojson)
 
     end = datetime.date.today()
@@ -34,8 +270,9 @@ def fetch_features(boundary_geojson: dict, days: int = 30) -> dict:
           .filterDate(str(start), str(end))
           .filter(ee.Filter.lt("CLOUDY_PIXEL_PERCENTAGE", 30)))
 
-    if s2.size().getInfo() == 0:
+    if _get_info(s2.size(), "size") == 0:
         # fallback: more clouds if needed
+        metrics.gee_fallbacks_total.inc(fallback="s2_cloud_70")
         s2 = (ee.ImageCollection("COPERNICUS/S2_SR_HARMONIZED")
               .filterBounds(poly)
               .filterDate(str(start), str(end))
@@ -44,12 +281,12 @@ def fetch_features(boundary_geojson: dict, days: int = 30) -> dict:
     s2_img = s2.median()
     ndvi = s2_img.normalizedDifference(["B8", "B4"]).rename("NDVI")
 
-    ndvi_mean = ndvi.reduceRegion(
+    ndvi_mean = _get_info(ndvi.reduceRegion(
         reducer=ee.Reducer.mean(),
         geometry=poly,
         scale=10,
         maxPixels=1e9
-    ).get("NDVI").getInfo()
+    ).get("NDVI"), "reduceRegion")
 
     # Sentinel-1 VV/VH
     s1 = (ee.ImageCollection("COPERNICUS/S1_GRD")
@@ -60,17 +297,17 @@ def fetch_features(boundary_geojson: dict, days: int = 30) -> dict:
           .filter(ee.Filter.listContains("transmitterReceiverPolarisation", "VH"))
           .select(["VV", "VH"]))
 
-    if s1.size().getInfo() == 0:
+    if _get_info(s1.size(), "size") == 0:
         raise RuntimeError("No Sentinel-1 images found for this field/time window")
 
     s1_img = s1.median()
 
-    sar = s1_img.reduceRegion(
+    sar = _get_info(s1_img.reduceRegion(
         reducer=ee.Reducer.mean(),
         geometry=poly,
         scale=10,
         maxPixels=1e9
-    ).getInfo()
+    ), "reduceRegion")
 
     return {
         "ndvi_mean": ndvi_mean,
@@ -79,13 +316,145 @@ def fetch_features(boundary_geojson: dict, days: int = 30) -> dict:
         "days": days
     }
 
-def fetch_patch_as_array(boundary_geojson: dict, size: int = 224, end_date: str = None) -> dict:
+def fetch_patch_as_array(boundary_geojson: dict, size: int = 224, end_date: str = None, transport: str = None,
+                         use_cache: bool = PATCH_CACHE_ENABLED) -> dict:
     """
     Fetches a 6-channel image patch (R, G, B, NDVI, VV, VH) centered on the polygon.
     Returns a numpy-ready array (or URL to download it).
+
+    With transport="npy" the patch comes back as "array": a (1, 6, H, W) float32
+    array in model band order (R, G, B, NDVI, VH, VV) instead of "patch_data" lists.
+    With "npy128" the array is (1, 6, 128, 128), already on the model grid.
+
+    Successful results are served from the patch cache when `use_cache` is set.
+    With TILE_GRID=1 the patch is instead cut from shared, cached grid tiles
+    (always an "array" result, see fetch_patch_from_tiles).
+    """
+    transport = transport or GEE_TRANSPORT
+    if TILE_GRID_ENABLED:
+        return fetch_patch_from_tiles(boundary_geojson, end_date)
+    if not use_cache:
+        return _fetch_patch_as_array(boundary_geojson, size, end_date, transport)
+    key = make_key("patch", boundary_geojson, end_date or str(datetime.date.today()), 180,
+                   NPY_BANDS, size=size, transport=transport)
+    return patch_cache.get_or_fetch(
+        key, lambda: _fetch_patch_as_array(boundary_geojson, size, end_date, transport))
+
+# Packed "status" band of single-request patches
+_STATUS_S2, _STATUS_S1, _STATUS_FALLBACK = 1, 2, 4
+
+def _patch_sources(region: ee.Geometry, end_date: str):
+    """
+    The 180-day patch composite over `region` with the cloud fallback chosen
+    server-side: (rgb, ndvi, s1 [VV, VH], packed status number, S2 and S1 collections).
+    """
+    end = datetime.datetime.strptime(end_date, "%Y-%m-%d").date() if end_date else datetime.date.today()
+    start = end - datetime.timedelta(days=180)
+
+    s2_col, fallback = _s2_with_fallback(region, start, end, 30, 80)
+    s1_col = (ee.ImageCollection("COPERNICUS/S1_GRD")
+              .filterBounds(region)
+              .filterDate(str(start), str(end))
+              .filter(ee.Filter.eq("instrumentMode", "IW")))
+    s2 = _median_or_empty(s2_col, ["B4", "B3", "B2", "B8"])
+    s1 = _median_or_empty(s1_col, ["VV", "VH"])
+    rgb = s2.select(["B4", "B3", "B2"])
+    ndvi = s2.normalizedDifference(["B8", "B4"]).rename("NDVI")
+    status = (s2_col.size().gt(0).multiply(_STATUS_S2)
+              .add(s1_col.size().gt(0).multiply(_STATUS_S1))
+              .add(ee.Number(fallback).multiply(_STATUS_FALLBACK)))
+    return rgb, ndvi, s1, status, s2_col, s1_col
+
+def _status_error(code: int):
+    """Error message for a packed status value (None if both sensors have imagery)."""
+    if code & _STATUS_FALLBACK:
+        metrics.gee_fallbacks_total.inc(fallback="s2_cloud_80")
+    if not code & _STATUS_S2:
+        return "No Sentinel-2 imagery found in this area/time."
+    if not code & _STATUS_S1:
+        return "No Sentinel-1 (Radar) data found."
+    return None
+
+def _fetch_patch_single(boundary_geojson: dict, end_date: str, transport: str) -> dict:
+    """
+    _fetch_patch_as_array in one request: the cloud fallback and the S2/S1
+    availability checks are evaluated by Earth Engine, and their outcome comes
+    back with the pixels (an extra constant "status" band for NPY, a "status"
+    dictionary entry for JSON).
     """
     poly = _geojson_to_polygon(boundary_geojson)
     center = poly.centroid(10)
+    rgb, ndvi, s1, status, s2_col, s1_col = _patch_sources(center, end_date)
+
+    try:
+        if transport in NPY_TRANSPORTS:
+            bands = ee.Image.cat([rgb, ndvi, s1.select(["VH", "VV"])])
+            status_band = ee.Image.constant(status).rename("status")
+            if transport == "npy128":
+                combined = ee.Image.cat([_encode_u16(bands, boundary_geojson), status_band.toUint16()])
+            else:
+                combined = ee.Image.cat([bands, status_band])
+            arr = _compute_patch(combined, boundary_geojson, transport=transport)
+            error = _status_error(int(arr[-1, 0, 0]))
+            if error:
+                return {"status": "error", "message": error}
+            data = decode_u16(arr[:-1]) if transport == "npy128" else arr[:-1]
+            return {"array": data[None], "bands": NPY_BANDS, "status": "success"}
+
+        patch = ee.Image.cat([rgb, ndvi, s1]).neighborhoodToArray(ee.Kernel.square(radius=112, units='pixels'))
+        # Only sample when both sensors have imagery (a masked placeholder yields no sample)
+        available = s2_col.size().gt(0).And(s1_col.size().gt(0))
+        data = ee.Algorithms.If(available, patch.sample(center, 10).first().toDictionary(), None)
+        info = _get_info(ee.Dictionary({"data": data, "status": status}), "sample")
+        error = _status_error(int(info["status"]))
+        if error:
+            return {"status": "error", "message": error}
+        _record_json_payload(info["data"])
+        return {"patch_data": info["data"], "channels": ["R", "G", "B", "NDVI", "VV", "VH"], "status": "success"}
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+def _fetch_tile_block(band: int, cell: tuple, ty: int, tx: int, rows: int, cols: int, end_date: str) -> dict:
+    """
+    A rows x cols block of grid tiles in a single request, composited from
+    the S2/S1 scenes (and cloud fallback) chosen over the whole scene cell
+    `cell`, so every tile of that cell shares one composite.
+    """
+    cy, cx = cell
+    region = _geojson_to_polygon(tile_geojson(band, cy * TILE_SCENE_CELL, cx * TILE_SCENE_CELL,
+                                              rows=TILE_SCENE_CELL, cols=TILE_SCENE_CELL))
+    rgb, ndvi, s1, status, _, _ = _patch_sources(region, end_date)
+    combined = ee.Image.cat([rgb, ndvi, s1.select(["VH", "VV"]), ee.Image.constant(status).rename("status")])
+    try:
+        arr = _compute_patch(combined, None, grid=tile_grid(band, ty, tx, rows=rows, cols=cols))
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+    error = _status_error(int(arr[-1, 0, 0]))
+    if error:
+        return {"status": "error", "message": error}
+    return {"status": "success", "array": arr[:-1]}
+
+def fetch_patch_from_tiles(boundary_geojson: dict, end_date: str = None) -> dict:
+    """
+    The field's PATCH_PIXELS patch (10 m pixels, float32, NPY_BANDS order)
+    cut from the fixed global tile grid in tile_grid.py. Tiles are fetched
+    whole and cached, so neighbouring fields reuse each other's downloads.
+    Unlike the per-field fetch, S2/S1 scenes (and the availability checks)
+    are selected over the scene cell around the field rather than at its
+    centroid, the same for every tile of the patch.
+    """
+    _geojson_to_polygon(boundary_geojson)  # validates the polygon
+    lat, lon = _local_centroid(boundary_geojson)
+    end_date = end_date or str(datetime.date.today())
+    return shared_tiles.patch(lat, lon, PATCH_PIXELS, end_date, NPY_BANDS,
+                              lambda band, cell, ty, tx, rows, cols:
+                              _fetch_tile_block(band, cell, ty, tx, rows, cols, end_date))
+
+def _fetch_patch_as_array(boundary_geojson: dict, size: int, end_date: str, transport: str) -> dict:
+    if GEE_SINGLE_REQUEST:
+        return _fetch_patch_single(boundary_geojson, end_date, transport)
+    poly = _geojson_to_polygon(boundary_geojson)
+    center = poly.centroid(10)
     
     if end_date:
         end = datetime.datetime.strptime(end_date, "%Y-%m-%d").date()
@@ -100,14 +469,15 @@ def fetch_patch_as_array(boundary_geojson: dict, size: int = 224, end_date: str
           .filterDate(str(start), str(end))
           .filter(ee.Filter.lt("CLOUDY_PIXEL_PERCENTAGE", 30)))
     
-    if s2_col.size().getInfo() == 0:
+    if _get_info(s2_col.size(), "size") == 0:
         # Fallback to allow more clouds
+        metrics.gee_fallbacks_total.inc(fallback="s2_cloud_80")
         s2_col = (ee.ImageCollection("COPERNICUS/S2_SR_HARMONIZED")
               .filterBounds(center)
               .filterDate(str(start), str(end))
               .filter(ee.Filter.lt("CLOUDY_PIXEL_PERCENTAGE", 80)))
 
-    if s2_col.size().getInfo() == 0:
+    if _get_info(s2_col.size(), "size") == 0:
         return {"status": "error", "message": "No Sentinel-2 imagery found in this area/time."}
 
     s2 = s2_col.median()
@@ -120,11 +490,22 @@ def fetch_patch_as_array(boundary_geojson: dict, size: int = 224, end_date: str
           .filterDate(str(start), str(end))
           .filter(ee.Filter.eq("instrumentMode", "IW")))
     
-    if s1_col.size().getInfo() == 0:
+    if _get_info(s1_col.size(), "size") == 0:
         return {"status": "error", "message": "No Sentinel-1 (Radar) data found."}
 
     s1 = s1_col.median().select(["VV", "VH"])
-    
+
+    if transport in NPY_TRANSPORTS:
+        try:
+            combined = ee.Image.cat([rgb, ndvi, s1.select(["VH", "VV"])])
+            return {
+                "array": _fetch_bands(combined, boundary_geojson, transport)[None],
+                "bands": NPY_BANDS,
+                "status": "success"
+            }
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
     # Combined 6-channel image
     combined = ee.Image.cat([rgb, ndvi, s1])
     
@@ -138,7 +519,8 @@ def fetch_patch_as_array(boundary_geojson: dict, size: int = 224, end_date: str
     patch = combined.neighborhoodToArray(ee.Kernel.square(radius=112, units='pixels'))
     
     try:
-        data = patch.sample(center, 10).first().toDictionary().getInfo()
+        data = _get_info(patch.sample(center, 10).first().toDictionary(), "sample")
+        _record_json_payload(data)
         # This returns a dict of arrays. We need to reconstruct the HxWx6 block.
         # However, GEE's python API usually handles 'getInfo' on small arrays well.
         return {
@@ -149,55 +531,208 @@ def fetch_patch_as_array(boundary_geojson: dict, size: int = 224, end_date: str
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
-def fetch_daily_timeseries(boundary_geojson: dict, days: int = 7) -> dict:
+def fetch_daily_timeseries(boundary_geojson: dict, days: int = 7, transport: str = None,
+                           use_cache: bool = PATCH_CACHE_ENABLED, incremental: bool = None) -> dict:
     """
     Fetches image patches for multiple days in a single Earth Engine request.
     This avoids sequential getInfo() calls which cause timeouts.
+
+    With transport="npy" the result holds "array": a (days + 1, 6, H, W) float32
+    array (index 0 = today) in model band order, instead of the "data" dict.
+    With "npy128" the days are (6, 128, 128), already on the model grid.
+
+    Successful results are served from the patch cache when `use_cache` is set.
+    In incremental mode the result is always an "array" assembled from the
+    per-field day store, and only days not stored yet are fetched.
     """
+    transport = transport or GEE_TRANSPORT
+    if incremental is None:
+        incremental = TIMESERIES_INCREMENTAL
+    if incremental:
+        return _fetch_incremental_timeseries(boundary_geojson, days, transport)
+    if not use_cache:
+        return _fetch_daily_timeseries(boundary_geojson, days, transport)
+    key = make_key("daily", boundary_geojson, str(datetime.date.today()), days,
+                   NPY_BANDS, transport=transport)
+    return patch_cache.get_or_fetch(
+        key, lambda: _fetch_daily_timeseries(boundary_geojson, days, transport))
+
+def _fetch_daily_timeseries(boundary_geojson: dict, days: int, transport: str) -> dict:
+    # We fetch 8 days (0 to 7)
+    today = datetime.date.today()
+    dates = [today - datetime.timedelta(days=i) for i in range(days + 1)]
+    return fetch_day_composites(boundary_geojson, dates, transport)
+
+def _fetch_incremental_timeseries(boundary_geojson: dict, days: int, transport: str) -> dict:
+    today = datetime.date.today()
+    dates = [today - datetime.timedelta(days=i) for i in range(days + 1)]
+    field = timeseries_store.field_id(boundary_geojson, transport)
+    stored = timeseries_store.load(field, dates)
+    missing = [d for d in dates if d not in stored]
+
+    if missing:
+        res = fetch_day_composites(boundary_geojson, missing, transport)
+        if res.get("status") != "success":
+            return res
+        arr = res["array"] if "array" in res else json_days_to_array(res["data"], len(missing))
+        # Days without imagery come back empty; don't persist them so they are retried
+        fetched = {d: arr[i] for i, d in enumerate(missing) if arr[i, 2].any()}
+        timeseries_store.save(field, fetched)
+        stored.update({d: arr[i] for i, d in enumerate(missing)})
+
+    return {
+        "status": "success",
+        "array": np.stack([stored[d] for d in dates]),
+        "bands": NPY_BANDS,
+        "fetched_days": len(missing)
+    }
+
+def _day_composite(region: ee.Geometry, target_date: datetime.date):
+    """90-day S2/S1 median composites ending on `target_date`: (rgb, ndvi, s1 [VV, VH])."""
+    start = target_date - datetime.timedelta(days=90) # wide window for cloud fallback
+    end = target_date + datetime.timedelta(days=1)
+
+    # S2
+    s2 = (ee.ImageCollection("COPERNICUS/S2_SR_HARMONIZED")
+          .filterBounds(region)
+          .filterDate(str(start), str(end))
+          .filter(ee.Filter.lt("CLOUDY_PIXEL_PERCENTAGE", 50))
+          .median())
+
+    rgb = s2.select(["B4", "B3", "B2"])
+    ndvi = s2.normalizedDifference(["B8", "B4"]).rename("NDVI")
+
+    # S1
+    s1 = (ee.ImageCollection("COPERNICUS/S1_GRD")
+          .filterBounds(region)
+          .filterDate(str(start), str(end))
+          .filter(ee.Filter.eq("instrumentMode", "IW"))
+          .median().select(["VV", "VH"]))
+    return rgb, ndvi, s1
+
+def fetch_day_composites(boundary_geojson: dict, dates: list, transport: str = None) -> dict:
+    """
+    Fetches the 90-day median composite ending on each of `dates` in a single
+    Earth Engine request. Band suffixes/array index i refer to dates[i].
+    """
+    transport = transport or GEE_TRANSPORT
+    npy = transport in NPY_TRANSPORTS
     poly = _geojson_to_polygon(boundary_geojson)
     center = poly.centroid(10)
     
-    # 1. Create a collection of daily medians for the last 'days' days
-    today = datetime.date.today()
+    # 1. Create a collection of daily medians for the requested days
     images = []
     
-    # We fetch 8 days (0 to 7)
-    for i in range(days + 1):
-        target_date = today - datetime.timedelta(days=i)
-        start = target_date - datetime.timedelta(days=90) # wide window for cloud fallback
-        end = target_date + datetime.timedelta(days=1)
-        
-        # S2
-        s2 = (ee.ImageCollection("COPERNICUS/S2_SR_HARMONIZED")
-              .filterBounds(center)
-              .filterDate(str(start), str(end))
-              .filter(ee.Filter.lt("CLOUDY_PIXEL_PERCENTAGE", 50))
-              .median())
-        
-        rgb = s2.select(["B4", "B3", "B2"])
-        ndvi = s2.normalizedDifference(["B8", "B4"]).rename("NDVI")
-        
-        # S1
-        s1 = (ee.ImageCollection("COPERNICUS/S1_GRD")
-              .filterBounds(center)
-              .filterDate(str(start), str(end))
-              .filter(ee.Filter.eq("instrumentMode", "IW"))
-              .median().select(["VV", "VH"]))
-        
-        combined = ee.Image.cat([rgb, ndvi, s1])
-        # Rename bands to include day offset so we can separate them after getInfo
-        # Mapping: 0=Today, 1=Yesterday...
-        combined = combined.rename([f"d{i}_R", f"d{i}_G", f"d{i}_B", f"d{i}_NDVI", f"d{i}_VV", f"d{i}_VH"])
+    for i, target_date in enumerate(dates):
+        rgb, ndvi, s1 = _day_composite(center, target_date)
+
+        if npy:
+            combined = ee.Image.cat([rgb, ndvi, s1.select(["VH", "VV"])])
+            combined = combined.rename([f"d{i}_{b}" for b in NPY_BANDS])
+        else:
+            combined = ee.Image.cat([rgb, ndvi, s1])
+            # Rename bands to include day offset so we can separate them after getInfo
+            # Mapping: 0=Today, 1=Yesterday...
+            combined = combined.rename([f"d{i}_R", f"d{i}_G", f"d{i}_B", f"d{i}_NDVI", f"d{i}_VV", f"d{i}_VH"])
         images.append(combined)
 
     # 2. Stack all images into one mega-image
     mega_image = ee.Image.cat(images)
-    
+
+    if npy:
+        try:
+            arr = _fetch_bands(mega_image, boundary_geojson, transport, n_sets=len(dates))
+            return {
+                "status": "success",
+                "array": arr.reshape((len(dates), len(NPY_BANDS)) + arr.shape[1:]),
+                "bands": NPY_BANDS
+            }
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
     # 3. Sample as a single patch
     patch = mega_image.neighborhoodToArray(ee.Kernel.square(radius=112, units='pixels'))
     
     try:
-        data = patch.sample(center, 10).first().toDictionary().getInfo()
+        data = _get_info(patch.sample(center, 10).first().toDictionary(), "sample")
+        _record_json_payload(data)
         return {"status": "success", "data": data}
     except Exception as e:
         return {"status": "error", "message": str(e)}
+
+def fetch_region_stats(boundary_geojson: dict, end_date: str = None,
+                       use_cache: bool = PATCH_CACHE_ENABLED) -> dict:
+    """
+    Per-band mean/min/max over the field polygon for the 90-day composite
+    ending on `end_date` (default today), from one reduceRegion call. Returns
+    "stats": {band: {"mean", "min", "max"}} in NPY_BANDS naming, without
+    downloading any pixels.
+    """
+    end_date = end_date or str(datetime.date.today())
+    if not use_cache:
+        return _fetch_region_stats(boundary_geojson, end_date)
+    key = make_key("stats", boundary_geojson, end_date, 90, NPY_BANDS)
+    return patch_cache.get_or_fetch(key, lambda: _fetch_region_stats(boundary_geojson, end_date))
+
+def _fetch_region_stats(boundary_geojson: dict, end_date: str) -> dict:
+    try:
+        poly = _geojson_to_polygon(boundary_geojson)
+        target = datetime.datetime.strptime(end_date, "%Y-%m-%d").date()
+        rgb, ndvi, s1 = _day_composite(poly, target)
+        image = ee.Image.cat([rgb, ndvi, s1.select(["VH", "VV"])])
+        reducer = ee.Reducer.mean().combine(ee.Reducer.minMax(), sharedInputs=True)
+        values = _get_info(image.reduceRegion(reducer=reducer, geometry=poly, scale=PATCH_SCALE,
+                                              maxPixels=1e9, bestEffort=True), "reduceRegion")
+        stats = {}
+        for band in NPY_BANDS:
+            band_stats = {k: values.get(f"{band}_{k}") for k in ("mean", "min", "max")}
+            if all(v is not None for v in band_stats.values()):
+                stats[band] = band_stats
+        if not stats:
+            return {"status": "error", "message": "No imagery over the field for this window"}
+        return {"status": "success", "stats": stats}
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+def fetch_raster(boundary_geojson: dict, grid: dict, end_date: str = None,
+                 use_cache: bool = PATCH_CACHE_ENABLED) -> dict:
+    """
+    Fetches the 90-day composite ending on `end_date` (default today) over an
+    arbitrary computePixels `grid`, e.g. a whole field plus margins. Returns
+    "array": a (6, H, W) float32 array in model band order. Grids wider than
+    RASTER_BLOCK_PX are split into blocks fetched concurrently.
+    """
+    end_date = end_date or str(datetime.date.today())
+    if not use_cache:
+        return _fetch_raster(boundary_geojson, grid, end_date)
+    key = make_key("raster", boundary_geojson, end_date, 90, NPY_BANDS,
+                   grid=json.dumps(grid, sort_keys=True))
+    return patch_cache.get_or_fetch(key, lambda: _fetch_raster(boundary_geojson, grid, end_date))
+
+def _fetch_raster(boundary_geojson: dict, grid: dict, end_date: str) -> dict:
+    poly = _geojson_to_polygon(boundary_geojson)
+    target = datetime.datetime.strptime(end_date, "%Y-%m-%d").date()
+    rgb, ndvi, s1 = _day_composite(poly, target)
+    image = ee.Image.cat([rgb, ndvi, s1.select(["VH", "VV"])])
+
+    width, height = grid["dimensions"]["width"], grid["dimensions"]["height"]
+    affine = grid["affineTransform"]
+    arr = np.empty((len(NPY_BANDS), height, width), dtype=np.float32)
+
+    def fetch_block(r0, c0):
+        h, w = min(RASTER_BLOCK_PX, height - r0), min(RASTER_BLOCK_PX, width - c0)
+        block = {
+            "dimensions": {"width": w, "height": h},
+            "affineTransform": dict(affine, translateX=affine["translateX"] + c0 * affine["scaleX"],
+                                    translateY=affine["translateY"] + r0 * affine["scaleY"]),
+            "crsCode": grid["crsCode"],
+        }
+        arr[:, r0:r0 + h, c0:c0 + w] = _compute_patch(image, boundary_geojson, grid=block)
+
+    blocks = [(r0, c0) for r0 in range(0, height, RASTER_BLOCK_PX) for c0 in range(0, width, RASTER_BLOCK_PX)]
+    try:
+        with ThreadPoolExecutor(max_workers=min(RASTER_FETCH_WORKERS, len(blocks))) as pool:
+            list(pool.map(lambda rc: fetch_block(*rc), blocks))
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+    return {"status": "success", "array": arr, "bands": NPY_BANDS}
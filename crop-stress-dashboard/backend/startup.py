@@ -0,0 +1,180 @@
+import os
+import threading
+import time
+
+import numpy as np
+
+# --- CONFIGURATION ---
+GEE_PROJECT = os.getenv("GEE_PROJECT", "just-student-485912-k1")
+# Fall back to the interactive browser login if ee.Initialize fails (dev machines only)
+GEE_INTERACTIVE_AUTH = os.getenv("GEE_INTERACTIVE_AUTH", "0") == "1"
+# Start loading the model (and GEE) in the background as soon as the server starts
+STARTUP_PRELOAD = os.getenv("STARTUP_PRELOAD", "1") != "0"
+# Run dummy forward passes after loading so the first request skips allocator/kernel warm-up
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "1") != "0"
+# Treat the model as ready even if its checkpoint failed to load (random weights; benchmarks only)
+STARTUP_ALLOW_RANDOM_WEIGHTS = os.getenv("STARTUP_ALLOW_RANDOM_WEIGHTS", "0") == "1"
+
+
+def _process_start_time() -> float:
+    """Wall-clock time this process was started (Linux /proc), else now."""
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/stat") as f:
+            boot_time = next(int(line.split()[1]) for line in f if line.startswith("btime"))
+        return boot_time + start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, StopIteration):
+        return time.time()
+
+
+PROCESS_STARTED = _process_start_time()
+
+
+class LazyInit:
+    """
+    Thread-safe, single-shot lazy initializer. The first get() runs `fn`;
+    concurrent callers wait for it and later callers get the cached value.
+    A failure is recorded and retried on the next get().
+    """
+
+    def __init__(self, name: str, fn):
+        self.name = name
+        self.fn = fn
+        self.value = None
+        self.ready = False
+        self.error = None
+        self.seconds = None
+        self.ready_at = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self.ready:
+            return self.value
+        with self._lock:
+            if not self.ready:
+                t0 = time.perf_counter()
+                try:
+                    self.value = self.fn()
+                except Exception as e:
+                    self.error = str(e)
+                    raise
+                finally:
+                    self.seconds = round(time.perf_counter() - t0, 3)
+                self.error = None
+                self.ready = True
+                self.ready_at = time.time()
+                print(f"Startup: {self.name} ready in {self.seconds}s")
+        return self.value
+
+    def start(self):
+        """Begin initialization on a background thread (no-op once ready or running)."""
+        if not self.ready and not self._lock.locked():
+            threading.Thread(target=self._get_quietly, name=f"init-{self.name}", daemon=True).start()
+
+    def _get_quietly(self):
+        try:
+            self.get()
+        except Exception as e:
+            print(f"Startup: {self.name} failed: {e}")
+
+    def status(self) -> dict:
+        return {"ready": self.ready, "seconds": self.seconds, "error": self.error}
+
+
+def _init_ee():
+    import ee
+    try:
+        ee.Initialize(project=GEE_PROJECT)
+    except Exception:
+        if not GEE_INTERACTIVE_AUTH:
+            raise
+        ee.Authenticate()
+        ee.Initialize(project=GEE_PROJECT)
+    return ee
+
+
+warmup_seconds = {}
+
+
+def _load_predictor():
+    from predictor import MODEL_PATH, Predictor
+    from preprocessing import MODEL_BANDS, MODEL_SIZE
+
+    p = Predictor(MODEL_PATH)
+    if p.load_error and not STARTUP_ALLOW_RANDOM_WEIGHTS:
+        raise RuntimeError(f"Could not load model weights: {p.load_error}")
+    if STARTUP_WARMUP:
+        t0 = time.perf_counter()
+        for n in (1, 8):
+            p.predict_stress_probs(np.zeros((n, len(MODEL_BANDS), MODEL_SIZE, MODEL_SIZE), dtype=np.float32))
+        warmup_seconds["model"] = round(time.perf_counter() - t0, 3)
+    return p
+
+
+def _load_scalar_model():
+    from cascade import load_scalar_model
+    return load_scalar_model()
+
+
+gee = LazyInit("gee", _init_ee)
+model = LazyInit("model", _load_predictor)
+scalar_model = LazyInit("cascade", _load_scalar_model)
+COMPONENTS = {"gee": gee, "model": model, "cascade": scalar_model}
+
+
+def ensure_ee():
+    """Initialize the Earth Engine client once; returns the ee module."""
+    return gee.get()
+
+
+def get_predictor():
+    """The process-wide Predictor, loaded (and warmed up) on first use."""
+    return model.get()
+
+
+_SMAPS_FIELDS = {"Rss": "rss", "Pss": "pss", "Shared_Clean": "shared", "Shared_Dirty": "shared",
+                 "Private_Clean": "private", "Private_Dirty": "private"}
+
+
+def memory_report(pid: int = None) -> dict:
+    """
+    Resident memory of a process in bytes (Linux /proc/<pid>/smaps_rollup):
+    rss, pss (shared pages split between the processes mapping them), and
+    the shared / private parts of rss. Empty if unavailable.
+    """
+    report = {"rss": 0, "pss": 0, "shared": 0, "private": 0}
+    try:
+        with open(f"/proc/{pid or 'self'}/smaps_rollup") as f:
+            for line in f:
+                key, _, rest = line.partition(":")
+                if key in _SMAPS_FIELDS:
+                    report[_SMAPS_FIELDS[key]] += int(rest.split()[0]) * 1024
+    except (OSError, ValueError, IndexError):
+        return {}
+    return report
+
+
+def worker_pids() -> list:
+    """PIDs of this process and its sibling workers when running under a gunicorn master, else just this one."""
+    ppid = os.getppid()
+    try:
+        with open(f"/proc/{ppid}/cmdline", "rb") as f:
+            if b"gunicorn" not in f.read():
+                return [os.getpid()]
+        with open(f"/proc/{ppid}/task/{ppid}/children") as f:
+            return sorted(int(pid) for pid in f.read().split())
+    except (OSError, ValueError):
+        return [os.getpid()]
+
+
+def startup_report(components: list) -> dict:
+    """Readiness of `components` and seconds from process start until all were ready."""
+    inits = [COMPONENTS[name] for name in components]
+    ready = all(i.ready for i in inits)
+    return {
+        "ready": ready,
+        "startup_seconds": round(max(i.ready_at for i in inits) - PROCESS_STARTED, 3) if ready else None,
+        "components": {i.name: i.status() for i in inits},
+        "warmup_seconds": dict(warmup_seconds),
+    }
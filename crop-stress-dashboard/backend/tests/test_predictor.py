@@ -0,0 +1,22 @@
+import numpy as np
+import pytest
+import torch
+
+from predictor import Predictor
+
+
+@pytest.fixture(scope="module")
+def predictor():
+    # No checkpoint needed: shapes and batching do not depend on the weights
+    return Predictor("no-such-checkpoint.pth")
+
+
+@pytest.mark.parametrize("batch", [[], (), np.empty((0, 6, 128, 128), dtype=np.float32), torch.empty(0, 6, 128, 128)])
+def test_empty_batch_scores_nothing(predictor, batch):
+    assert predictor.predict_stress_probs(batch) == []
+
+
+def test_list_of_patches_is_scored_in_one_batch(predictor):
+    probs = predictor.predict_stress_probs([torch.rand(1, 6, 128, 128) for _ in range(3)])
+    assert len(probs) == 3
+    assert all(0.0 <= p <= 1.0 for p in probs)
@@ -0,0 +1,26 @@
+import datetime
+
+import numpy as np
+
+from timeseries_store import TimeseriesStore
+
+
+def test_recent_composites_are_refetched_until_settled(tmp_path):
+    store = TimeseriesStore(str(tmp_path), refresh_days=3)
+    fetched_on = datetime.date(2026, 10, 10)
+    recent, old = fetched_on, fetched_on - datetime.timedelta(days=5)
+    composite = np.zeros((6, 4, 4), dtype=np.float32)
+    store.save("field", {recent: composite, old: composite}, today=fetched_on)
+
+    # Same day: everything just fetched is served
+    assert set(store.load("field", [recent, old], today=fetched_on)) == {recent, old}
+    # A later day: the recent composite is refetched, the settled one is not
+    later = fetched_on + datetime.timedelta(days=1)
+    assert set(store.load("field", [recent, old], today=later)) == {old}
+
+
+def test_refresh_days_zero_never_refetches(tmp_path):
+    store = TimeseriesStore(str(tmp_path), refresh_days=0)
+    day = datetime.date(2026, 10, 10)
+    store.save("field", {day: np.zeros((6, 4, 4), dtype=np.float32)}, today=day)
+    assert set(store.load("field", [day], today=day + datetime.timedelta(days=30))) == {day}
@@ -0,0 +1,225 @@
+import math
+import os
+import threading
+
+import numpy as np
+
+from patch_cache import make_key, patch_cache
+
+# --- CONFIGURATION ---
+# Fetch fetch_patch_as_array imagery per fixed grid tile and cut each field's
+# patch locally, so neighbouring fields share downloads
+TILE_GRID_ENABLED = os.getenv("TILE_GRID", "0") == "1"
+# Small tiles keep an isolated field's download close to its own patch: a
+# 225 px patch downloads ~1.6x its pixels with 64 px tiles (4.5x with 256 px),
+# and the missing tiles of a patch come back in one request either way
+TILE_PIXELS = int(os.getenv("TILE_PIXELS", 64))
+# S2/S1 scenes and the cloud fallback are chosen once per scene cell of this
+# many tiles per side (16 x 64 px ~ 10 km), so a patch never mixes composites
+TILE_SCENE_CELL = int(os.getenv("TILE_SCENE_CELL", 16))
+# Tiles in one latitude band share a pixel size (10 m at the band's centre)
+TILE_BAND_DEG = 1.0
+
+_R = 6378137.0  # Web Mercator sphere radius
+
+
+def _mercator(lat: float, lon: float):
+    return _R * math.radians(lon), _R * math.log(math.tan(math.pi / 4 + math.radians(lat) / 2))
+
+
+def _lat_lon(x: float, y: float):
+    return math.degrees(2 * math.atan(math.exp(y / _R)) - math.pi / 2), math.degrees(x / _R)
+
+
+def band_step(band: int, scale: float = 10) -> float:
+    """Web Mercator pixel size of latitude band `band` (about `scale` metres on the ground)."""
+    return scale / math.cos(math.radians((band + 0.5) * TILE_BAND_DEG))
+
+
+def patch_window(lat: float, lon: float, pixels: int):
+    """
+    Where a `pixels`-wide patch centred on (lat, lon) sits in the global grid:
+    (band, row, col) of its top-left pixel. Rows count southwards from the
+    equator line y = 0, columns eastwards from x = 0.
+    """
+    band = math.floor(lat / TILE_BAND_DEG)
+    step = band_step(band)
+    x, y = _mercator(lat, lon)
+    return band, math.floor(-y / step) - pixels // 2, math.floor(x / step) - pixels // 2
+
+
+def covering_tiles(row: int, col: int, pixels: int, tile_pixels: int = TILE_PIXELS) -> list:
+    """(ty, tx) of every tile overlapping the window starting at (row, col)."""
+    rows = range(row // tile_pixels, (row + pixels - 1) // tile_pixels + 1)
+    cols = range(col // tile_pixels, (col + pixels - 1) // tile_pixels + 1)
+    return [(ty, tx) for ty in rows for tx in cols]
+
+
+def scene_cell(row: int, col: int, tile_pixels: int = TILE_PIXELS, cell_tiles: int = TILE_SCENE_CELL):
+    """(cy, cx) of the scene cell holding pixel (row, col); it spans tiles cy * cell_tiles ... and cx * cell_tiles ..."""
+    return row // (tile_pixels * cell_tiles), col // (tile_pixels * cell_tiles)
+
+
+def tile_grid(band: int, ty: int, tx: int, tile_pixels: int = TILE_PIXELS, rows: int = 1, cols: int = 1) -> dict:
+    """computePixels grid of the `rows` x `cols` block of tiles starting at tile (ty, tx)."""
+    step = band_step(band)
+    return {
+        "dimensions": {"width": cols * tile_pixels, "height": rows * tile_pixels},
+        "affineTransform": {
+            "scaleX": step, "shearX": 0, "translateX": tx * tile_pixels * step,
+            "shearY": 0, "scaleY": -step, "translateY": -ty * tile_pixels * step,
+        },
+        "crsCode": "EPSG:3857",
+    }
+
+
+def tile_geojson(band: int, ty: int, tx: int, tile_pixels: int = TILE_PIXELS, rows: int = 1, cols: int = 1) -> dict:
+    """Footprint of the `rows` x `cols` block of tiles starting at tile (ty, tx) as a GeoJSON Polygon (lon, lat)."""
+    span = tile_pixels * band_step(band)
+    x0, y0 = tx * span, -ty * span
+    x1, y1 = x0 + cols * span, y0 - rows * span
+    corners = [(x0, y0), (x1, y0), (x1, y1), (x0, y1), (x0, y0)]
+    return {"type": "Polygon", "coordinates": [[list(_lat_lon(x, y)[::-1]) for x, y in corners]]}
+
+
+def cut(tiles: dict, row: int, col: int, pixels: int, tile_pixels: int = TILE_PIXELS) -> np.ndarray:
+    """Assemble the (bands, pixels, pixels) window at (row, col) from {(ty, tx): (bands, T, T) array}."""
+    first = next(iter(tiles.values()))
+    out = np.zeros((first.shape[0], pixels, pixels), dtype=np.float32)
+    for (ty, tx), arr in tiles.items():
+        r0, c0 = ty * tile_pixels, tx * tile_pixels
+        top, left = max(row, r0), max(col, c0)
+        bottom, right = min(row + pixels, r0 + tile_pixels), min(col + pixels, c0 + tile_pixels)
+        if top < bottom and left < right:
+            out[:, top - row:bottom - row, left - col:right - col] = arr[:, top - r0:bottom - r0, left - c0:right - c0]
+    return out
+
+
+class TileGrid:
+    """
+    Patches cut from shared grid tiles.
+
+    The grid is fixed and global (Web Mercator, per-latitude-band pixel size),
+    so it is its own spatial index: the tiles under a field's window follow
+    from arithmetic on its centroid and are looked up by key in the patch
+    cache. The tiles a patch is missing are fetched together as one block, and
+    each tile is fetched once even when several fields ask for it concurrently.
+
+    All tiles of a patch are composited from the scenes of one scene cell
+    (the one holding the patch centre), and tiles are cached per scene cell,
+    so a patch never stitches together different scene sets or cloud
+    fallbacks. A patch straddling a cell edge may refetch tiles that a
+    neighbouring cell already holds.
+    """
+
+    def __init__(self, cache=patch_cache, tile_pixels: int = TILE_PIXELS, cell_tiles: int = TILE_SCENE_CELL):
+        self.cache = cache
+        self.tile_pixels = tile_pixels
+        self.cell_tiles = cell_tiles
+        self.counters = {"patches": 0, "tiles_needed": 0, "tile_hits": 0, "tile_fetches": 0, "block_fetches": 0,
+                         "pixels_fetched": 0, "tile_errors": 0}
+        self._lock = threading.Lock()
+        self._inflight = {}  # tile key -> [lock, waiters]
+
+    def _count(self, name: str, n: int = 1):
+        with self._lock:
+            self.counters[name] += n
+
+    def _acquire(self, keys: list) -> list:
+        # Always lock in key order so patches sharing tiles cannot deadlock
+        with self._lock:
+            entries = []
+            for key in sorted(keys):
+                entry = self._inflight.setdefault(key, [threading.Lock(), 0])
+                entry[1] += 1
+                entries.append((key, entry))
+        for _, entry in entries:
+            entry[0].acquire()
+        return entries
+
+    def _release(self, entries: list):
+        for _, entry in entries:
+            entry[0].release()
+        with self._lock:
+            for key, entry in entries:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._inflight[key]
+
+    def _tiles(self, keys: dict, fetch_block) -> dict:
+        """{(ty, tx): result} for `keys` {(ty, tx): cache key}, fetching the bounding block of the missing ones."""
+        entries = self._acquire(list(keys.values()))
+        try:
+            tiles, missing = {}, []
+            for pos, key in keys.items():
+                value = self.cache.get(key)
+                if value is None:
+                    missing.append(pos)
+                else:
+                    tiles[pos] = value
+            self._count("tile_hits", len(tiles))
+            if not missing:
+                return tiles
+            ty0, tx0 = min(ty for ty, _ in missing), min(tx for _, tx in missing)
+            rows = max(ty for ty, _ in missing) - ty0 + 1
+            cols = max(tx for _, tx in missing) - tx0 + 1
+            self._count("tile_fetches", len(missing))
+            self._count("block_fetches")
+            self._count("pixels_fetched", rows * cols * self.tile_pixels ** 2)
+            res = fetch_block(ty0, tx0, rows, cols)
+            if res.get("status") != "success":
+                self._count("tile_errors", len(missing))
+                return {pos: res for pos in missing}
+            t = self.tile_pixels
+            for ty, tx in missing:
+                r, c = (ty - ty0) * t, (tx - tx0) * t
+                arr = np.ascontiguousarray(res["array"][:, r:r + t, c:c + t])
+                tiles[(ty, tx)] = self.cache.put(keys[(ty, tx)], {"status": "success", "array": arr})
+            return tiles
+        finally:
+            self._release(entries)
+
+    def patch(self, lat: float, lon: float, pixels: int, end_date: str, bands: list, fetch_block) -> dict:
+        """
+        The `pixels`-wide patch around (lat, lon) as {"array": (1, bands, pixels,
+        pixels)}. `fetch_block(band, cell, ty, tx, rows, cols)` returns a result
+        dict whose "array" is the (bands, rows * T, cols * T) block of tiles
+        starting at tile (ty, tx), composited from the scenes of scene cell
+        `cell`; its errors are passed through.
+        """
+        band, row, col = patch_window(lat, lon, pixels)
+        needed = covering_tiles(row, col, pixels, self.tile_pixels)
+        cell = scene_cell(row + pixels // 2, col + pixels // 2, self.tile_pixels, self.cell_tiles)
+        self._count("patches")
+        self._count("tiles_needed", len(needed))
+        keys = {(ty, tx): make_key("tile", tile_geojson(band, ty, tx, self.tile_pixels), end_date, 180, bands,
+                                   tile=f"{band}/{ty}/{tx}", scenes=f"{band}/{cell[0]}/{cell[1]}",
+                                   pixels=self.tile_pixels)
+                for ty, tx in needed}
+        results = self._tiles(keys, lambda ty, tx, rows, cols: fetch_block(band, cell, ty, tx, rows, cols))
+        for res in results.values():
+            if res.get("status") != "success":
+                return res
+        return {
+            "status": "success",
+            "array": cut({pos: res["array"] for pos, res in results.items()}, row, col, pixels, self.tile_pixels)[None],
+            "bands": bands,
+            "tiles": [f"{band}/{ty}/{tx}" for ty, tx in needed],
+            "scene_cell": f"{band}/{cell[0]}/{cell[1]}",
+        }
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self.counters)
+        return {
+            "enabled": TILE_GRID_ENABLED,
+            "tile_pixels": self.tile_pixels,
+            "scene_cell_tiles": self.cell_tiles,
+            **counters,
+            "tiles_per_patch": round(counters["tiles_needed"] / counters["patches"], 2) if counters["patches"] else 0.0,
+            "fetches_per_patch": round(counters["block_fetches"] / counters["patches"], 3) if counters["patches"] else 0.0,
+            "pixels_per_patch": round(counters["pixels_fetched"] / counters["patches"]) if counters["patches"] else 0,
+        }
+
+
+shared_tiles = TileGrid()
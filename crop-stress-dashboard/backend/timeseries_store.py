@@ -0,0 +1,81 @@
+import datetime
+import json
+import os
+import threading
+
+import numpy as np
+
+from patch_cache import polygon_hash
+
+# --- CONFIGURATION ---
+TIMESERIES_STORE_DIR = os.getenv("TIMESERIES_STORE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "timeseries"))
+# Stored composites younger than this many days (date vs. fetch date) are
+# refetched on later days, to pick up late-arriving scenes. 0 = never.
+TIMESERIES_REFRESH_DAYS = int(os.getenv("TIMESERIES_REFRESH_DAYS", 3))
+
+
+class TimeseriesStore:
+    """
+    Local store of per-day composites for each field.
+
+    Layout: <root>/<polygon hash>/<YYYY-MM-DD>.npy holds one (6, H, W) float32
+    composite in NPY_BANDS order, and index.json records the date each day was
+    fetched on. Arrays are memory-mapped on read.
+    """
+
+    def __init__(self, root: str = TIMESERIES_STORE_DIR, refresh_days: int = TIMESERIES_REFRESH_DAYS):
+        self.root = root
+        self.refresh_days = refresh_days
+        self._lock = threading.Lock()
+
+    def field_id(self, boundary_geojson: dict, transport: str) -> str:
+        # Patches from different transports sit on different pixel grids
+        return f"{polygon_hash(boundary_geojson)}-{transport}"
+
+    def _index(self, field: str) -> dict:
+        try:
+            with open(os.path.join(self.root, field, "index.json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _is_fresh(self, day: datetime.date, fetched_on: str, today: datetime.date) -> bool:
+        fetched = datetime.date.fromisoformat(fetched_on)
+        if fetched >= today:
+            return True
+        return (fetched - day).days >= self.refresh_days
+
+    def load(self, field: str, dates: list, today: datetime.date = None) -> dict:
+        """Return {date: (6, H, W) array} for every requested date already stored and settled."""
+        index = self._index(field)
+        today = today or datetime.date.today()
+        found = {}
+        for day in dates:
+            fetched_on = index.get(day.isoformat())
+            if fetched_on is None or not self._is_fresh(day, fetched_on, today):
+                continue
+            try:
+                found[day] = np.load(os.path.join(self.root, field, f"{day.isoformat()}.npy"), mmap_mode="r")
+            except (OSError, ValueError):
+                continue
+        return found
+
+    def save(self, field: str, composites: dict, today: datetime.date = None):
+        """Persist {date: (6, H, W) array} and record `today` as their fetch date."""
+        field_dir = os.path.join(self.root, field)
+        os.makedirs(field_dir, exist_ok=True)
+        today = (today or datetime.date.today()).isoformat()
+        for day, arr in composites.items():
+            tmp = os.path.join(field_dir, f".{day.isoformat()}.tmp.npy")
+            np.save(tmp, np.asarray(arr, dtype=np.float32))
+            os.replace(tmp, os.path.join(field_dir, f"{day.isoformat()}.npy"))
+        with self._lock:
+            index = self._index(field)
+            index.update({day.isoformat(): today for day in composites})
+            tmp = os.path.join(field_dir, "index.json.tmp")
+            with open(tmp, "w") as f:
+                json.dump(index, f)
+            os.replace(tmp, os.path.join(field_dir, "index.json"))
+
+
+timeseries_store = TimeseriesStore()
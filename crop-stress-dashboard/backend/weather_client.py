@@ -0,0 +1,133 @@
+import math
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# --- CONFIGURATION ---
+OPENWEATHERMAP_API_KEY = os.getenv("OPENWEATHERMAP_API_KEY")
+# Point at a local stub server for tests, e.g. http://127.0.0.1:8081
+OPENWEATHERMAP_BASE_URL = os.getenv("OPENWEATHERMAP_BASE_URL", "https://api.openweathermap.org")
+WEATHER_CELL_DEG = float(os.getenv("WEATHER_CELL_DEG", 0.05))  # ~5.5 km grid
+WEATHER_TTL = float(os.getenv("WEATHER_TTL", 600))
+# Entries older than WEATHER_TTL but younger than this are served stale while
+# a background refresh runs. Set equal to WEATHER_TTL to disable.
+WEATHER_STALE_TTL = float(os.getenv("WEATHER_STALE_TTL", 3600))
+WEATHER_HTTP_TIMEOUT = float(os.getenv("WEATHER_HTTP_TIMEOUT", 5))
+
+
+class WeatherClient:
+    """
+    OpenWeatherMap client with a pooled keep-alive session and a TTL cache
+    keyed by lat/lon grid cell. Concurrent requests for the same cell share a
+    single HTTP call, and stale entries are served while they revalidate.
+    """
+
+    def __init__(self, api_key: str = OPENWEATHERMAP_API_KEY, base_url: str = OPENWEATHERMAP_BASE_URL,
+                 cell_deg: float = WEATHER_CELL_DEG, ttl: float = WEATHER_TTL,
+                 stale_ttl: float = WEATHER_STALE_TTL, timeout: float = WEATHER_HTTP_TIMEOUT,
+                 pool_size: int = 16):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.cell_deg = cell_deg
+        self.ttl = ttl
+        self.stale_ttl = max(stale_ttl, ttl)
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._cache = {}      # cell -> (fetched_at, weather)
+        self._inflight = {}   # cell -> Future
+        self._lock = threading.Lock()
+        self._refresher = ThreadPoolExecutor(max_workers=2, thread_name_prefix="weather-refresh")
+        self.counters = {"hits": 0, "stale_hits": 0, "misses": 0, "coalesced": 0, "requests": 0, "errors": 0}
+
+    def cell(self, lat: float, lon: float) -> tuple:
+        return (math.floor(lat / self.cell_deg), math.floor(lon / self.cell_deg))
+
+    def get(self, lat: float, lon: float):
+        """Current weather for the grid cell containing (lat, lon), or None."""
+        if not self.api_key or self.api_key == "YOUR_OWM_API_KEY_HERE":
+            return None
+
+        key = self.cell(lat, lon)
+        now = time.time()
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                age = now - entry[0]
+                if age < self.ttl:
+                    self.counters["hits"] += 1
+                    return entry[1]
+                if age < self.stale_ttl:
+                    self.counters["stale_hits"] += 1
+                    if key not in self._inflight:
+                        self._inflight[key] = Future()
+                        self._refresher.submit(self._refresh, key)
+                    return entry[1]
+
+            future = self._inflight.get(key)
+            if future is not None:
+                self.counters["coalesced"] += 1
+                owner = False
+            else:
+                self.counters["misses"] += 1
+                future = self._inflight[key] = Future()
+                owner = True
+
+        if owner:
+            self._refresh(key)
+        try:
+            return future.result(timeout=self.timeout + 1)
+        except Exception:
+            return None
+
+    def _refresh(self, key):
+        weather = self._request(key)
+        with self._lock:
+            if weather is not None:
+                self._cache[key] = (time.time(), weather)
+            elif key in self._cache:
+                # Keep serving the previous value if the refresh failed
+                weather = self._cache[key][1]
+            future = self._inflight.pop(key, None)
+        if future is not None:
+            future.set_result(weather)
+
+    def _request(self, key):
+        # Query the cell centre so every field in the cell shares one answer
+        lat = (key[0] + 0.5) * self.cell_deg
+        lon = (key[1] + 0.5) * self.cell_deg
+        params = {"lat": round(lat, 5), "lon": round(lon, 5), "appid": self.api_key, "units": "metric"}
+        with self._lock:
+            self.counters["requests"] += 1
+        try:
+            r = self.session.get(f"{self.base_url}/data/2.5/weather", params=params, timeout=self.timeout)
+            if r.status_code == 200:
+                data = r.json()
+                return {
+                    "temp": data["main"]["temp"],
+                    "humidity": data["main"]["humidity"],
+                    "description": data["weather"][0]["description"],
+                    "wind_speed": data["wind"]["speed"],
+                    "icon": data["weather"][0]["icon"]
+                }
+            print(f"Weather fetch failed: HTTP {r.status_code}")
+        except Exception as e:
+            print(f"Weather fetch failed: {e}")
+        with self._lock:
+            self.counters["errors"] += 1
+        return None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self.counters, cached_cells=len(self._cache))
+
+
+weather_client = WeatherClient()
@@ -0,0 +1,243 @@
+"""
+Parallel, incremental feature extraction and pseudo-labeling.
+
+Replaces the notebook loops behind eda_summary.csv, pseudo_labels_with_exg.csv
+and compare_kmeans_threshold.csv. Each image is decoded once (same
+preprocessing as the notebooks' CropDataset, see tensor_store.read_sample) on
+a process pool; its NDVI/VH/VV/ExG statistics and threshold pseudo-label are
+appended to a features CSV as soon as its chunk finishes. Images already in
+the features file are skipped, so an interrupted run resumes where it
+stopped and a new batch of imagery only costs the new files. Images that
+fail to decode are listed in a .failed.csv next to it and skipped too
+(until --retry-failed). Each dataset directory gets its own features file.
+
+The notebook CSVs are then written from the complete features table.
+
+Usage:
+    python training/label_pipeline.py --dataset-dir Dataset
+    python training/label_pipeline.py --dataset-dir Dataset --kmeans --parquet features.parquet
+"""
+import argparse
+import csv
+import hashlib
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from tensor_store import DATASET_DIR, aligned_files, read_sample
+
+# --- CONFIGURATION ---
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+# Features CSV; by default one per dataset directory under FEATURES_DIR
+FEATURES_PATH = os.getenv("LABEL_FEATURES_PATH")
+FEATURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "features")
+LABEL_CHUNK = int(os.getenv("LABEL_CHUNK", 64))  # images per worker task
+
+# Pseudo-label thresholds (as in cropreal1.ipynb)
+NDVI_THRESHOLD = 0.5
+VH_DB_THRESHOLD = -12
+VV_DB_THRESHOLD = -8
+
+
+def db_to_norm(val, min_db=-25, max_db=0):
+    return (val - min_db) / (max_db - min_db)
+
+
+VH_THRESHOLD = db_to_norm(VH_DB_THRESHOLD)
+VV_THRESHOLD = db_to_norm(VV_DB_THRESHOLD)
+
+FEATURE_COLUMNS = ["image", "ndvi_mean", "ndvi_std", "vh_mean", "vv_mean", "exg_mean", "stress_score", "pseudo_label"]
+FAILURE_COLUMNS = ["image", "error"]
+
+
+def default_features_path(base_dir: str) -> str:
+    """LABEL_FEATURES_PATH, or training/features/<dataset name>-<hash of its absolute path>.csv."""
+    if FEATURES_PATH:
+        return FEATURES_PATH
+    base_dir = os.path.abspath(base_dir)
+    digest = hashlib.sha1(base_dir.encode()).hexdigest()[:10]
+    return os.path.join(FEATURES_DIR, f"{os.path.basename(base_dir.rstrip(os.sep)) or 'dataset'}-{digest}.csv")
+
+
+def failures_path(path: str) -> str:
+    return os.path.splitext(path)[0] + ".failed.csv"
+
+
+def pseudo_label(ndvi_mean: float, vh_mean: float, vv_mean: float):
+    """Threshold vote: one point per band below its threshold; 2+ points = stressed (1)."""
+    score = int(ndvi_mean < NDVI_THRESHOLD) + int(vh_mean < VH_THRESHOLD) + int(vv_mean < VV_THRESHOLD)
+    return score, int(score >= 2)
+
+
+def image_features(base_dir: str, name: str) -> dict:
+    """All per-image statistics from a single decode."""
+    img = read_sample(base_dir, name)
+    r, g, b, ndvi, vh, vv = img
+    row = {
+        "image": name,
+        "ndvi_mean": float(ndvi.mean()),
+        "ndvi_std": float(ndvi.std()),
+        "vh_mean": float(vh.mean()),
+        "vv_mean": float(vv.mean()),
+        "exg_mean": float((2 * g - r - b).mean()),
+    }
+    row["stress_score"], row["pseudo_label"] = pseudo_label(row["ndvi_mean"], row["vh_mean"], row["vv_mean"])
+    return row
+
+
+def _features_chunk(base_dir: str, names: list):
+    rows, failures = [], []
+    for name in names:
+        try:
+            rows.append(image_features(base_dir, name))
+        except Exception as e:
+            print(f"Warning: skipping {name}: {e}")
+            failures.append({"image": name, "error": str(e)})
+    return rows, failures
+
+
+def read_features(path: str) -> list:
+    if not os.path.exists(path):
+        return []
+    with open(path, newline="") as f:
+        return list(csv.DictReader(f))
+
+
+def _open_csv(path: str, columns: list):
+    is_new = not os.path.exists(path) or os.path.getsize(path) == 0
+    f = open(path, "a", newline="")
+    writer = csv.DictWriter(f, fieldnames=columns)
+    if is_new:
+        writer.writeheader()
+    return f, writer
+
+
+def extract(base_dir: str = DATASET_DIR, features_path: str = None, workers: int = None,
+            chunk: int = LABEL_CHUNK, retry_failed: bool = False) -> list:
+    """
+    Append features for every aligned image not yet in `features_path`
+    (default: default_features_path(base_dir)) or its failures file. Rows are
+    flushed per finished chunk, so progress survives interruption.
+    Returns the table for the images currently in `base_dir`.
+    """
+    features_path = features_path or default_features_path(base_dir)
+    failed_path = failures_path(features_path)
+    if retry_failed and os.path.exists(failed_path):
+        os.remove(failed_path)
+    names = aligned_files(base_dir)
+    done = {row["image"] for row in read_features(features_path)}
+    failed = {row["image"] for row in read_features(failed_path)} - done
+    todo = [name for name in names if name not in done and name not in failed]
+    print(f"{len(done)} images already processed, {len(failed)} failed earlier, {len(todo)} to go")
+
+    if todo:
+        t0 = time.perf_counter()
+        os.makedirs(os.path.dirname(os.path.abspath(features_path)), exist_ok=True)
+        f, writer = _open_csv(features_path, FEATURE_COLUMNS)
+        ff, failure_writer = _open_csv(failed_path, FAILURE_COLUMNS)
+        with f, ff, ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_features_chunk, base_dir, todo[i:i + chunk]) for i in range(0, len(todo), chunk)]
+            n = 0
+            for future in as_completed(futures):
+                rows, failures = future.result()
+                writer.writerows(rows)
+                f.flush()
+                failure_writer.writerows(failures)
+                ff.flush()
+                n += len(rows) + len(failures)
+                print(f"  {n}/{len(todo)} images", end="\r")
+        print()
+        elapsed = time.perf_counter() - t0
+        print(f"Extracted {len(todo)} images in {elapsed:.1f}s ({len(todo) / elapsed:.1f} images/s)")
+
+    present = set(names)
+    rows = [row for row in read_features(features_path) if row["image"] in present]
+    rows.sort(key=lambda row: row["image"])
+    return rows
+
+
+def _write_csv(path: str, columns: list, rows):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        writer.writerows(rows)
+    print(f"Saved {path}")
+
+
+def write_outputs(rows: list, out_dir: str = REPO_DIR):
+    """The notebook CSVs: eda_summary.csv and pseudo_labels_with_exg.csv."""
+    _write_csv(os.path.join(out_dir, "eda_summary.csv"),
+               ["file", "ndvi_mean", "ndvi_std", "vh_mean", "vv_mean", "exg_mean"],
+               ([r["image"], r["ndvi_mean"], r["ndvi_std"], r["vh_mean"], r["vv_mean"], r["exg_mean"]] for r in rows))
+    _write_csv(os.path.join(out_dir, "pseudo_labels_with_exg.csv"),
+               ["image", "pseudo_label", "avg_exg"],
+               ([r["image"], r["pseudo_label"], r["exg_mean"]] for r in rows))
+    labels, counts = np.unique([int(r["pseudo_label"]) for r in rows], return_counts=True)
+    for u, c in zip(labels, counts):
+        print(f"Label {u}: {c} samples")
+
+
+def compare_kmeans(rows: list, out_dir: str = REPO_DIR):
+    """KMeans (k=2) on [ndvi, vh, vv, exg] means vs the threshold labels -> compare_kmeans_threshold.csv."""
+    try:
+        from sklearn.cluster import KMeans
+    except ImportError:
+        print("Warning: scikit-learn is not installed; skipping the KMeans comparison")
+        return
+    features = np.array([[float(r[k]) for k in ("ndvi_mean", "vh_mean", "vv_mean", "exg_mean")] for r in rows])
+    labels = np.array([int(r["pseudo_label"]) for r in rows])
+    kmeans_labels = KMeans(n_clusters=2, random_state=42, n_init=10).fit_predict(features)
+
+    # Name clusters so that 0 is the one holding more healthy images
+    if np.sum(labels[kmeans_labels == 1] == 0) > np.sum(labels[kmeans_labels == 0] == 0):
+        kmeans_labels = 1 - kmeans_labels
+    matches = labels == kmeans_labels
+    print(f"Agreement between KMeans clusters and threshold pseudo-labels: {matches.mean() * 100:.2f}%")
+    _write_csv(os.path.join(out_dir, "compare_kmeans_threshold.csv"),
+               ["image", "pseudo_label", "kmeans_label", "match"],
+               ([r["image"], l, k, m] for r, l, k, m in zip(rows, labels, kmeans_labels, matches)))
+
+
+def write_parquet(rows: list, path: str):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        print("Warning: pyarrow is not installed; skipping the Parquet export")
+        return
+    columns = {c: [r[c] for r in rows] for c in FEATURE_COLUMNS}
+    for c in FEATURE_COLUMNS[1:]:
+        columns[c] = np.asarray(columns[c], dtype=np.int64 if c in ("stress_score", "pseudo_label") else np.float64)
+    pq.write_table(pa.table(columns), path)
+    print(f"Saved {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract per-image statistics and threshold pseudo-labels.")
+    parser.add_argument("--dataset-dir", default=DATASET_DIR)
+    parser.add_argument("--features", help="incremental per-image features CSV (default: one per dataset dir "
+                                           "under training/features)")
+    parser.add_argument("--retry-failed", action="store_true", help="retry images that failed in earlier runs")
+    parser.add_argument("--out-dir", default=REPO_DIR, help="where to write the notebook CSVs")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk", type=int, default=LABEL_CHUNK)
+    parser.add_argument("--kmeans", action="store_true", help="also write compare_kmeans_threshold.csv")
+    parser.add_argument("--parquet", help="also export the features table as Parquet")
+    args = parser.parse_args()
+
+    rows = extract(args.dataset_dir, args.features, workers=args.workers, chunk=args.chunk,
+                   retry_failed=args.retry_failed)
+    if not rows:
+        print("No images found")
+        return
+    write_outputs(rows, args.out_dir)
+    if args.kmeans:
+        compare_kmeans(rows, args.out_dir)
+    if args.parquet:
+        write_parquet(rows, args.parquet)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+"""
+Memory-mapped training tensor store.
+
+The notebook CropDataset classes decode four files (RGB, NDVI, SAR VH, SAR VV)
+and re-resize / re-normalize every sample on every epoch. `build` runs that
+preprocessing once and writes the result to a single (N, 6, 128, 128) NPY
+file that training reads through a memory map:
+
+    <store>/tensors.npy   (N, 6, 128, 128) float16 or float32, channel order R, G, B, NDVI, VH, VV
+    <store>/index.csv     image,label   (row i describes tensors[i]; label -1 = unlabeled)
+    <store>/meta.json     shape, dtype, source directory, preprocessing version
+
+Usage:
+    python training/tensor_store.py build --dataset-dir Dataset --labels pseudo_labels_with_exg.csv --out training/store
+    python training/tensor_store.py info training/store
+
+In a notebook:
+    from tensor_store import TensorStoreDataset
+    dataset = TensorStoreDataset("training/store")
+    loader = DataLoader(dataset, batch_size=16, shuffle=True)
+"""
+import argparse
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+# --- CONFIGURATION ---
+DATASET_DIR = os.getenv("TRAINING_DATASET_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Dataset"))
+TENSOR_STORE_DIR = os.getenv("TENSOR_STORE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "store"))
+STORE_DTYPE = os.getenv("TENSOR_STORE_DTYPE", "float16")
+BUILD_CHUNK = int(os.getenv("TENSOR_STORE_CHUNK", 256))  # samples decoded per worker task
+
+SIZE = 128
+CHANNELS = ["R", "G", "B", "NDVI", "VH", "VV"]
+# Bump when read_sample changes so stale stores are rejected
+PREPROCESS_VERSION = 1
+
+TENSORS, INDEX, META = "tensors.npy", "index.csv", "meta.json"
+
+
+def _read_tif(path: str) -> np.ndarray:
+    """Single-band TIFF resized to 128x128 and min-max normalized to [0, 1], as in the notebooks."""
+    try:
+        import rasterio
+        with rasterio.open(path) as src:
+            img = src.read(1)
+    except ImportError:
+        img = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+        if img is None:
+            raise FileNotFoundError(path)
+        if img.ndim == 3:
+            img = img[..., 0]
+    img = cv2.resize(img, (SIZE, SIZE)).astype(np.float32)
+    return (img - img.min()) / (img.max() - img.min() + 1e-6)
+
+
+def read_sample(base_dir: str, name: str) -> np.ndarray:
+    """One aligned sample as a (6, 128, 128) float32 array, preprocessed exactly like CropDataset."""
+    bgr = cv2.imread(os.path.join(base_dir, "RGB", name))
+    if bgr is None:
+        raise FileNotFoundError(os.path.join(base_dir, "RGB", name))
+    rgb = cv2.resize(cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB), (SIZE, SIZE)).astype(np.float32) / 255.0
+
+    out = np.empty((len(CHANNELS), SIZE, SIZE), dtype=np.float32)
+    out[:3] = rgb.transpose(2, 0, 1)
+    out[3] = _read_tif(os.path.join(base_dir, "NDVI", name))
+    out[4] = _read_tif(os.path.join(base_dir, "SAR", "VH", name))
+    out[5] = _read_tif(os.path.join(base_dir, "SAR", "VV", name))
+    return out
+
+
+def aligned_files(base_dir: str) -> list:
+    """File names present in all four band folders."""
+    dirs = [os.path.join(base_dir, "RGB"), os.path.join(base_dir, "NDVI"),
+            os.path.join(base_dir, "SAR", "VH"), os.path.join(base_dir, "SAR", "VV")]
+    return sorted(set.intersection(*(set(os.listdir(d)) for d in dirs)))
+
+
+def read_labels(path: str) -> dict:
+    """image -> label from a CSV with "image" and "pseudo_label" (or "label") columns."""
+    with open(path, newline="") as f:
+        reader = csv.DictReader(f)
+        column = "pseudo_label" if "pseudo_label" in reader.fieldnames else "label"
+        return {row["image"]: int(row[column]) for row in reader}
+
+
+def _read_chunk(base_dir: str, names: list) -> np.ndarray:
+    return np.stack([read_sample(base_dir, name) for name in names])
+
+
+def build(base_dir: str = DATASET_DIR, out_dir: str = TENSOR_STORE_DIR, files: list = None,
+          labels: dict = None, dtype: str = STORE_DTYPE, workers: int = None, chunk: int = BUILD_CHUNK) -> dict:
+    """
+    Decode and preprocess every sample once into `out_dir`. `files` defaults
+    to the aligned file set (or the labelled images when `labels` is given).
+    Samples are decoded in chunks on a process pool and written straight into
+    the memory-mapped output; the store only becomes visible once complete.
+    """
+    if files is None:
+        files = aligned_files(base_dir)
+        if labels is not None:
+            files = [name for name in files if name in labels]
+    labels = labels or {}
+    os.makedirs(out_dir, exist_ok=True)
+
+    shape = (len(files), len(CHANNELS), SIZE, SIZE)
+    partial = os.path.join(out_dir, TENSORS + ".partial")
+    tensors = np.lib.format.open_memmap(partial, mode="w+", dtype=np.dtype(dtype), shape=shape)
+
+    t0 = time.perf_counter()
+    starts = range(0, len(files), chunk)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(_read_chunk, base_dir, files[i:i + chunk]): i for i in starts}
+        for future in futures:
+            i = futures[future]
+            block = future.result()
+            tensors[i:i + len(block)] = block
+            print(f"  {min(i + chunk, len(files))}/{len(files)} samples", end="\r")
+    print()
+    tensors.flush()
+    del tensors
+    elapsed = time.perf_counter() - t0
+
+    with open(os.path.join(out_dir, INDEX), "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["image", "label"])
+        writer.writerows((name, labels.get(name, -1)) for name in files)
+    meta = {
+        "shape": list(shape),
+        "dtype": str(np.dtype(dtype)),
+        "channels": CHANNELS,
+        "preprocess_version": PREPROCESS_VERSION,
+        "source": os.path.abspath(base_dir),
+        "build_seconds": round(elapsed, 2),
+    }
+    with open(os.path.join(out_dir, META), "w") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(partial, os.path.join(out_dir, TENSORS))
+    print(f"Stored {len(files)} samples ({meta['dtype']}) in {out_dir} in {elapsed:.1f}s")
+    return meta
+
+
+class TensorStore:
+    """
+    Read-only view of a built store. `tensors` is a copy-on-write memory map:
+    pages are shared with the OS page cache and only read when touched.
+    """
+
+    def __init__(self, store_dir: str = TENSOR_STORE_DIR):
+        with open(os.path.join(store_dir, META)) as f:
+            self.meta = json.load(f)
+        if self.meta.get("preprocess_version") != PREPROCESS_VERSION:
+            raise ValueError(f"Store {store_dir} was built with preprocessing v{self.meta.get('preprocess_version')}; "
+                             f"rebuild it (current v{PREPROCESS_VERSION})")
+        self.tensors = np.load(os.path.join(store_dir, TENSORS), mmap_mode="c")
+        with open(os.path.join(store_dir, INDEX), newline="") as f:
+            rows = list(csv.DictReader(f))
+        self.files = [row["image"] for row in rows]
+        self.labels = np.array([int(row["label"]) for row in rows], dtype=np.int64)
+
+    def __len__(self):
+        return len(self.files)
+
+
+try:
+    import torch
+    from torch.utils.data import Dataset
+except ImportError:  # building a store does not need torch
+    torch, Dataset = None, object
+
+
+class TensorStoreDataset(Dataset):
+    """
+    Drop-in replacement for the notebook CropDataset: yields (image, label)
+    with image a (6, 128, 128) float32 tensor. float32 stores are returned
+    without copying; float16 stores are upcast per sample. `indices` selects a
+    subset (e.g. a train split); `transform` runs on the (6, H, W) numpy array
+    (e.g. augmentation, which copies).
+    """
+
+    def __init__(self, store_dir: str = TENSOR_STORE_DIR, indices=None, transform=None, labelled_only: bool = True):
+        self.store = TensorStore(store_dir)
+        if indices is None:
+            indices = np.flatnonzero(self.store.labels >= 0) if labelled_only else np.arange(len(self.store))
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.transform = transform
+
+    @property
+    def files(self) -> list:
+        return [self.store.files[i] for i in self.indices]
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, idx):
+        i = self.indices[idx]
+        img = self.store.tensors[i]
+        if img.dtype != np.float32:
+            img = img.astype(np.float32)
+        if self.transform is not None:
+            img = self.transform(img)
+        return torch.from_numpy(img), torch.tensor(self.store.labels[i])
+
+    def __getitems__(self, idxs: list):
+        """Batched fetch used by DataLoader: one sorted gather from the memory map."""
+        if self.transform is not None:
+            return [self[i] for i in idxs]
+        rows = self.indices[idxs]
+        order = np.argsort(rows)
+        block = np.empty((len(rows),) + self.store.tensors.shape[1:], dtype=np.float32)
+        block[order] = self.store.tensors[rows[order]]
+        return [(torch.from_numpy(block[k]), torch.tensor(self.store.labels[r])) for k, r in enumerate(rows)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or inspect a memory-mapped training tensor store.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    b = sub.add_parser("build", help="preprocess the dataset once into a store")
+    b.add_argument("--dataset-dir", default=DATASET_DIR)
+    b.add_argument("--labels", help="CSV with image,pseudo_label columns; only labelled images are stored")
+    b.add_argument("--out", default=TENSOR_STORE_DIR)
+    b.add_argument("--dtype", default=STORE_DTYPE, choices=["float16", "float32"])
+    b.add_argument("--workers", type=int, default=None)
+    b.add_argument("--chunk", type=int, default=BUILD_CHUNK)
+    i = sub.add_parser("info", help="print a store's metadata")
+    i.add_argument("store", nargs="?", default=TENSOR_STORE_DIR)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        labels = read_labels(args.labels) if args.labels else None
+        build(args.dataset_dir, args.out, labels=labels, dtype=args.dtype, workers=args.workers, chunk=args.chunk)
+    else:
+        store = TensorStore(args.store)
+        counts = dict(zip(*np.unique(store.labels, return_counts=True)))
+        print(json.dumps(dict(store.meta, samples=len(store), labels={int(k): int(v) for k, v in counts.items()}), indent=2))
+
+
+if __name__ == "__main__":
+    main()